@@ -0,0 +1,441 @@
+#!/usr/bin/env python3
+"""End-to-end load test: the real Application from main.setup_handlers driven
+by synthetic updates.
+
+Telegram is replaced by an in-process BaseRequest that answers every Bot API
+call locally. Bitrix24 is replaced by an aiohttp stub with configurable
+latency and failure rate. The storage layer talks to a real Postgres; point
+it at a dedicated database with the bot schema applied (see
+benchmarks/storage_benchmark.py for provisioning).
+
+    python benchmarks/load_test.py --database-url postgresql://localhost/supply_bot_bench \\
+        --users 200 --concurrency 50 --bitrix-latency-ms 150 --bitrix-failure-rate 0.02
+
+Each simulated foreman runs: registration (+ admin approval), 🚚 delivery with
+confirm, 🏎️ checkin with confirm. Reports throughput, latency percentiles per
+update and per flow, and DB connections / queries per flow.
+"""
+import argparse
+import asyncio
+import contextvars
+import itertools
+import json
+import os
+import random
+import statistics
+import sys
+import threading
+import time
+from collections import defaultdict
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+
+LOADTEST_ADMIN_ID = 100_000
+USER_ID_BASE = 700_000_000
+BOT_USER = {"id": 1, "is_bot": True, "first_name": "LoadTestBot", "username": "load_test_bot"}
+
+current_flow = contextvars.ContextVar("current_flow", default=None)
+# Ошибки обработчиков текущего прохода сценария: Application отдаёт их error handler, а не вызывающему
+flow_errors = contextvars.ContextVar("flow_errors", default=None)
+
+
+class FlowCounters:
+    """DB connections/queries per flow, safe to update from to_thread workers."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.connections = defaultdict(int)
+        self.queries = defaultdict(int)
+
+    def add(self, kind: str) -> None:
+        flow = current_flow.get() or "other"
+        with self._lock:
+            getattr(self, kind)[flow] += 1
+
+
+counters = FlowCounters()
+
+
+def install_query_counter() -> None:
+    from bot.services import db, supabase_storage
+
+    class CountingCursor(db.cursor_class()):
+        def execute(self, *args, **kwargs):
+            counters.add("queries")
+            return super().execute(*args, **kwargs)
+
+        def executemany(self, *args, **kwargs):
+            counters.add("queries")
+            return super().executemany(*args, **kwargs)
+
+    original_connect = supabase_storage._connect
+    original_connect_read = supabase_storage._connect_read
+
+    def counting_connect():
+        counters.add("connections")
+        return original_connect()
+
+    def counting_connect_read(user_id=None):
+        counters.add("connections")
+        return original_connect_read(user_id)
+
+    # Пул создаётся при первом запросе, поэтому класс курсора задаётся до него;
+    # "connections" считает выдачи соединений из пулов (основного и реплики)
+    db.configure(cursor_factory=CountingCursor)
+    supabase_storage._connect = counting_connect
+    supabase_storage._connect_read = counting_connect_read
+
+
+def reset_loadtest_data(database_url: str, users: int) -> None:
+    """Removes simulated foremen and their forms left by a previous run."""
+    import psycopg
+
+    bounds = (USER_ID_BASE, USER_ID_BASE + users)
+    with psycopg.connect(database_url) as conn:
+        with conn.cursor() as cur:
+            cur.execute("delete from bot.forms where user_id >= %s and user_id < %s", bounds)
+            cur.execute("delete from bot.user_settings where user_id >= %s and user_id < %s", bounds)
+            cur.execute("delete from bot.users where user_id >= %s and user_id < %s", bounds)
+        conn.commit()
+
+
+def verify_flow_effects(database_url: str, users: int) -> dict[str, set[int]]:
+    """User ids whose flows left their rows: approved user, delivery form, checkin form."""
+    import psycopg
+
+    with psycopg.connect(database_url) as conn:
+        rows = conn.execute(
+            """
+            select u.user_id, u.approved,
+                   exists (select 1 from bot.forms f where f.user_id = u.user_id and f.application_type = 'delivery'),
+                   exists (select 1 from bot.forms f where f.user_id = u.user_id and f.application_type = 'checkin')
+            from bot.users u
+            where u.user_id >= %s and u.user_id < %s
+            """,
+            (USER_ID_BASE, USER_ID_BASE + users),
+        ).fetchall()
+    return {
+        "registration": {user_id for user_id, approved, _, _ in rows if approved},
+        "delivery": {user_id for user_id, _, delivery, _ in rows if delivery},
+        "checkin": {user_id for user_id, _, _, checkin in rows if checkin},
+    }
+
+
+async def record_handler_error(update, context) -> None:
+    errors = flow_errors.get()
+    if errors is not None:
+        errors.append(context.error)
+
+
+def make_fake_request(latency_s: float):
+    from telegram.request import BaseRequest
+
+    class FakeTelegramRequest(BaseRequest):
+        """Answers Bot API calls locally; message-returning methods echo a Message."""
+
+        def __init__(self):
+            self._message_ids = itertools.count(1_000_000)
+            self.calls = defaultdict(int)
+
+        async def initialize(self):
+            pass
+
+        async def shutdown(self):
+            pass
+
+        async def do_request(self, url, method, request_data=None, read_timeout=None,
+                             write_timeout=None, connect_timeout=None, pool_timeout=None):
+            api_method = url.rsplit("/", 1)[-1]
+            self.calls[api_method] += 1
+            if latency_s:
+                await asyncio.sleep(latency_s)
+            params = request_data.parameters if request_data else {}
+
+            if api_method == "getMe":
+                result = {**BOT_USER, "can_join_groups": False, "can_read_all_group_messages": False,
+                          "supports_inline_queries": False}
+            elif api_method.startswith("send") or api_method.startswith("edit"):
+                chat_id = int(params.get("chat_id") or 0)
+                result = {
+                    "message_id": int(params.get("message_id") or next(self._message_ids)),
+                    "date": int(time.time()),
+                    "chat": {"id": chat_id, "type": "private"},
+                    "from": BOT_USER,
+                    "text": params.get("text") or "",
+                }
+            else:
+                result = True
+            return 200, json.dumps({"ok": True, "result": result}).encode()
+
+    return FakeTelegramRequest()
+
+
+async def start_bitrix_stub(latency_s: float, failure_rate: float, rng: random.Random):
+    """Local Bitrix24 REST stub: batch user.search and task.item.add."""
+    from aiohttp import web
+
+    stats = defaultdict(int)
+    task_ids = itertools.count(1)
+
+    async def handle(request: web.Request):
+        method = request.match_info["method"].removesuffix(".json")
+        stats[method] += 1
+        if latency_s:
+            await asyncio.sleep(latency_s)
+        if rng.random() < failure_rate:
+            stats["injected_failures"] += 1
+            return web.Response(status=503, text="Service Unavailable")
+        payload = await request.json() if request.can_read_body else {}
+
+        if method == "batch":
+            result = {
+                name: [{"ID": str(abs(hash(command)) % 10_000 + 1), "ACTIVE": True}]
+                for name, command in (payload.get("cmd") or {}).items()
+            }
+            return web.json_response({"result": {"result": result, "result_error": []}})
+        return web.json_response({"result": next(task_ids)})
+
+    app = web.Application()
+    app.router.add_post("/rest/1/loadtest/{method}", handle)
+    runner = web.AppRunner(app)
+    await runner.setup()
+    site = web.TCPSite(runner, "127.0.0.1", 0)
+    await site.start()
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}/rest/1/loadtest", stats
+
+
+class Simulator:
+    def __init__(self, application, rng: random.Random, think_s: float):
+        from telegram import Update
+
+        self.Update = Update
+        self.application = application
+        self.rng = rng
+        self.think_s = think_s
+        self.update_ids = itertools.count(1)
+        self.message_ids = itertools.count(1)
+        self.step_latencies = defaultdict(list)
+        # flow -> {user_id: latency} для проходов без ошибок обработчиков
+        self.flow_latencies = defaultdict(dict)
+        self.flow_errors = defaultdict(int)
+        self.updates = 0
+
+    def _user(self, user_id: int) -> dict:
+        return {"id": user_id, "is_bot": False, "first_name": f"User{user_id}", "username": f"user_{user_id}"}
+
+    async def _process(self, flow: str, data: dict) -> None:
+        update = self.Update.de_json(data, self.application.bot)
+        started = time.perf_counter()
+        await self.application.process_update(update)
+        self.step_latencies[flow].append(time.perf_counter() - started)
+        self.updates += 1
+        if self.think_s:
+            await asyncio.sleep(self.rng.uniform(0, self.think_s * 2))
+
+    async def text(self, flow: str, user_id: int, text: str) -> None:
+        await self._process(flow, {
+            "update_id": next(self.update_ids),
+            "message": {
+                "message_id": next(self.message_ids),
+                "date": int(time.time()),
+                "chat": {"id": user_id, "type": "private"},
+                "from": self._user(user_id),
+                "text": text,
+            },
+        })
+
+    async def callback(self, flow: str, user_id: int, data: str) -> None:
+        await self._process(flow, {
+            "update_id": next(self.update_ids),
+            "callback_query": {
+                "id": str(next(self.update_ids)),
+                "from": self._user(user_id),
+                "chat_instance": str(user_id),
+                "data": data,
+                "message": {
+                    "message_id": next(self.message_ids),
+                    "date": int(time.time()),
+                    "chat": {"id": user_id, "type": "private"},
+                    "from": BOT_USER,
+                    "text": "…",
+                },
+            },
+        })
+
+    async def run_flow(self, flow: str, flow_user_id: int, steps) -> None:
+        token = current_flow.set(flow)
+        errors = []
+        errors_token = flow_errors.set(errors)
+        started = time.perf_counter()
+        try:
+            for kind, user_id, payload in steps:
+                if kind == "text":
+                    await self.text(flow, user_id, payload)
+                else:
+                    await self.callback(flow, user_id, payload)
+                if errors:
+                    break
+        except Exception as e:
+            errors.append(e)
+        finally:
+            flow_errors.reset(errors_token)
+            current_flow.reset(token)
+        if errors:
+            self.flow_errors[flow] += 1
+        else:
+            self.flow_latencies[flow][flow_user_id] = time.perf_counter() - started
+
+    async def foreman(self, index: int) -> None:
+        user_id = USER_ID_BASE + index
+        contract = f"{self.rng.randint(10, 99)}-{self.rng.randint(100, 999)}/25"
+        await self.run_flow("registration", user_id, [
+            ("text", user_id, "📝 Регистрация"),
+            ("text", user_id, f"Тестов{chr(1072 + index % 26)} Иван Петрович"),
+            ("text", user_id, f"+79{self.rng.randint(100000000, 999999999)}"),
+            ("text", user_id, "Прораб"),
+            ("text", user_id, self.rng.choice(["Монтаж", "Снабжение", "Производство"])),
+            ("callback", LOADTEST_ADMIN_ID, f"approve_{user_id}"),
+        ])
+        await self.run_flow("delivery", user_id, [
+            ("text", user_id, "🚚 Доставка"),
+            ("text", user_id, contract),
+            ("text", user_id, "Брус 150x150 — 10 шт.\nУтеплитель — 5 уп."),
+            ("callback", user_id, "confirm_delivery"),
+        ])
+        await self.run_flow("checkin", user_id, [
+            ("text", user_id, "🏎️ Заезд"),
+            ("text", user_id, contract),
+            ("text", user_id, "01.07.2025"),
+            ("text", user_id, "Сидоров Пётр Алексеевич"),
+            ("text", user_id, "+79001234567"),
+            ("text", user_id, "5 т"),
+            ("callback", user_id, "confirm_checkin"),
+        ])
+
+
+def summarize(samples: list[float]) -> dict:
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+
+    def pct(p):
+        return round(ordered[min(len(ordered) - 1, int(p / 100 * len(ordered)))] * 1000, 2)
+
+    return {
+        "count": len(samples),
+        "p50_ms": pct(50),
+        "p95_ms": pct(95),
+        "p99_ms": pct(99),
+        "max_ms": round(ordered[-1] * 1000, 2),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 2),
+    }
+
+
+async def run(args) -> dict:
+    rng = random.Random(args.seed)
+    reset_loadtest_data(args.database_url, args.users)
+    stub_runner, stub_url, bitrix_stats = await start_bitrix_stub(
+        args.bitrix_latency_ms / 1000, args.bitrix_failure_rate, rng
+    )
+    os.environ["BITRIX_WEBHOOK_URL"] = stub_url
+
+    from telegram.ext import ApplicationBuilder
+
+    import main
+
+    install_query_counter()
+    fake_request = make_fake_request(args.telegram_latency_ms / 1000)
+    application = (
+        ApplicationBuilder()
+        .token(os.environ["BOT_TOKEN"])
+        .request(fake_request)
+        .get_updates_request(make_fake_request(0))
+        .build()
+    )
+    main.setup_handlers(application)
+    application.add_error_handler(record_handler_error)
+    await application.initialize()
+
+    simulator = Simulator(application, rng, args.think_ms / 1000)
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def guarded(index):
+        async with semaphore:
+            await simulator.foreman(index)
+
+    started = time.perf_counter()
+    try:
+        await asyncio.gather(*(guarded(index) for index in range(args.users)))
+    finally:
+        elapsed = time.perf_counter() - started
+        notifications = application.bot_data.get("notifications")
+        if notifications:
+            await notifications.close(timeout=60)
+        await application.shutdown()
+        await stub_runner.cleanup()
+
+    # Проход без ошибок засчитывается, только если в БД появились его строки
+    effects = await asyncio.to_thread(verify_flow_effects, args.database_url, args.users)
+    flows = {}
+    for flow in ("registration", "delivery", "checkin"):
+        latencies = [
+            latency for user_id, latency in simulator.flow_latencies[flow].items() if user_id in effects[flow]
+        ]
+        completed = len(latencies)
+        flows[flow] = {
+            "completed": completed,
+            "errors": simulator.flow_errors[flow],
+            "missing_effect": len(simulator.flow_latencies[flow]) - completed,
+            "flow_latency": summarize(latencies),
+            "update_latency": summarize(simulator.step_latencies[flow]),
+            "db_connections_per_flow": round(counters.connections[flow] / completed, 1) if completed else None,
+            "db_queries_per_flow": round(counters.queries[flow] / completed, 1) if completed else None,
+        }
+
+    return {
+        "config": vars(args) | {"database_url": None},
+        "elapsed_s": round(elapsed, 2),
+        "updates": simulator.updates,
+        "updates_per_s": round(simulator.updates / elapsed, 1) if elapsed else 0,
+        "flows_per_s": round(sum(flow["completed"] for flow in flows.values()) / elapsed, 1) if elapsed else 0,
+        "flows": flows,
+        "telegram_calls": dict(fake_request.calls),
+        "notifications": notifications.metrics() if notifications else None,
+        "bitrix_calls": dict(bitrix_stats),
+    }
+
+
+def main_cli() -> int:
+    parser = argparse.ArgumentParser(description="Load test the bot handlers with fake Telegram and a Bitrix stub.")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"), help="Dedicated database with the bot schema")
+    parser.add_argument("--users", type=int, default=100, help="Simulated foremen")
+    parser.add_argument("--concurrency", type=int, default=25, help="Foremen active at the same time")
+    parser.add_argument("--think-ms", type=float, default=0, help="Mean pause between a user's steps")
+    parser.add_argument("--telegram-latency-ms", type=float, default=0)
+    parser.add_argument("--bitrix-latency-ms", type=float, default=100)
+    parser.add_argument("--bitrix-failure-rate", type=float, default=0.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", default=None, help="Write the JSON report here")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        raise SystemExit("--database-url (or BENCH_DATABASE_URL) is required.")
+
+    # Переменные нужны до импорта config/main
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ.setdefault("BOT_TOKEN", "123456:LOADTEST")
+    os.environ["ADMIN_IDS"] = str(LOADTEST_ADMIN_ID)
+
+    report = asyncio.run(run(args))
+    text = json.dumps(report, ensure_ascii=False, indent=2)
+    print(text)
+    if args.output:
+        Path(args.output).write_text(text, encoding="utf-8")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main_cli())
@@ -0,0 +1,376 @@
+#!/usr/bin/env python3
+"""Benchmark for bot.services.supabase_storage on a synthetic dataset.
+
+Provisions the bot schema with the migration runner in a dedicated local
+database, loads synthetic users/forms, times every public storage function
+and the export builders, and writes p50/p95, rows/s and network round trips
+per call (statements sent; one per storage function is expected) to JSON.
+
+    python benchmarks/storage_benchmark.py --database-url postgresql://localhost/supply_bot_bench \\
+        --users 200 --forms 50000 --output bench.json --baseline previous.json
+
+The database is reset (drop schema bot/bot_archive cascade) unless --keep-data is given,
+so never point it at a real deployment.
+"""
+import argparse
+import csv
+import datetime as dt
+import io
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from pathlib import Path
+
+import psycopg
+
+ROOT = Path(__file__).resolve().parents[1]
+sys.path.insert(0, str(ROOT))
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from synthetic_data import load_dataset  # noqa: E402
+
+
+def provision_schema(conn: psycopg.Connection, database_url: str) -> list[str]:
+    from bot.services.migrations import run_migrations
+
+    with conn.cursor() as cur:
+        cur.execute("drop schema if exists bot_archive cascade")
+        cur.execute("drop schema if exists bot cascade")
+    conn.commit()
+    return run_migrations(database_url)
+
+
+def percentile(samples: list[float], pct: float) -> float:
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * (len(ordered) - 1))))
+    return ordered[index]
+
+
+def count_rows(result) -> int:
+    if isinstance(result, tuple) and len(result) == 2 and isinstance(result[1], list):
+        return len(result[1])
+    if isinstance(result, list):
+        return len(result)
+    if isinstance(result, dict) and all(isinstance(v, list) for v in result.values()):
+        return sum(len(v) for v in result.values())
+    if isinstance(result, (bytes, str)):
+        return 1
+    return 1 if result else 0
+
+
+def run_case(func, iterations: int, warmup: int) -> dict:
+    from bot.services import db
+
+    for _ in range(warmup):
+        func()
+    samples = []
+    rows = 0
+    round_trips = db.round_trips()
+    for _ in range(iterations):
+        started = time.perf_counter()
+        result = func()
+        samples.append(time.perf_counter() - started)
+        rows += count_rows(result)
+    round_trips = db.round_trips() - round_trips
+    total = sum(samples)
+    return {
+        "iterations": iterations,
+        "p50_ms": round(percentile(samples, 50) * 1000, 3),
+        "p95_ms": round(percentile(samples, 95) * 1000, 3),
+        "mean_ms": round(statistics.fmean(samples) * 1000, 3),
+        "rows_per_call": round(rows / iterations, 1),
+        "rows_per_s": round(rows / total, 1) if total else 0.0,
+        "round_trips_per_call": round(round_trips / iterations, 2),
+    }
+
+
+# Случаи, которые вызывают несколько функций хранилища: ожидаемое число запросов на вызов
+COMPOSITE_CASES = {"save_form_to_supabase": 3}
+
+
+def build_cases(storage, dataset: dict, rng: random.Random, heavy_iterations: int) -> list[tuple[str, object, int | None]]:
+    user_ids = dataset["user_ids"]
+    form_types = sorted(storage.FORM_TYPES)
+    saved_ids = []
+    counter = {"n": 0}
+
+    def random_user():
+        return rng.choice(user_ids)
+
+    def save_form():
+        counter["n"] += 1
+        form_type = rng.choice(form_types)
+        form = {
+            "user_id": random_user(),
+            "type": form_type,
+            "form_number": storage.get_next_form_number(form_type),
+            "creator_fullname": dataset["sample_fullname"],
+            "created_at": dt.datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
+            "contract_number": f"BENCH-{counter['n']}",
+            "num_contract": f"BENCH-{counter['n']}",
+            "form_text": "1. Брус 150x150 — 10 шт.",
+        }
+        storage.save_form_to_supabase(form)
+        found = storage.get_form_by_type_and_number(form_type, form["form_number"])
+        if found:
+            saved_ids.append(found["id"])
+        return found
+
+    def random_form_id():
+        return rng.randint(1, dataset["forms"])
+
+    def export_flat():
+        grouped = storage.get_forms_grouped_for_export()
+        return [{"type": form_type, **row} for form_type in ("delivery", "refund", "painting", "checkin") for row in grouped[form_type]]
+
+    def export_json():
+        return json.dumps(storage.get_forms_grouped_for_export(), ensure_ascii=False, indent=4)
+
+    def export_csv():
+        grouped = storage.get_forms_grouped_for_export()
+        buffers = []
+        for rows in grouped.values():
+            if not rows:
+                continue
+            buffer = io.StringIO()
+            writer = csv.DictWriter(buffer, fieldnames=list(rows[0].keys()))
+            writer.writeheader()
+            writer.writerows(rows)
+            buffers.append(buffer.getvalue())
+        return buffers
+
+    def export_xlsx():
+        import pandas as pd
+
+        grouped = storage.get_forms_grouped_for_export()
+        buffer = io.BytesIO()
+        with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+            for form_type, rows in grouped.items():
+                if rows:
+                    pd.DataFrame(rows).to_excel(writer, sheet_name=form_type, index=False)
+        return buffer.getvalue()
+
+    def delete_saved_application():
+        return storage.delete_application(saved_ids.pop()) if saved_ids else False
+
+    # (имя, вызов, число итераций или None для значения по умолчанию)
+    return [
+        ("get_user_by_id", lambda: storage.get_user_by_id(random_user()), None),
+        ("list_users", storage.list_users, None),
+        ("is_user_registered", lambda: storage.is_user_registered(random_user()), None),
+        ("is_user_admin", lambda: storage.is_user_admin(random_user()), None),
+        ("get_user_flags", lambda: storage.get_user_flags(random_user()), None),
+        ("get_admin_username", lambda: storage.get_admin_username(dataset["admin_ids"]), None),
+        ("get_user_settings_from_supabase", lambda: storage.get_user_settings_from_supabase(random_user()), None),
+        ("get_user_profile", lambda: storage.get_user_profile(random_user()), None),
+        (
+            "update_user_settings_in_supabase",
+            lambda: storage.update_user_settings_in_supabase(random_user(), {"auto_numbering": rng.random() < 0.5}),
+            None,
+        ),
+        ("update_user_fields", lambda: storage.update_user_fields(random_user(), {"position": rng.choice(["Прораб", "Мастер"])}), None),
+        ("get_next_form_number", lambda: storage.get_next_form_number(rng.choice(form_types)), None),
+        ("save_form_to_supabase", save_form, None),
+        ("get_form_by_type_and_number", lambda: storage.get_form_by_type_and_number(rng.choice(form_types), rng.randint(1, 500)), None),
+        ("get_application_by_id", lambda: storage.get_application_by_id(random_form_id()), None),
+        ("update_application_field", lambda: storage.update_application_field(random_form_id(), "carring", "5 т"), None),
+        ("delete_application", delete_saved_application, None),
+        ("list_applications_by_user", lambda: storage.list_applications_by_user(random_user()), None),
+        ("list_user_applications_page", lambda: storage.list_user_applications_page(random_user()), None),
+        (
+            "list_user_applications_page.older",
+            lambda: storage.list_user_applications_page(
+                random_user(), rng.choice(form_types), older_than=(dt.datetime.now(dt.timezone.utc) - dt.timedelta(days=30), 0)
+            ),
+            None,
+        ),
+        ("list_applications_by_type", lambda: storage.list_applications_by_type(rng.choice(form_types)), heavy_iterations),
+        ("list_recent_contracts", lambda: storage.list_recent_contracts(random_user()), None),
+        ("search_forms", lambda: storage.search_forms(rng.choice(["Брус", "Иванов", "12-3", "утеплитель"])), None),
+        ("get_config_version", lambda: storage.get_config_version("task_routing"), None),
+        ("list_task_routing", storage.list_task_routing, None),
+        ("get_usage_stats", storage.get_usage_stats, None),
+        ("get_form_stats", storage.get_form_stats, None),
+        ("get_forms_export_version", storage.get_forms_export_version, None),
+        ("get_forms_grouped_for_export", storage.get_forms_grouped_for_export, heavy_iterations),
+        ("get_forms_for_export", lambda: storage.get_forms_for_export(rng.choice(form_types)), heavy_iterations),
+        ("export_flat_rows", export_flat, heavy_iterations),
+        ("export_json", export_json, heavy_iterations),
+        ("export_csv", export_csv, heavy_iterations),
+        ("export_xlsx", export_xlsx, heavy_iterations),
+    ]
+
+
+def planning_times(database_url: str, registry: dict) -> dict[str, float | None]:
+    """Planning Time of each registered query, from EXPLAIN with the parameters of its last call."""
+    result = {}
+    with psycopg.connect(database_url, prepare_threshold=None) as conn:
+        for name, query in sorted(registry.items()):
+            if not query.calls:
+                continue
+            try:
+                with conn.cursor() as cur:
+                    cur.execute("explain (summary, format json) " + query.sql, query.last_params)
+                    plan = cur.fetchone()[0]
+                result[name] = round(plan[0]["Planning Time"], 3)
+            except psycopg.Error:
+                result[name] = None
+            conn.rollback()
+    return result
+
+
+def compare_with_baseline(results: dict, baseline_path: Path, threshold: float) -> list[str]:
+    baseline = json.loads(baseline_path.read_text(encoding="utf-8"))["results"]
+    regressions = []
+    for name, current in results.items():
+        previous = baseline.get(name)
+        if not previous or "p95_ms" not in previous or "p95_ms" not in current:
+            continue
+        if previous["p95_ms"] > 0 and current["p95_ms"] > previous["p95_ms"] * threshold:
+            regressions.append(
+                f"{name}: p95 {current['p95_ms']} ms vs {previous['p95_ms']} ms (x{current['p95_ms'] / previous['p95_ms']:.2f})"
+            )
+    return regressions
+
+
+def git_commit() -> str | None:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], cwd=ROOT, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description="Benchmark supabase_storage functions on synthetic data.")
+    parser.add_argument("--database-url", default=os.getenv("BENCH_DATABASE_URL"), help="Dedicated local database (reset!)")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--forms", type=int, default=20000)
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--iterations", type=int, default=50)
+    parser.add_argument("--heavy-iterations", type=int, default=5, help="Iterations for full-table reads and exports")
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--only", action="append", help="Run only these cases (repeatable)")
+    parser.add_argument(
+        "--prepare",
+        choices=["auto", "on", "off"],
+        default="auto",
+        help="Server-side prepared statements for registered queries (auto: off on the transaction pooler)",
+    )
+    parser.add_argument("--keep-data", action="store_true", help="Reuse the already provisioned dataset")
+    parser.add_argument("--output", default="storage_benchmark.json")
+    parser.add_argument("--baseline", default=None, help="Previous JSON result to compare against")
+    parser.add_argument("--threshold", type=float, default=1.25, help="Allowed p95 slowdown factor vs baseline")
+    args = parser.parse_args()
+
+    if not args.database_url:
+        raise SystemExit("--database-url (or BENCH_DATABASE_URL) is required.")
+
+    # Хранилище читает DATABASE_URL из окружения при каждом подключении
+    os.environ["DATABASE_URL"] = args.database_url
+    os.environ["DATABASE_PREPARE"] = args.prepare
+    from bot.services import db
+    from bot.services import supabase_storage as storage
+
+    with psycopg.connect(args.database_url) as conn:
+        if args.keep_data:
+            applied = []
+            with conn.cursor() as cur:
+                cur.execute("select user_id from bot.users order by user_id")
+                user_ids = [row[0] for row in cur.fetchall()]
+                cur.execute("select count(*) from bot.forms")
+                forms = cur.fetchone()[0]
+            dataset = {
+                "user_ids": user_ids,
+                "admin_ids": user_ids[:1],
+                "sample_fullname": storage.get_user_by_id(user_ids[0])["fullname"] if user_ids else "",
+            }
+        else:
+            applied = provision_schema(conn, args.database_url)
+            started = time.perf_counter()
+            dataset = load_dataset(conn, args.users, args.forms, args.days, args.seed)
+            print(f"Loaded {args.users} users / {args.forms} forms in {time.perf_counter() - started:.1f} s")
+            forms = args.forms
+    dataset["forms"] = forms
+
+    rng = random.Random(args.seed)
+    db.reset_query_stats()
+    results = {}
+    for name, func, iterations in build_cases(storage, dataset, rng, args.heavy_iterations):
+        if args.only and name not in args.only:
+            continue
+        try:
+            results[name] = run_case(func, iterations or args.iterations, args.warmup)
+        except Exception as e:
+            results[name] = {"error": f"{type(e).__name__}: {e}"}
+        current = results[name]
+        if "error" in current:
+            print(f"{name:34} ERROR {current['error']}")
+        else:
+            print(
+                f"{name:34} p50 {current['p50_ms']:>9.2f} ms  p95 {current['p95_ms']:>9.2f} ms  "
+                f"{current['rows_per_s']:>11.1f} rows/s  {current['round_trips_per_call']:>5.2f} rt/call"
+            )
+
+    queries = db.query_stats()
+    for name, plan_ms in planning_times(args.database_url, db.QUERY_REGISTRY).items():
+        queries[name]["plan_ms"] = plan_ms
+    print(f"{'query':34} {'calls':>7} {'mean ms':>9} {'plan ms':>9}")
+    for name, stats in queries.items():
+        if stats["calls"]:
+            plan_ms = stats.get("plan_ms")
+            print(f"{name:34} {stats['calls']:>7} {stats['mean_ms']:>9.3f} {plan_ms if plan_ms is not None else '-':>9}")
+
+    extra_round_trips = {
+        name: current["round_trips_per_call"]
+        for name, current in results.items()
+        if current.get("round_trips_per_call", 0) > COMPOSITE_CASES.get(name, 1)
+    }
+    if extra_round_trips:
+        print("Cases with more round trips than expected:")
+        for name, value in extra_round_trips.items():
+            print(f"  {name}: {value}")
+
+    server_prepared = db.server_prepared_statements()
+    print(f"Server-side prepared statements on a pooled connection: {server_prepared}")
+    prepare_broken = db.prepared_statements_enabled() and server_prepared == 0
+    if prepare_broken:
+        print("Prepared statements are enabled, but none were prepared on the server")
+
+    report = {
+        "meta": {
+            "commit": git_commit(),
+            "created_at": dt.datetime.now(dt.timezone.utc).isoformat(),
+            "users": len(dataset["user_ids"]),
+            "forms": forms,
+            "days": args.days,
+            "seed": args.seed,
+            "migrations": applied,
+            "prepared_statements": db.prepared_statements_enabled(),
+            "server_prepared_statements": server_prepared,
+        },
+        "results": results,
+        "queries": queries,
+    }
+    Path(args.output).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding="utf-8")
+    print(f"Results written to {args.output}")
+
+    if prepare_broken:
+        return 1
+    if args.baseline:
+        regressions = compare_with_baseline(results, Path(args.baseline), args.threshold)
+        if regressions:
+            print("Regressions over threshold:")
+            for line in regressions:
+                print(f"  {line}")
+            return 1
+        print(f"No regressions over x{args.threshold} vs {args.baseline}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
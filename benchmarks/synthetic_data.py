@@ -0,0 +1,171 @@
+"""Synthetic users and forms with roughly realistic distributions.
+
+A few active foremen submit most forms (Zipf-like activity), each works on a
+small set of contracts, deliveries dominate, and submissions cluster on
+weekdays during working hours.
+"""
+import datetime as dt
+import random
+
+import psycopg
+from psycopg.types.json import Jsonb
+
+
+FORM_TYPE_WEIGHTS = {
+    "delivery": 0.55,
+    "checkin": 0.2,
+    "refund": 0.15,
+    "painting": 0.1,
+}
+
+DEPARTMENTS = [
+    "Снабжение", "Монтаж", "Производство", "Склад", "Логистика",
+    "Покраска", "Отдел продаж", "Проектный отдел",
+]
+
+LAST_NAMES = ["Иванов", "Петров", "Сидоров", "Кузнецов", "Смирнов", "Попов", "Волков", "Соколов", "Лебедев", "Козлов"]
+FIRST_NAMES = ["Иван", "Пётр", "Сергей", "Алексей", "Дмитрий", "Андрей", "Николай", "Михаил"]
+PATRONYMICS = ["Иванович", "Петрович", "Сергеевич", "Алексеевич", "Дмитриевич", "Андреевич"]
+
+MATERIALS = [
+    "Брус 150x150", "Доска 50x150", "Утеплитель", "Профнастил", "Саморезы", "Гидроизоляция",
+    "Пароизоляция", "Металлочерепица", "Фанера", "Краска фасадная", "Антисептик", "Крепёж",
+]
+
+USER_ID_BASE = 900_000_000
+
+
+def random_fullname(rng: random.Random) -> str:
+    return f"{rng.choice(LAST_NAMES)} {rng.choice(FIRST_NAMES)} {rng.choice(PATRONYMICS)}"
+
+
+def generate_users(count: int, rng: random.Random) -> list[dict]:
+    users = []
+    for index in range(count):
+        users.append(
+            {
+                "user_id": USER_ID_BASE + index,
+                "username": f"foreman_{index}",
+                "fullname": random_fullname(rng),
+                "phone": f"+79{rng.randint(100000000, 999999999)}",
+                "position": rng.choice(["Прораб", "Бригадир", "Мастер", "Снабженец"]),
+                "department": rng.choice(DEPARTMENTS),
+                "approved": True,
+                "admin": index == 0,
+            }
+        )
+    return users
+
+
+def _form_text(rng: random.Random) -> str:
+    lines = rng.sample(MATERIALS, rng.randint(1, 6))
+    return "\n".join(f"{i}. {item} — {rng.randint(1, 200)} шт." for i, item in enumerate(lines, start=1))
+
+
+def _submitted_at(rng: random.Random, days: int, now: dt.datetime) -> dt.datetime:
+    while True:
+        day = now - dt.timedelta(days=rng.randint(0, days - 1))
+        # Выходные встречаются в 5 раз реже будней
+        if day.weekday() < 5 or rng.random() < 0.2:
+            break
+    return day.replace(hour=rng.randint(7, 19), minute=rng.randint(0, 59), second=rng.randint(0, 59), microsecond=0)
+
+
+def generate_forms(users: list[dict], count: int, days: int, rng: random.Random):
+    """Yields form_data dicts in the same shape the bot saves via save_form_to_supabase."""
+    now = dt.datetime.now(dt.timezone.utc)
+    # Zipf-подобная активность: первые пользователи подают большую часть заявок
+    weights = [1 / (rank + 1) for rank in range(len(users))]
+    contracts = {
+        user["user_id"]: [f"{rng.randint(10, 99)}-{rng.randint(100, 999)}/{rng.choice(['24', '25'])}" for _ in range(rng.randint(2, 8))]
+        for user in users
+    }
+    numbers = {form_type: 0 for form_type in FORM_TYPE_WEIGHTS}
+    types = list(FORM_TYPE_WEIGHTS)
+    type_weights = list(FORM_TYPE_WEIGHTS.values())
+
+    for _ in range(count):
+        user = rng.choices(users, weights=weights)[0]
+        form_type = rng.choices(types, weights=type_weights)[0]
+        numbers[form_type] += 1
+        contract = rng.choice(contracts[user["user_id"]])
+        created_at = _submitted_at(rng, days, now)
+        form = {
+            "user_id": user["user_id"],
+            "type": form_type,
+            "form_number": numbers[form_type],
+            "creator_fullname": user["fullname"],
+            "created_at": created_at.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        if form_type == "checkin":
+            form.update(
+                {
+                    "num_contract": contract,
+                    "date": (created_at + dt.timedelta(days=rng.randint(1, 14))).strftime("%d.%m.%Y"),
+                    "name_brig": random_fullname(rng),
+                    "phone_brig": f"+79{rng.randint(100000000, 999999999)}",
+                    "carring": rng.choice(["1.5 т", "3 т", "5 т", "10 т", "20 т"]),
+                }
+            )
+        else:
+            form.update({"contract_number": contract, "form_text": _form_text(rng)})
+        yield form
+
+
+def load_dataset(conn: psycopg.Connection, users: int, forms: int, days: int, seed: int) -> dict:
+    """Loads the synthetic dataset with COPY and returns what the benchmark needs to know about it."""
+    rng = random.Random(seed)
+    user_rows = generate_users(users, rng)
+
+    with conn.cursor() as cur:
+        # bot.forms секционирована по месяцам: партиции нужны на весь период до вставки
+        cur.execute(
+            "select bot.ensure_forms_partitions((current_date - %s)::date, current_date)",
+            (days,),
+        )
+        with cur.copy(
+            "copy bot.users (user_id, username, fullname, phone, position, department, approved, admin, payload) from stdin"
+        ) as copy:
+            for user in user_rows:
+                copy.write_row(
+                    (
+                        user["user_id"], user["username"], user["fullname"], user["phone"],
+                        user["position"], user["department"], user["approved"], user["admin"], Jsonb(user),
+                    )
+                )
+
+        with cur.copy(
+            """
+            copy bot.forms (
+              application_type, form_number, user_id, creator_fullname, contract_number, form_text,
+              checkin_date, brig_name, brig_phone, carring, created_at, payload
+            ) from stdin
+            """
+        ) as copy:
+            for form in generate_forms(user_rows, forms, days, rng):
+                is_checkin = form["type"] == "checkin"
+                copy.write_row(
+                    (
+                        form["type"],
+                        form["form_number"],
+                        form["user_id"],
+                        form["creator_fullname"],
+                        form["num_contract"] if is_checkin else form["contract_number"],
+                        None if is_checkin else form["form_text"],
+                        form.get("date"),
+                        form.get("name_brig"),
+                        form.get("phone_brig"),
+                        form.get("carring"),
+                        dt.datetime.strptime(form["created_at"], "%Y-%m-%d %H:%M:%S").replace(tzinfo=dt.timezone.utc),
+                        Jsonb(form),
+                    )
+                )
+        cur.execute("analyze bot.users")
+        cur.execute("analyze bot.forms")
+    conn.commit()
+
+    return {
+        "user_ids": [user["user_id"] for user in user_rows],
+        "admin_ids": [user_rows[0]["user_id"]] if user_rows else [],
+        "sample_fullname": user_rows[0]["fullname"] if user_rows else "",
+    }
@@ -1,12 +1,27 @@
 ﻿import requests
 import os
 import logging
+import threading
+import time
+from urllib.parse import urlencode
 
 from dotenv import load_dotenv
 
 load_dotenv()
 logger = logging.getLogger(__name__)
 
+# Bitrix24 `batch` принимает не более 50 команд за один запрос
+BITRIX_BATCH_LIMIT = 50
+BITRIX_USER_CACHE_TTL = int(os.getenv("BITRIX_USER_CACHE_TTL", "3600"))
+# (connect, read): недоступный портал должен отваливаться на подключении, а не ждать 15 с
+BITRIX_TIMEOUT = (
+    float(os.getenv("BITRIX_CONNECT_TIMEOUT", "5")),
+    float(os.getenv("BITRIX_READ_TIMEOUT", "15")),
+)
+
+# ФИО -> (время загрузки, профиль Bitrix24)
+_user_cache = {}
+
 
 def _clean_env(value):
     if not value:
@@ -39,84 +54,312 @@ def _build_bitrix_url(method_name):
         "Bitrix webhook is not configured. Set BITRIX_WEBHOOK_URL or URL_BITRIX_API in .env"
     )
 
-def get_bitrix_user_by_fullname(fullname):
+class BitrixUnavailableError(RuntimeError):
+    """Raised without calling Bitrix24 while the circuit breaker is open."""
+
+
+class CircuitBreaker:
     """
-    Returns a Bitrix24 user by surname/name (and second name when provided).
-    Only ACTIVE profiles are eligible.
+    Circuit breaker for Bitrix24 calls.
+
+    closed    - calls pass through, outcomes are tracked in a sliding window;
+    open      - calls fail immediately until `open_seconds` pass;
+    half_open - a single trial call decides between closed and open.
+
+    The breaker opens when at least `minimum_calls` calls in the last
+    `window_seconds` failed at the rate of `failure_rate_threshold` or more.
     """
-    def is_active(user):
-        active = user.get("ACTIVE")
-        if isinstance(active, bool):
-            return active
-        if isinstance(active, (int, float)):
-            return int(active) == 1
-        if isinstance(active, str):
-            return active.strip().upper() in {"Y", "YES", "TRUE", "1"}
-        return False
 
-    def first_active(users):
-        for user in users:
-            if is_active(user):
-                return user
-        return None
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_rate_threshold=0.5, minimum_calls=4, window_seconds=60, open_seconds=30):
+        self.failure_rate_threshold = failure_rate_threshold
+        self.minimum_calls = minimum_calls
+        self.window_seconds = window_seconds
+        self.open_seconds = open_seconds
+        self._lock = threading.Lock()
+        self._state = self.CLOSED
+        self._opened_at = 0.0
+        self._trial_in_flight = False
+        self._calls = []  # (monotonic time, ok)
+        self._last_error = ""
+
+    def _trim(self, now):
+        border = now - self.window_seconds
+        while self._calls and self._calls[0][0] < border:
+            self._calls.pop(0)
+
+    def _open(self, now):
+        self._state = self.OPEN
+        self._opened_at = now
+        self._trial_in_flight = False
+        logger.warning("Bitrix circuit breaker opened: %s", self._last_error)
 
+    def allow_request(self):
+        """Returns True when a call may go out; reserves the trial call in half-open."""
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.OPEN:
+                if now - self._opened_at < self.open_seconds:
+                    return False
+                self._state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self._state == self.HALF_OPEN:
+                if self._trial_in_flight:
+                    return False
+                self._trial_in_flight = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            now = time.monotonic()
+            if self._state == self.HALF_OPEN:
+                logger.info("Bitrix circuit breaker closed")
+                self._state = self.CLOSED
+                self._trial_in_flight = False
+                self._calls.clear()
+            self._calls.append((now, True))
+            self._trim(now)
+
+    def record_failure(self, error=""):
+        with self._lock:
+            now = time.monotonic()
+            self._last_error = str(error)
+            if self._state == self.HALF_OPEN:
+                self._open(now)
+                return
+            self._calls.append((now, False))
+            self._trim(now)
+            failures = sum(1 for _, ok in self._calls if not ok)
+            if (
+                self._state == self.CLOSED
+                and len(self._calls) >= self.minimum_calls
+                and failures / len(self._calls) >= self.failure_rate_threshold
+            ):
+                self._open(now)
+
+    def is_open(self):
+        """True while calls are being rejected (open state before the cooldown ends)."""
+        with self._lock:
+            return self._state == self.OPEN and time.monotonic() - self._opened_at < self.open_seconds
+
+    def snapshot(self):
+        with self._lock:
+            now = time.monotonic()
+            self._trim(now)
+            failures = sum(1 for _, ok in self._calls if not ok)
+            retry_in = 0
+            if self._state == self.OPEN:
+                retry_in = max(0, int(self.open_seconds - (now - self._opened_at)))
+            return {
+                "state": self._state,
+                "calls": len(self._calls),
+                "failures": failures,
+                "retry_in": retry_in,
+                "last_error": self._last_error,
+            }
+
+
+bitrix_breaker = CircuitBreaker(
+    failure_rate_threshold=float(os.getenv("BITRIX_BREAKER_FAILURE_RATE", "0.5")),
+    minimum_calls=int(os.getenv("BITRIX_BREAKER_MIN_CALLS", "4")),
+    window_seconds=int(os.getenv("BITRIX_BREAKER_WINDOW", "60")),
+    open_seconds=int(os.getenv("BITRIX_BREAKER_OPEN_SECONDS", "30")),
+)
+
+
+def _bitrix_request(method, url, **kwargs):
+    """
+    Sends an HTTP request to Bitrix24 through the circuit breaker.
+    Network errors and 5xx responses count as failures, any other reply
+    (including REST-level errors) proves the portal is reachable.
+    """
+    if not bitrix_breaker.allow_request():
+        raise BitrixUnavailableError("Bitrix24 is temporarily unavailable (circuit breaker is open)")
     try:
-        parts = fullname.split()
-        if len(parts) < 2:
-            logger.warning("Bitrix user lookup requires at least last name and first name")
-            return None
-
-        last_name = parts[0]
-        first_name = parts[1]
-        headers = _bitrix_headers()
-        endpoint = _build_bitrix_url("user.search")
-
-        def find_active_user(params, label):
-            response = requests.get(endpoint, headers=headers, params=params, timeout=15)
-            if response.status_code != 200:
-                logger.warning(
-                    "Bitrix user search failed (%s), status=%s",
-                    label,
-                    response.status_code
-                )
-                return None
+        response = requests.request(method, url, timeout=BITRIX_TIMEOUT, **kwargs)
+    except requests.RequestException as e:
+        bitrix_breaker.record_failure(e)
+        raise
+    if response.status_code >= 500:
+        bitrix_breaker.record_failure(f"HTTP {response.status_code}")
+    else:
+        bitrix_breaker.record_success()
+    return response
 
-            users = response.json().get("result", [])
-            active_user = first_active(users)
-            if active_user:
-                logger.info("Active Bitrix user found (%s)", label)
-                return active_user
 
-            if users:
-                logger.info("Bitrix users found but all inactive (%s)", label)
-            else:
-                logger.info("No Bitrix users found (%s)", label)
-            return None
+def _is_active_user(user):
+    active = user.get("ACTIVE")
+    if isinstance(active, bool):
+        return active
+    if isinstance(active, (int, float)):
+        return int(active) == 1
+    if isinstance(active, str):
+        return active.strip().upper() in {"Y", "YES", "TRUE", "1"}
+    return False
+
+
+def _first_active_user(users):
+    for user in users or []:
+        if _is_active_user(user):
+            return user
+    return None
+
+
+def _flatten_params(params, prefix=""):
+    """Flattens nested fields into Bitrix query keys: fields[AUDITORS][0]=1."""
+    items = []
+    if isinstance(params, dict):
+        pairs = params.items()
+    else:
+        pairs = enumerate(params)
+    for key, value in pairs:
+        name = f"{prefix}[{key}]" if prefix else str(key)
+        if isinstance(value, (dict, list, tuple)):
+            items.extend(_flatten_params(value, name))
+        elif value is not None:
+            items.append((name, value))
+    return items
+
+
+def build_batch_command(method_name, params=None):
+    """Builds one `cmd` entry for the Bitrix24 `batch` method."""
+    if not params:
+        return method_name
+    return f"{method_name}?{urlencode(_flatten_params(params))}"
+
+
+def call_bitrix_batch(commands, halt=False):
+    """
+    Runs named commands through the Bitrix24 `batch` method.
+
+    Bitrix accepts at most 50 commands per request, larger sets are split
+    into several requests. Returns (results, errors) keyed by command name.
+    Raises RuntimeError when the batch request itself fails.
+    """
+    headers = _bitrix_headers()
+    endpoint = _build_bitrix_url("batch")
+    names = list(commands)
+    results = {}
+    errors = {}
+
+    for offset in range(0, len(names), BITRIX_BATCH_LIMIT):
+        chunk = {name: commands[name] for name in names[offset:offset + BITRIX_BATCH_LIMIT]}
+        response = _bitrix_request(
+            "POST",
+            endpoint,
+            json={"halt": 1 if halt else 0, "cmd": chunk},
+            headers=headers
+        )
+        if response.status_code != 200:
+            raise RuntimeError(f"Bitrix batch request failed (status={response.status_code})")
+
+        payload = response.json()
+        if "result" not in payload:
+            raise RuntimeError(payload.get("error_description", "Bitrix batch returned no result"))
+
+        # Пустые словари PHP сериализует как [], поэтому нормализуем оба поля
+        batch_result = payload["result"].get("result") or {}
+        batch_errors = payload["result"].get("result_error") or {}
+        results.update(batch_result if isinstance(batch_result, dict) else {})
+        errors.update(batch_errors if isinstance(batch_errors, dict) else {})
+
+        if halt and errors:
+            break
 
+    return results, errors
+
+
+def _user_search_commands(fullname):
+    """Returns batch commands for both lookup steps, or None for a malformed name."""
+    parts = (fullname or "").split()
+    if len(parts) < 2:
+        return None
+
+    last_name, first_name = parts[0], parts[1]
+    commands = {
         # Step 1: search by LAST_NAME + FIRST_NAME.
-        user = find_active_user(
-            {'FILTER[NAME_SEARCH]': f"{last_name} {first_name}"},
-            "last_name first_name"
+        "name": build_batch_command(
+            "user.search",
+            {"FILTER": {"NAME_SEARCH": f"{last_name} {first_name}"}}
         )
+    }
+    if len(parts) >= 3:
+        # Step 2: refine by SECOND_NAME if provided.
+        commands["second_name"] = build_batch_command(
+            "user.search",
+            {"FILTER": {"NAME_SEARCH": f"{last_name} {first_name}", "SECOND_NAME": parts[2]}}
+        )
+    return commands
+
+
+def _get_cached_user(fullname):
+    cached = _user_cache.get(fullname)
+    if cached and time.monotonic() - cached[0] < BITRIX_USER_CACHE_TTL:
+        return cached[1]
+    return None
+
+
+def resolve_bitrix_users(fullnames):
+    """
+    Resolves several full names to ACTIVE Bitrix24 users.
+
+    Both lookup steps of every uncached name go into one batch request.
+    Returns {fullname: user or None}.
+    """
+    resolved = {}
+    commands = {}
+    for index, fullname in enumerate(dict.fromkeys(fullnames)):
+        user = _get_cached_user(fullname)
         if user:
-            return user
+            resolved[fullname] = user
+            continue
+        user_commands = _user_search_commands(fullname)
+        if not user_commands:
+            logger.warning("Bitrix user lookup requires at least last name and first name")
+            resolved[fullname] = None
+            continue
+        for step, command in user_commands.items():
+            commands[f"u{index}_{step}"] = (fullname, step, command)
 
-        # Step 2: refine by SECOND_NAME if provided.
-        if len(parts) >= 3:
-            second_name = parts[2]
-            user = find_active_user(
-                {
-                    'FILTER[NAME_SEARCH]': f"{last_name} {first_name}",
-                    'FILTER[SECOND_NAME]': second_name
-                },
-                "last_name first_name second_name"
-            )
-            if user:
-                return user
-
-        logger.info("No ACTIVE Bitrix24 profile found")
-        return None
+    if not commands:
+        return resolved
+
+    results, errors = call_bitrix_batch({key: value[2] for key, value in commands.items()})
+    for key, error in errors.items():
+        logger.warning("Bitrix user search failed (%s): %s", key, error)
 
+    found = {}
+    for key, (fullname, step, _) in commands.items():
+        found.setdefault(fullname, {})[step] = results.get(key) or []
+
+    for fullname, steps in found.items():
+        user = _first_active_user(steps.get("name")) or _first_active_user(steps.get("second_name"))
+        if user:
+            logger.info("Active Bitrix user found")
+            _user_cache[fullname] = (time.monotonic(), user)
+        elif any(steps.values()):
+            logger.info("Bitrix users found but all inactive")
+        else:
+            logger.info("No ACTIVE Bitrix24 profile found")
+        resolved[fullname] = user
+
+    return resolved
+
+
+def get_bitrix_user_by_fullname(fullname):
+    """
+    Returns a Bitrix24 user by surname/name (and second name when provided).
+    Only ACTIVE profiles are eligible.
+    Both lookup steps run in a single batch request, found users are cached.
+    Raises BitrixUnavailableError while the circuit breaker is open.
+    """
+    try:
+        return resolve_bitrix_users([fullname]).get(fullname)
+    except BitrixUnavailableError:
+        raise
     except Exception as e:
         logger.exception("Unexpected error in Bitrix user lookup: %s", e)
         return None
@@ -140,11 +383,11 @@ def create_bitrix_task_as_user(user_id, task_title, task_description):
     
     try:
         # Отправляем POST запрос для создания задачи
-        response = requests.post(
+        response = _bitrix_request(
+            "POST",
             task_add_url,
             json=task_data,
-            headers=headers,
-            timeout=15
+            headers=headers
         )
         
         # Проверяем статус ответа
@@ -167,6 +410,52 @@ def create_bitrix_task_as_user(user_id, task_title, task_description):
         logger.exception("Unexpected error while creating Bitrix task: %s", e)
         return False
 
+def _normalize_responsible_id(responsible_id):
+    # Если ответственный не указан или некорректен, используем значение по умолчанию (1)
+    if responsible_id is None:
+        return 1
+    try:
+        return int(responsible_id)
+    except (TypeError, ValueError):
+        return 1
+
+
+def _normalize_auditors(auditors):
+    # Преобразуем список аудиторов в список целых чисел
+    if auditors is None:
+        return [1]  # По умолчанию
+    try:
+        # Если auditors - строка, пытаемся преобразовать ее в список
+        if isinstance(auditors, str):
+            import ast
+            try:
+                auditors = ast.literal_eval(auditors)
+            except (ValueError, SyntaxError):
+                auditors = auditors.strip('[]').replace("'", "").replace('"', '').split(',')
+
+        # Проверяем, что все элементы можно преобразовать в целые числа
+        auditors = [int(auditor.strip()) if isinstance(auditor, str) else int(auditor)
+                    for auditor in auditors if auditor and str(auditor).strip()]
+
+        # Если список пуст после фильтрации, используем значение по умолчанию
+        return auditors or [1]
+    except (TypeError, ValueError) as e:
+        logger.warning("Invalid Bitrix auditors list; fallback to default. Details: %s", e)
+        return [1]  # В случае ошибки используем значение по умолчанию
+
+
+def build_task_fields(creator_id, title, description, responsible_id=None, auditors=None):
+    """Returns `fields` for task.item.add with normalized responsible and auditors."""
+    return {
+        "TITLE": title,
+        "DESCRIPTION": description,
+        "RESPONSIBLE_ID": _normalize_responsible_id(responsible_id),  # ID ответственного
+        "CREATED_BY": creator_id,  # ID создателя
+        "ALLOW_TIME_TRACKING": "N",
+        "AUDITORS": _normalize_auditors(auditors)  # Массив ID аудиторов
+    }
+
+
 def create_bitrix_task_with_responsible(creator_id, title, description, responsible_id=None, auditors=None):
     """
     Создает задачу в Bitrix24 с указанием ответственного и аудиторов
@@ -181,63 +470,22 @@ def create_bitrix_task_with_responsible(creator_id, title, description, responsi
     Returns:
         bool: True если задача создана успешно, False в противном случае
     """
-    # Если ответственный не указан, используем значение по умолчанию (1)
-    if responsible_id is None:
-        responsible_id = 1
-    else:
-        try:
-            responsible_id = int(responsible_id)
-        except (TypeError, ValueError):
-            # Если не удалось преобразовать в число, используем значение по умолчанию
-            responsible_id = 1
-    
-    # Преобразуем список аудиторов в список целых чисел
-    if auditors is None:
-        auditors = [1]  # По умолчанию
-    else:
-        try:
-            # Если auditors - строка, пытаемся преобразовать ее в список
-            if isinstance(auditors, str):
-                import ast
-                try:
-                    auditors = ast.literal_eval(auditors)
-                except (ValueError, SyntaxError):
-                    auditors = auditors.strip('[]').replace("'", "").replace('"', '').split(',')
-            
-            # Проверяем, что все элементы можно преобразовать в целые числа
-            auditors = [int(auditor.strip()) if isinstance(auditor, str) else int(auditor) 
-                        for auditor in auditors if auditor and str(auditor).strip()]
-            
-            # Если список пуст после фильтрации, используем значение по умолчанию
-            if not auditors:
-                auditors = [1]
-        except (TypeError, ValueError) as e:
-            logger.warning("Invalid Bitrix auditors list; fallback to default. Details: %s", e)
-            auditors = [1]  # В случае ошибки используем значение по умолчанию
-    
     # Заголовки для запроса
     headers = _bitrix_headers()
     task_add_url = _build_bitrix_url("task.item.add")
     
     # Данные для создания задачи
     task_data = {
-        "fields": {
-            "TITLE": title,
-            "DESCRIPTION": description,
-            "RESPONSIBLE_ID": responsible_id,  # ID ответственного
-            "CREATED_BY": creator_id,  # ID создателя
-            "ALLOW_TIME_TRACKING": "N",
-            "AUDITORS": auditors  # Массив ID аудиторов
-        }
+        "fields": build_task_fields(creator_id, title, description, responsible_id, auditors)
     }
     
     try:
         # Отправляем POST запрос для создания задачи
-        response = requests.post(
+        response = _bitrix_request(
+            "POST",
             task_add_url,
             json=task_data,
-            headers=headers,
-            timeout=15
+            headers=headers
         )
         
         # Проверяем статус ответа
@@ -1,16 +1,17 @@
-from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup, ReplyKeyboardRemove
+from telegram import Update, ReplyKeyboardMarkup, KeyboardButton, InlineKeyboardButton, InlineKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, CallbackQueryHandler, filters
+from telegram.error import BadRequest
 from bot.commands.utils import (
     is_admin, get_reply_keyboard, check_user_registration,
     get_user_by_id, update_user_data, get_user_applications,
     format_user_info, format_application_info,
-    get_user_management_keyboard, get_user_actions_keyboard
+    get_user_management_keyboard
 )
 import logging
+import html
 import json
 import os
 import csv
-import pandas as pd
 import matplotlib.pyplot as plt
 from io import BytesIO
 import tempfile
@@ -18,17 +19,108 @@ import matplotlib as mpl
 from matplotlib.font_manager import FontProperties
 import asyncio
 import time
+from bitrix_addon import CircuitBreaker, bitrix_breaker
+from bot.services import exports
+from bot.services.task_routing import (
+    get_routing_rule,
+    get_routing_rules,
+    parse_auditors,
+    update_routing_rule,
+    validate_title_template,
+)
 from bot.services.supabase_storage import (
     delete_application,
     delete_user as delete_user_from_supabase,
     get_application_by_id,
+    get_form_stats,
+    get_forms_export_version,
     get_forms_grouped_for_export,
     get_usage_stats,
     list_applications_by_type,
     list_users,
+    search_forms,
     update_application_field,
 )
 
+def get_admin_panel_keyboard() -> ReplyKeyboardMarkup:
+    """Клавиатура админ-панели"""
+    return ReplyKeyboardMarkup(
+        [
+            [KeyboardButton("👥 Управление пользователями")],
+            [KeyboardButton("📊 Статистика"), KeyboardButton("📈 Потребление")],
+            [KeyboardButton("📥 Загрузить таблицу"), KeyboardButton("🔎 Поиск")],
+            [KeyboardButton("🧭 Маршруты задач")],
+            [KeyboardButton("🔙 На главную")]
+        ],
+        resize_keyboard=True
+    )
+
+# Кнопки админ-панели: их текст не принимается как поисковый запрос или значение маршрута
+ADMIN_PANEL_BUTTONS = frozenset({
+    "⚙️ Админ-панель", "👥 Управление пользователями", "📋 Список заявок", "📊 Статистика",
+    "📈 Потребление", "📥 Загрузить таблицу", "🔎 Поиск", "🧭 Маршруты задач",
+    "🔙 На главную", "🔙 Вернуться",
+})
+
+
+async def clear_pending_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Снимает ожидание поискового запроса и значения маршрута при нажатии кнопки панели"""
+    context.user_data.pop('waiting_for_routing_value', None)
+    context.user_data.pop('waiting_for_search_query', None)
+
+# Экраны админки, которые показываются одним сообщением и редактируются на месте
+ADMIN_SCREEN_USERS = "users"
+ADMIN_SCREEN_APPLICATIONS = "applications"
+
+
+async def _show_admin_screen(update: Update, context: ContextTypes.DEFAULT_TYPE, screen: str, text: str,
+                             reply_markup=None, in_place: bool = False):
+    """Показывает экран одним сообщением: из callback — правкой нажатого сообщения,
+    при in_place — правкой последнего сообщения экрана, иначе новым сообщением.
+    id сообщения экрана хранится в user_data['admin_message_ids']."""
+    message_ids = context.user_data.setdefault('admin_message_ids', {})
+    query = update.callback_query
+    if query and query.message:
+        message_id = query.message.message_id
+    else:
+        message_id = message_ids.get(screen) if in_place else None
+
+    if message_id:
+        try:
+            await context.bot.edit_message_text(
+                chat_id=update.effective_chat.id,
+                message_id=message_id,
+                text=text,
+                reply_markup=reply_markup
+            )
+            message_ids[screen] = message_id
+            return
+        except BadRequest as e:
+            if "not modified" in str(e).lower():
+                message_ids[screen] = message_id
+                return
+            # Сообщение удалено или слишком старое — показываем экран новым
+            logging.warning(f"Не удалось обновить экран {screen}: {e}")
+
+    message = await context.bot.send_message(
+        chat_id=update.effective_chat.id,
+        text=text,
+        reply_markup=reply_markup
+    )
+    message_ids[screen] = message.message_id
+
+def format_bitrix_state() -> str:
+    """Строка о состоянии интеграции с Битрикс24 (circuit breaker)"""
+    state = bitrix_breaker.snapshot()
+    if state["state"] == CircuitBreaker.OPEN:
+        return (
+            f"🔴 Битрикс24: недоступен, запросы отклоняются (повтор через {state['retry_in']} с)\n"
+            f"Последняя ошибка: {state['last_error'] or 'нет данных'}"
+        )
+    if state["state"] == CircuitBreaker.HALF_OPEN:
+        return "🟡 Битрикс24: проверка доступности"
+    return f"🟢 Битрикс24: работает (ошибок {state['failures']} из {state['calls']} за {bitrix_breaker.window_seconds} с)"
+
 async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     
@@ -40,127 +132,82 @@ async def admin_panel(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return
     
     # Клавиатура только для админов
-    admin_keyboard = ReplyKeyboardMarkup(
-        [
-            [KeyboardButton("👥 Управление пользователями")],
-
-            [KeyboardButton("📥 Загрузить таблицу"), KeyboardButton("📈 Потребление")],
-            [KeyboardButton("🔙 На главную")]
-        ],
-        resize_keyboard=True
-    )
+    admin_keyboard = get_admin_panel_keyboard()
     
     await update.message.reply_text(
-        "⚙️ Админ-панель:",
+        f"⚙️ Админ-панель:\n\n{format_bitrix_state()}",
         reply_markup=admin_keyboard
     )
 
 async def handle_user_management(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик кнопки управления пользователями"""
     if not is_admin(update.effective_user.id):
-        await update.message.reply_text("⛔ У вас нет прав для управления пользователями")
+        await update.effective_message.reply_text("⛔ У вас нет прав для управления пользователями")
         return
     
     try:
         users = list_users()
         
-        if not users:
-            await update.message.reply_text("Список пользователей пуст")
-            return
-        
         # Сохраняем список пользователей в контексте
         context.user_data['users'] = users
         # Если current_page не установлен или выходит за пределы списка, устанавливаем 0
         if 'current_page' not in context.user_data or context.user_data['current_page'] >= len(users):
             context.user_data['current_page'] = 0
         
-        # Отправляем информацию о пользователе с навигационными кнопками
-        # Эта функция создаст все необходимые клавиатуры и сообщения
         await send_user_list(update, context)
     except Exception as e:
         logging.error(f"Ошибка получения списка пользователей: {e}")
-        await update.message.reply_text("Ошибка при получении списка пользователей")
+        await update.effective_message.reply_text("Ошибка при получении списка пользователей")
+
+def get_user_card_keyboard(user_id, current_page: int, total: int) -> InlineKeyboardMarkup:
+    """Навигация по списку и действия с пользователем в одной инлайн-клавиатуре"""
+    nav_buttons = []
+    if current_page > 0:
+        nav_buttons.append(InlineKeyboardButton("◀️", callback_data=f"admin_users_page_{current_page - 1}"))
+    if current_page < total - 1:
+        nav_buttons.append(InlineKeyboardButton("▶️", callback_data=f"admin_users_page_{current_page + 1}"))
+    
+    keyboard = [nav_buttons] if nav_buttons else []
+    keyboard += [
+        [InlineKeyboardButton("✏️ Редактировать", callback_data=f"edit_user_{user_id}")],
+        [InlineKeyboardButton("❌ Удалить", callback_data=f"delete_user_{user_id}")],
+        [InlineKeyboardButton("📋 Заявки пользователя", callback_data=f"user_applications_{user_id}")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
 
-async def send_user_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Отправляет информацию о текущем пользователе с правильными кнопками навигации"""
+async def send_user_list(update: Update, context: ContextTypes.DEFAULT_TYPE, in_place: bool = False, notice: str = None):
+    """Показывает текущего пользователя списка одним сообщением с навигацией и действиями"""
     users = context.user_data.get('users', [])
     current_page = context.user_data.get('current_page', 0)
+    prefix = f"{notice}\n\n" if notice else ""
     
     if not users:
-        if update.message:
-            await update.message.reply_text("Список пользователей пуст")
-        else:
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text="Список пользователей пуст"
-            )
+        await _show_admin_screen(update, context, ADMIN_SCREEN_USERS, f"{prefix}Список пользователей пуст", in_place=in_place)
         return
     
     # Получаем текущего пользователя
     user = users[current_page]
     
-    message = f"Пользователь {current_page + 1} из {len(users)}:\n\n"
-    message += f"👤 Имя: {user.get('username', 'Без имени')}\n"
-    message += f"🆔 ID: {user.get('user_id')}\n\n"
-    message += f"📱 Телефон: {user.get('phone', 'Не указан')}\n"
-    message += f"👨‍💼 ФИО: {user.get('fullname', 'Не указано')}\n"
-    message += f"🏢 Должность: {user.get('position', 'Не указана')}\n"
-    message += f"🏢 Отдел: {user.get('department', 'Не указан')}\n\n"
-    message += f"👑 Админ: {'Да' if user.get('admin', False) else 'Нет'}\n"
-    message += f"✅ Подтвержден: {'Да' if user.get('approved', False) else 'Нет'}\n"
-    
-    # Создаем клавиатуру с кнопками навигации
-    nav_buttons = []
-    
-    # Если это не первый пользователь - добавляем кнопку "<"
-    if current_page > 0:
-        nav_buttons.append(KeyboardButton("<"))
-    
-    # Всегда добавляем кнопку "Вернуться"
-    nav_buttons.append(KeyboardButton("🔙 Вернуться"))
-    
-    # Если это не последний пользователь - добавляем кнопку ">"
-    if current_page < len(users) - 1:
-        nav_buttons.append(KeyboardButton(">"))
-    
-    reply_markup = ReplyKeyboardMarkup([nav_buttons], resize_keyboard=True)
-    
-    # Дополнительно показываем инлайн-кнопки действий для пользователя
-    inline_keyboard = [
-        [InlineKeyboardButton("✏️ Редактировать", callback_data=f"edit_user_{user.get('user_id')}")],
-        [InlineKeyboardButton("❌ Удалить", callback_data=f"delete_user_{user.get('user_id')}")],
-        [InlineKeyboardButton("📋 Заявки пользователя", callback_data=f"user_applications_{user.get('user_id')}")]
-    ]
-    inline_markup = InlineKeyboardMarkup(inline_keyboard)
-    
-    # В зависимости от типа апдейта (сообщение или callback) отправляем сообщения
-    if update.message:
-        # Отправляем сообщение с информацией о пользователе
-        await update.message.reply_text(
-        message,
-            reply_markup=reply_markup
-        )
-        
-        # Отправляем второе сообщение с инлайн-кнопками для действий
-        await update.message.reply_text(
-            "Действия с пользователем:",
-            reply_markup=inline_markup
-        )
-    else:
-        # Если это callback_query, используем context.bot.send_message
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text=message,
-            reply_markup=reply_markup
-        )
-        
-        # Отправляем второе сообщение с инлайн-кнопками для действий
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text="Действия с пользователем:",
-            reply_markup=inline_markup
+    message = f"{prefix}Пользователь {current_page + 1} из {len(users)}:\n\n" + format_user_info(user)
+    await _show_admin_screen(
+        update, context, ADMIN_SCREEN_USERS, message,
+        reply_markup=get_user_card_keyboard(user.get('user_id'), current_page, len(users)),
+        in_place=in_place
     )
 
+async def handle_user_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Листание списка пользователей инлайн-кнопками ◀️/▶️"""
+    query = update.callback_query
+    await query.answer()
+    
+    users = context.user_data.get('users')
+    if users is None:
+        # Список из прошлой сессии бота — загружаем заново
+        users = context.user_data['users'] = list_users()
+    page = int(query.data.rsplit("_", 1)[1])
+    context.user_data['current_page'] = min(max(page, 0), max(len(users) - 1, 0))
+    await send_user_list(update, context)
+
 async def handle_user_list(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик отображения списка пользователей с пагинацией"""
     query = update.callback_query
@@ -217,16 +264,9 @@ async def handle_user_edit(update: Update, context: ContextTypes.DEFAULT_TYPE, u
         await query.edit_message_text("Пользователь не найден")
         return
     
-    # Убираем ReplyKeyboard
-    await context.bot.send_message(
-        chat_id=query.message.chat_id,
-        text="Редактирование пользователя",
-        reply_markup=ReplyKeyboardRemove()
-    )
-    
-    # Отправляем сообщение с кнопками редактирования
-    await query.edit_message_text(
-        format_user_info(user),
+    # Карточка, запросы ввода и результат правки показываются в этом же сообщении
+    await _show_admin_screen(
+        update, context, ADMIN_SCREEN_USERS, format_user_info(user),
         reply_markup=get_user_edit_keyboard(user_id, user.get('admin', False))
     )
 
@@ -274,29 +314,8 @@ async def handle_confirm_delete(update: Update, context: ContextTypes.DEFAULT_TY
         if current_page >= len(users):
             context.user_data['current_page'] = max(0, len(users) - 1)
         
-        # Показываем сообщение об успешном удалении
-        await query.edit_message_text("✅ Пользователь успешно удален")
-        
-        # Если есть еще пользователи, показываем следующего
-        if users:
-            # Создаем новое сообщение с информацией о следующем пользователе
-            user = users[context.user_data['current_page']]
-            message = f"Режим редактирования данных:\n\n"
-            message += f"Пользователь {context.user_data['current_page'] + 1} из {len(users)}:\n\n"
-            message += f"👤 Имя: {user.get('username', 'Без имени')}\n"
-            message += f"🆔 ID: {user.get('user_id')}\n"
-            message += f"📱 Телефон: {user.get('phone', 'Не указан')}\n"
-            message += f"📧 Email: {user.get('email', 'Не указан')}\n"
-            message += f"👑 Админ: {'Да' if user.get('admin', False) else 'Нет'}\n"
-            message += f"✅ Подтвержден: {'Да' if user.get('approved', False) else 'Нет'}\n"
-            
-            await update.effective_message.reply_text(
-                message,
-                reply_markup=get_user_actions_keyboard(user.get('user_id'))
-            )
-        else:
-            # Если пользователей не осталось, возвращаемся в админ-панель
-            await admin_panel(update, context)
+        # Следующий пользователь списка показывается в этом же сообщении
+        await send_user_list(update, context, notice="✅ Пользователь успешно удален")
     except Exception as e:
         logging.error(f"Ошибка при удалении пользователя: {e}")
         await query.edit_message_text("❌ Ошибка при удалении пользователя")
@@ -404,12 +423,52 @@ def _build_flat_export_rows(grouped_data: dict) -> list[dict]:
     return rows
 
 
+# Ключ bot_data: {формат: (версия данных, file_id)} последней отправленной выгрузки
+EXPORT_FILE_IDS_KEY = "export_file_ids"
+
+
+def _get_export_version() -> str | None:
+    """Версия данных для выгрузки; None — версию узнать не удалось, файл создаётся заново"""
+    try:
+        return get_forms_export_version()
+    except Exception as e:
+        logging.error(f"Ошибка получения версии данных для выгрузки: {e}")
+        return None
+
+
+def _remember_export(context: ContextTypes.DEFAULT_TYPE, export_format: str, version: str | None, message) -> None:
+    """Запоминает file_id отправленного файла, чтобы при неизменных данных не загружать его снова"""
+    if version is not None and message and message.document:
+        context.bot_data.setdefault(EXPORT_FILE_IDS_KEY, {})[export_format] = (version, message.document.file_id)
+
+
+async def _send_cached_export(query, context: ContextTypes.DEFAULT_TYPE, export_format: str, version: str | None, caption: str) -> bool:
+    """Отправляет сохранённый файл по file_id, если данные не менялись с прошлой выгрузки"""
+    cached = context.bot_data.get(EXPORT_FILE_IDS_KEY, {}).get(export_format)
+    if version is None or not cached or cached[0] != version:
+        return False
+
+    try:
+        await context.bot.send_document(chat_id=query.message.chat_id, document=cached[1], caption=caption)
+    except BadRequest as e:
+        # file_id мог устареть — создаём файл заново
+        logging.warning(f"Не удалось отправить сохранённую выгрузку {export_format}: {e}")
+        context.bot_data[EXPORT_FILE_IDS_KEY].pop(export_format, None)
+        return False
+    return True
+
+
 async def handle_upload_table(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик выгрузки таблицы заявок в формате CSV"""
     query = update.callback_query
     await query.answer()
+    caption = "✅ Таблица успешно экспортирована из Supabase в формате CSV"
     
     try:
+        version = _get_export_version()
+        if await _send_cached_export(query, context, "csv_flat", version, caption):
+            return
+
         grouped = _get_forms_export_data()
         rows = _build_flat_export_rows(grouped)
 
@@ -426,12 +485,13 @@ async def handle_upload_table(update: Update, context: ContextTypes.DEFAULT_TYPE
                 writer.writerows(rows)
         
         with open(filename, 'rb') as f:
-            await context.bot.send_document(
+            message = await context.bot.send_document(
                 chat_id=query.message.chat_id,
                 document=f,
                 filename=filename,
-                caption="✅ Таблица успешно экспортирована из Supabase в формате CSV"
+                caption=caption
             )
+        _remember_export(context, "csv_flat", version, message)
         
         os.remove(filename)
         
@@ -443,41 +503,27 @@ async def handle_download_xlsx(update: Update, context: ContextTypes.DEFAULT_TYP
     """Обработчик скачивания таблицы в формате XLSX"""
     query = update.callback_query
     await query.answer()
+    caption = "✅ Таблица успешно экспортирована из Supabase в формате XLSX"
+
+    version = _get_export_version()
+    if await _send_cached_export(query, context, "xlsx", version, caption):
+        await query.edit_message_text("📎 Данные не менялись с прошлой выгрузки, отправлен тот же XLSX файл")
+        return
     
     # Удаляем кнопки и показываем сообщение об ожидании
     await query.edit_message_text("⏳ Пожалуйста, подождите. Создаю XLSX файл...")
     
     try:
-        grouped = _get_forms_export_data()
+        # Листы запрашиваются параллельно, книга собирается в отдельном процессе
+        content = await exports.build_xlsx(FORM_TYPE_LABELS)
 
-        with tempfile.NamedTemporaryFile(suffix='.xlsx', delete=False) as temp_file:
-            excel_file_path = temp_file.name
-        
-        with pd.ExcelWriter(excel_file_path, engine='openpyxl') as writer:
-            has_rows = False
-            for form_type in ("delivery", "refund", "painting", "checkin"):
-                rows = grouped.get(form_type, [])
-                if not rows:
-                    continue
-                has_rows = True
-                df = pd.DataFrame(rows)
-                sheet_name = FORM_TYPE_LABELS.get(form_type, form_type)[:31]
-                df.to_excel(writer, sheet_name=sheet_name, index=False)
-
-            if not has_rows:
-                pd.DataFrame([{"info": "Нет данных в Supabase"}]).to_excel(
-                    writer, sheet_name="export", index=False
-                )
-        
-        with open(excel_file_path, 'rb') as f:
-            await context.bot.send_document(
-                chat_id=query.message.chat_id,
-                document=f,
-                filename="supabase_export.xlsx",
-                caption="✅ Таблица успешно экспортирована из Supabase в формате XLSX"
-            )
-        
-        os.remove(excel_file_path)
+        message = await context.bot.send_document(
+            chat_id=query.message.chat_id,
+            document=content,
+            filename="supabase_export.xlsx",
+            caption=caption
+        )
+        _remember_export(context, "xlsx", version, message)
         
     except ImportError:
         await query.edit_message_text("❌ Ошибка: библиотека pandas не установлена. Используйте 'pip install pandas openpyxl' для установки.")
@@ -489,6 +535,12 @@ async def handle_download_json(update: Update, context: ContextTypes.DEFAULT_TYP
     """Обработчик скачивания таблицы в формате JSON"""
     query = update.callback_query
     await query.answer()
+    caption = "✅ Таблица успешно экспортирована из Supabase в формате JSON"
+
+    version = _get_export_version()
+    if await _send_cached_export(query, context, "json", version, caption):
+        await query.edit_message_text("📎 Данные не менялись с прошлой выгрузки, отправлен тот же JSON файл")
+        return
     
     # Удаляем кнопки и показываем сообщение об ожидании
     await query.edit_message_text("⏳ Пожалуйста, подождите. Создаю JSON файл...")
@@ -505,12 +557,13 @@ async def handle_download_json(update: Update, context: ContextTypes.DEFAULT_TYP
             json.dump(export_payload, f, ensure_ascii=False, indent=4)
         
         with open(filename, 'rb') as f:
-            await context.bot.send_document(
+            message = await context.bot.send_document(
                 chat_id=query.message.chat_id,
                 document=f,
                 filename=filename,
-                caption="✅ Таблица успешно экспортирована из Supabase в формате JSON"
+                caption=caption
             )
+        _remember_export(context, "json", version, message)
         
         os.remove(filename)
         
@@ -522,50 +575,27 @@ async def handle_download_csv(update: Update, context: ContextTypes.DEFAULT_TYPE
     """Обработчик скачивания таблицы в формате CSV"""
     query = update.callback_query
     await query.answer()
+    caption = "✅ Таблица успешно экспортирована из Supabase в формате CSV (все листы)"
+
+    version = _get_export_version()
+    if await _send_cached_export(query, context, "csv", version, caption):
+        await query.edit_message_text("📎 Данные не менялись с прошлой выгрузки, отправлен тот же CSV файл")
+        return
     
     # Удаляем кнопки и показываем сообщение об ожидании
     await query.edit_message_text("⏳ Пожалуйста, подождите. Создаю CSV файл...")
     
     try:
-        grouped = _get_forms_export_data()
+        # Каждый лист запрашивается и сериализуется в своём процессе, zip собирается здесь
+        content = await exports.build_csv_zip(FORM_TYPE_LABELS)
 
-        import zipfile
-        zip_filename = "supabase_export_all_sheets.zip"
-        
-        with zipfile.ZipFile(zip_filename, 'w', zipfile.ZIP_DEFLATED) as zipf:
-            empty = True
-            for form_type in ("delivery", "refund", "painting", "checkin"):
-                rows = grouped.get(form_type, [])
-                if not rows:
-                    continue
-                empty = False
-                csv_filename = f"{FORM_TYPE_LABELS.get(form_type, form_type)}.csv"
-                fieldnames = list(rows[0].keys())
-                with open(csv_filename, "w", encoding="utf-8", newline="") as f:
-                    writer = csv.DictWriter(f, fieldnames=fieldnames)
-                    writer.writeheader()
-                    writer.writerows(rows)
-                zipf.write(csv_filename)
-                os.remove(csv_filename)
-
-            if empty:
-                csv_filename = "export.csv"
-                with open(csv_filename, "w", encoding="utf-8", newline="") as f:
-                    writer = csv.writer(f)
-                    writer.writerow(["info"])
-                    writer.writerow(["Нет данных в Supabase"])
-                zipf.write(csv_filename)
-                os.remove(csv_filename)
-
-        with open(zip_filename, 'rb') as f:
-            await context.bot.send_document(
-                chat_id=query.message.chat_id,
-                document=f,
-                filename=zip_filename,
-                caption="✅ Таблица успешно экспортирована из Supabase в формате CSV (все листы)"
-            )
-        
-        os.remove(zip_filename)
+        message = await context.bot.send_document(
+            chat_id=query.message.chat_id,
+            document=content,
+            filename="supabase_export_all_sheets.zip",
+            caption=caption
+        )
+        _remember_export(context, "csv", version, message)
         
     except Exception as e:
         logging.error(f"Ошибка при создании CSV: {e}")
@@ -625,6 +655,17 @@ async def handle_bot_usage_request(update: Update, context: ContextTypes.DEFAULT
         
         # Формируем сообщение со статистикой
         message = create_stats_message(usage_data, resource_data)
+        scheduler = context.bot_data.get('scheduler')
+        if scheduler and scheduler.jobs:
+            message += "\n\n" + create_jobs_message(scheduler.metrics())
+        notifications = context.bot_data.get('notifications')
+        if notifications:
+            message += "\n\n" + create_notifications_message(notifications.metrics())
+        telegram_requests = context.bot_data.get('telegram_requests')
+        if telegram_requests:
+            message += "\n\n" + create_telegram_requests_message(
+                {name: req.stats.snapshot() for name, req in telegram_requests.items()}
+            )
         
         # Отправляем итоговое сообщение со статистикой
         await update.message.reply_text(
@@ -817,6 +858,101 @@ def create_stats_message(usage_data, resource_data):
     
     return message
 
+def create_jobs_message(metrics: dict) -> str:
+    """Сводка по фоновым задачам планировщика этой реплики"""
+    message = "⚙️ <b>Фоновые задачи:</b>\n"
+    for name, job in metrics.items():
+        if not job['runs']:
+            message += f"• {name}: ещё не запускалась (пропусков {job['skipped']})\n"
+            continue
+        message += (
+            f"• {name}: {job['runs']} запусков, последний {job['last_duration_ms']} мс "
+            f"(среднее {job['mean_duration_ms']}, макс {job['max_duration_ms']}), "
+            f"ошибок {job['failures']}, пропусков {job['skipped']}\n"
+        )
+    return message
+
+def create_notifications_message(metrics: dict) -> str:
+    """Сводка по очереди уведомлений: доставлено, ошибки, повторы"""
+    message = (
+        "📨 <b>Уведомления:</b>\n"
+        f"• в очереди {metrics['queued']}, отправлено {metrics['sent']} из {metrics['enqueued']} "
+        f"(в среднем за {metrics['mean_delivery_ms']} мс), ошибок {metrics['failed']}, "
+        f"повторов {metrics['retries']}, дублей пропущено {metrics['duplicates']}\n"
+    )
+    for failure in metrics['recent_failures']:
+        message += f"• ❌ {failure['kind']} → {failure['chat_id']}: {html.escape(failure['error'] or '')}\n"
+    return message
+
+def create_telegram_requests_message(metrics: dict) -> str:
+    """Сводка по запросам к Telegram Bot API: задержки и ожидание свободного соединения"""
+    message = "📡 <b>Запросы к Telegram:</b>\n"
+    for name, stats in metrics.items():
+        if not stats['calls']:
+            message += f"• {name}: запросов ещё не было\n"
+            continue
+        errors = ", ".join(f"{error} {count}" for error, count in stats['errors'].items()) or "нет"
+        message += (
+            f"• {name}: {stats['calls']} запросов, в работе {stats['in_flight']} (макс {stats['max_in_flight']}), "
+            f"задержка p50 {stats['latency_p50_ms']} / p95 {stats['latency_p95_ms']} мс, "
+            f"ожидание пула p95 {stats['pool_wait_p95_ms']} мс (макс {stats['pool_wait_max_ms']}), "
+            f"таймаутов пула {stats['pool_timeouts']}, ошибки: {errors}\n"
+        )
+    return message
+
+STATS_TYPE_NAMES = {
+    "delivery": "🚚 Доставка",
+    "refund": "🔙 Возврат",
+    "painting": "🎨 Покраска",
+    "checkin": "🏎️ Заезд",
+}
+
+def create_form_stats_message(stats: dict) -> str:
+    """Сообщение со статистикой заявок по типам, отделам и неделям"""
+    message = f"📊 <b>Статистика заявок за {stats['days']} дн.:</b>\n\n"
+    
+    total = sum(row['total'] for row in stats['by_type'])
+    today = sum(row['today'] for row in stats['by_type'])
+    message += f"📝 Всего: <b>{total}</b>, за сегодня: <b>{today}</b>\n\n"
+    
+    message += "<b>По типам:</b>\n"
+    for row in stats['by_type']:
+        name = STATS_TYPE_NAMES.get(row['application_type'], row['application_type'])
+        message += f"{html.escape(name)}: <b>{row['total']}</b> (сегодня {row['today']})\n"
+    if not stats['by_type']:
+        message += "Нет заявок\n"
+    
+    message += "\n<b>По отделам:</b>\n"
+    for row in stats['by_department']:
+        message += f"🏢 {html.escape(row['department'] or 'Без отдела')}: <b>{row['total']}</b> ({row['users']} чел.)\n"
+    if not stats['by_department']:
+        message += "Нет данных\n"
+    
+    message += "\n<b>По неделям:</b>\n"
+    peak = max((row['total'] for row in stats['by_week']), default=0)
+    for row in stats['by_week']:
+        bar = "▇" * max(1, round(row['total'] * 10 / peak)) if peak else ""
+        message += f"{row['week'].strftime('%d.%m')}: {bar} {row['total']}\n"
+    if not stats['by_week']:
+        message += "Нет данных\n"
+    
+    return message
+
+async def handle_statistics(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик кнопки 'Статистика'"""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ У вас нет прав для просмотра статистики")
+        return
+    
+    try:
+        stats = await asyncio.to_thread(get_form_stats)
+    except Exception as e:
+        logging.error(f"Ошибка при получении статистики заявок: {e}")
+        await update.message.reply_text("❌ Ошибка при получении статистики заявок")
+        return
+    
+    await update.message.reply_text(create_form_stats_message(stats), parse_mode='HTML')
+
 EDIT_FULLNAME, EDIT_PHONE, EDIT_POSITION, EDIT_DEPARTMENT = range(4)
 
 async def handle_edit_name(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -984,24 +1120,17 @@ async def handle_input_for_edit(update: Update, context: ContextTypes.DEFAULT_TY
             'department': 'отдел'
         }
         
-        # Отправляем сообщение с информацией об успешном обновлении
-        success_msg = await update.message.reply_text(
-            f"✅ {field_names.get(action, action)} пользователя успешно обновлен"
-        )
-        
-        # Убираем клавиатуру ReplyKeyboard
-        await update.message.reply_text(
-            "Возвращаемся к просмотру пользователя",
-            reply_markup=ReplyKeyboardRemove()
-        )
-        
-        # Отправляем сообщение с информацией о пользователе и кнопками редактирования
+        # Результат и карточку показываем в сообщении, где был запрос ввода
+        success_text = f"✅ {field_names.get(action, action)} пользователя успешно обновлен"
         user = get_user_by_id(user_id)
         if user:
-            await update.message.reply_text(
-                format_user_info(user),
-                reply_markup=get_user_edit_keyboard(user_id, user.get('admin', False))
-        )
+            await _show_admin_screen(
+                update, context, ADMIN_SCREEN_USERS, f"{success_text}\n\n{format_user_info(user)}",
+                reply_markup=get_user_edit_keyboard(user_id, user.get('admin', False)),
+                in_place=True
+            )
+        else:
+            await _show_admin_screen(update, context, ADMIN_SCREEN_USERS, success_text, in_place=True)
     except Exception as e:
         logging.error(f"Ошибка при обновлении данных пользователя: {e}")
         await update.message.reply_text("❌ Ошибка при обновлении данных пользователя")
@@ -1013,6 +1142,273 @@ async def handle_input_for_edit(update: Update, context: ContextTypes.DEFAULT_TY
     
     return ConversationHandler.END
 
+ROUTING_FORM_NAMES = {
+    "delivery": "🚚 Доставка",
+    "refund": "🔙 Возврат",
+    "painting": "🎨 Покраска",
+    "checkin": "🏎️ Заезд",
+}
+
+ROUTING_FIELD_NAMES = {
+    "responsible": "ответственного (ID в Битрикс24)",
+    "auditors": "наблюдателей (ID через запятую)",
+    "title": "шаблон заголовка задачи",
+}
+
+def format_routing_rule(rule) -> str:
+    """Текстовое описание правила маршрутизации задачи"""
+    auditors = ", ".join(str(a) for a in rule.auditors) or "—"
+    source = "БД" if rule.source == "db" else ".env"
+    return (
+        f"{ROUTING_FORM_NAMES.get(rule.form_type, rule.form_type)} ({source})\n"
+        f"Ответственный: {rule.responsible_id or '—'}\n"
+        f"Наблюдатели: {auditors}\n"
+        f"Заголовок: {rule.title_template}"
+    )
+
+def get_routing_list_keyboard() -> InlineKeyboardMarkup:
+    keyboard = [
+        [InlineKeyboardButton(name, callback_data=f"routing_edit_{form_type}")]
+        for form_type, name in ROUTING_FORM_NAMES.items()
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+def get_routing_edit_keyboard(form_type: str) -> InlineKeyboardMarkup:
+    return InlineKeyboardMarkup([
+        [InlineKeyboardButton("👤 Ответственный", callback_data=f"routing_field_{form_type}_responsible")],
+        [InlineKeyboardButton("👀 Наблюдатели", callback_data=f"routing_field_{form_type}_auditors")],
+        [InlineKeyboardButton("📝 Заголовок", callback_data=f"routing_field_{form_type}_title")],
+        [InlineKeyboardButton("🔙 Назад к списку", callback_data="routing_list")],
+    ])
+
+def format_routing_list() -> str:
+    rules = get_routing_rules()
+    parts = [format_routing_rule(rules[form_type]) for form_type in ROUTING_FORM_NAMES if form_type in rules]
+    return "🧭 Маршруты задач в Битрикс24:\n\n" + "\n\n".join(parts)
+
+async def handle_task_routing(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик кнопки 'Маршруты задач'"""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ Доступ запрещён!")
+        return
+    
+    context.user_data.pop('waiting_for_routing_value', None)
+    try:
+        text = await asyncio.to_thread(format_routing_list)
+    except Exception as e:
+        logging.error(f"Ошибка получения маршрутов задач: {e}")
+        await update.message.reply_text("❌ Ошибка при получении маршрутов задач")
+        return
+    
+    await update.message.reply_text(text, reply_markup=get_routing_list_keyboard())
+
+async def handle_routing_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик inline-кнопок маршрутов задач"""
+    query = update.callback_query
+    await query.answer()
+    
+    if not is_admin(update.effective_user.id):
+        await query.edit_message_text("⛔ Доступ запрещён!")
+        return
+    
+    data = query.data
+    if data == "routing_list":
+        context.user_data.pop('waiting_for_routing_value', None)
+        text = await asyncio.to_thread(format_routing_list)
+        await query.edit_message_text(text, reply_markup=get_routing_list_keyboard())
+    elif data.startswith("routing_edit_"):
+        form_type = data.split("_")[2]
+        rule = await asyncio.to_thread(get_routing_rule, form_type)
+        if not rule:
+            await query.edit_message_text("❌ Неизвестный тип заявки")
+            return
+        await query.edit_message_text(format_routing_rule(rule), reply_markup=get_routing_edit_keyboard(form_type))
+    elif data.startswith("routing_field_"):
+        _, _, form_type, field = data.split("_", 3)
+        if form_type not in ROUTING_FORM_NAMES or field not in ROUTING_FIELD_NAMES:
+            return
+        context.user_data['waiting_for_routing_value'] = {'form_type': form_type, 'field': field}
+        hint = ""
+        if field == "title":
+            hint = "\nДоступные поля: {contract_number}, {num_contract}, {form_number}, {date}"
+        elif field != "responsible":
+            hint = "\nОтправьте «-», чтобы очистить список"
+        await query.edit_message_text(
+            f"Введите {ROUTING_FIELD_NAMES[field]} для «{ROUTING_FORM_NAMES[form_type]}»:{hint}",
+            reply_markup=InlineKeyboardMarkup([[InlineKeyboardButton("❌ Отмена", callback_data=f"routing_edit_{form_type}")]])
+        )
+
+async def handle_routing_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик ввода нового значения правила маршрутизации"""
+    pending = context.user_data.get('waiting_for_routing_value')
+    if not pending:
+        return
+    
+    form_type = pending['form_type']
+    field = pending['field']
+    value = update.message.text.strip()
+    
+    if field == "responsible":
+        if not value.isdigit():
+            await update.message.reply_text("❌ ID ответственного должен быть числом")
+            return
+        changes = {'responsible_id': int(value)}
+    elif field == "auditors":
+        auditors = () if value == "-" else parse_auditors(value)
+        if value != "-" and not auditors:
+            await update.message.reply_text("❌ Укажите ID наблюдателей через запятую, например: 12, 34")
+            return
+        changes = {'auditors': auditors}
+    else:
+        if not validate_title_template(value):
+            await update.message.reply_text("❌ Некорректный шаблон. Поля указываются в фигурных скобках, например: {contract_number}")
+            return
+        changes = {'title_template': value}
+    
+    context.user_data.pop('waiting_for_routing_value', None)
+    try:
+        rule = await asyncio.to_thread(
+            update_routing_rule, form_type, updated_by=update.effective_user.id, **changes
+        )
+    except Exception as e:
+        logging.error(f"Ошибка сохранения маршрута задач {form_type}: {e}")
+        await update.message.reply_text("❌ Ошибка при сохранении маршрута задач")
+        return
+    
+    await update.message.reply_text(
+        f"✅ Маршрут обновлен\n\n{format_routing_rule(rule)}",
+        reply_markup=get_routing_edit_keyboard(form_type)
+    )
+
+SEARCH_PAGE_SIZE = 5
+
+SEARCH_TYPE_ICONS = {
+    "delivery": "🚚",
+    "refund": "🔙",
+    "painting": "🎨",
+    "checkin": "🏎️",
+}
+
+async def handle_search_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик кнопки 'Поиск'"""
+    if not is_admin(update.effective_user.id):
+        await update.message.reply_text("⛔ Доступ запрещён!")
+        return
+    
+    context.user_data['waiting_for_search_query'] = True
+    await update.message.reply_text(
+        "🔎 Введите номер договора, ФИО автора или бригадира, либо фрагмент текста заявки:"
+    )
+
+def format_search_results(query: str, total: int, results: list[dict], page: int) -> str:
+    pages = (total + SEARCH_PAGE_SIZE - 1) // SEARCH_PAGE_SIZE
+    lines = [f"🔎 «{query}»: найдено {total} (стр. {page + 1} из {pages})\n"]
+    for number, app in enumerate(results, start=page * SEARCH_PAGE_SIZE + 1):
+        icon = SEARCH_TYPE_ICONS.get(app.get('form_type'), "📄")
+        details = " · ".join(
+            part for part in (
+                f"Договор {app['contract']}" if app.get('contract') else "",
+                app.get('creator_fullname') or "",
+                app.get('date') or "",
+            ) if part
+        )
+        lines.append(f"{number}. {icon} #{app.get('form_number')} (ID {app.get('id')}) {details}")
+    return "\n".join(lines)
+
+def get_search_results_keyboard(total: int, results: list[dict], page: int) -> InlineKeyboardMarkup:
+    keyboard = [
+        [InlineKeyboardButton(
+            f"{number}. Открыть ID {app.get('id')}",
+            callback_data=f"search_open_{app.get('id')}_{page}"
+        )]
+        for number, app in enumerate(results, start=page * SEARCH_PAGE_SIZE + 1)
+    ]
+    nav_buttons = []
+    if page > 0:
+        nav_buttons.append(InlineKeyboardButton("⬅️", callback_data=f"search_page_{page - 1}"))
+    if (page + 1) * SEARCH_PAGE_SIZE < total:
+        nav_buttons.append(InlineKeyboardButton("➡️", callback_data=f"search_page_{page + 1}"))
+    if nav_buttons:
+        keyboard.append(nav_buttons)
+    return InlineKeyboardMarkup(keyboard)
+
+async def _search_page(query: str, page: int):
+    return await asyncio.to_thread(search_forms, query, SEARCH_PAGE_SIZE, page * SEARCH_PAGE_SIZE)
+
+async def handle_search_input(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик ввода поискового запроса"""
+    query = update.message.text.strip()
+    if len(query) < 2:
+        await update.message.reply_text("❌ Запрос должен содержать минимум 2 символа")
+        return
+    
+    context.user_data.pop('waiting_for_search_query', None)
+    try:
+        total, results = await _search_page(query, 0)
+    except Exception as e:
+        logging.error(f"Ошибка поиска заявок: {e}")
+        await update.message.reply_text("❌ Ошибка при поиске заявок")
+        return
+    
+    if not total:
+        await update.message.reply_text(f"🔎 По запросу «{query}» ничего не найдено")
+        return
+    
+    context.user_data['search_query'] = query
+    await update.message.reply_text(
+        format_search_results(query, total, results, 0),
+        reply_markup=get_search_results_keyboard(total, results, 0)
+    )
+
+async def handle_search_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик пагинации и открытия результатов поиска"""
+    query = update.callback_query
+    await query.answer()
+    
+    if not is_admin(update.effective_user.id):
+        await query.edit_message_text("⛔ Доступ запрещён!")
+        return
+    
+    search_query = context.user_data.get('search_query')
+    if not search_query:
+        await query.edit_message_text("Результаты поиска устарели, выполните поиск заново")
+        return
+    
+    parts = query.data.split("_")
+    try:
+        if parts[1] == "open":
+            app = await asyncio.to_thread(get_application_by_id, parts[2])
+            if not app:
+                await query.edit_message_text("❌ Заявка не найдена")
+                return
+            message = f"🆔 ID: {app.get('id')}\n📝 Тип: {app.get('form_type')}\n📅 Дата: {app.get('date')}\n\n"
+            for key, value in app.items():
+                if key not in ['id', 'form_type', 'date'] and value:
+                    message += f"- {key}: {value}\n"
+            await query.edit_message_text(
+                message,
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 К результатам", callback_data=f"search_page_{parts[3]}")
+                ]])
+            )
+        else:
+            page = int(parts[2])
+            total, results = await _search_page(search_query, page)
+            if not results and total:
+                # Устаревшая кнопка или заявки удалены между нажатиями — показываем последнюю страницу
+                page = (total - 1) // SEARCH_PAGE_SIZE
+                total, results = await _search_page(search_query, page)
+            if not results:
+                await query.edit_message_text(f"🔎 По запросу «{search_query}» ничего не найдено")
+                return
+            await query.edit_message_text(
+                format_search_results(search_query, total, results, page),
+                reply_markup=get_search_results_keyboard(total, results, page)
+            )
+    except Exception as e:
+        logging.error(f"Ошибка поиска заявок: {e}")
+        await query.edit_message_text("❌ Ошибка при поиске заявок")
+
 async def handle_prev_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик перехода к предыдущему пользователю"""
     users = context.user_data.get('users', [])
@@ -1020,7 +1416,7 @@ async def handle_prev_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if current_page > 0:
         context.user_data['current_page'] = current_page - 1
-        await send_user_list(update, context)
+        await send_user_list(update, context, in_place=True)
 
 async def handle_next_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик перехода к следующему пользователю"""
@@ -1029,7 +1425,7 @@ async def handle_next_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     if current_page < len(users) - 1:
         context.user_data['current_page'] = current_page + 1
-        await send_user_list(update, context)
+        await send_user_list(update, context, in_place=True)
 
 async def back_to_main(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработка нажатия кнопки 'На главную' в админ-панели"""
@@ -1046,6 +1442,11 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
     # Если есть ожидание ввода, обрабатываем его
     if context.user_data.get('waiting_for_input'):
         return await handle_input_for_edit(update, context)
+    # Кнопки панели уже сняли эти ожидания в clear_pending_input (группа -2 в main)
+    if context.user_data.get('waiting_for_routing_value'):
+        return await handle_routing_input(update, context)
+    if context.user_data.get('waiting_for_search_query'):
+        return await handle_search_input(update, context)
     
     user_id = update.effective_user.id
     if not is_admin(user_id):
@@ -1059,14 +1460,7 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
         await handle_next_user(update, context)
     elif text == "🔙 Вернуться":
         # Возвращаем ReplyKeyboard администратора
-        admin_keyboard = ReplyKeyboardMarkup(
-            [
-                [KeyboardButton("👥 Управление пользователями")],
-                [KeyboardButton("📥 Загрузить таблицу"), KeyboardButton("📈 Потребление")],
-                [KeyboardButton("🔙 На главную")]
-            ],
-            resize_keyboard=True
-        )
+        admin_keyboard = get_admin_panel_keyboard()
         await update.message.reply_text(
             "Возврат в админ-панель",
             reply_markup=admin_keyboard
@@ -1081,6 +1475,12 @@ async def handle_message(update: Update, context: ContextTypes.DEFAULT_TYPE):
             await update.message.reply_text("⏳ Сбор статистики уже выполняется, пожалуйста подождите...")
         else:
             await handle_bot_usage_request(update, context)
+    elif text == "📊 Статистика":
+        await handle_statistics(update, context)
+    elif text == "🔎 Поиск":
+        await handle_search_request(update, context)
+    elif text == "🧭 Маршруты задач":
+        await handle_task_routing(update, context)
     elif text == "🔙 На главную":
         await back_to_main(update, context)
 
@@ -1093,23 +1493,6 @@ async def cancel_edit(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user = get_user_by_id(user_id)
     
     if user:
-        # Возвращаем ReplyKeyboard администратора
-        admin_keyboard = ReplyKeyboardMarkup(
-            [
-                [KeyboardButton("👥 Управление пользователями")],
-                [KeyboardButton("📥 Загрузить таблицу"), KeyboardButton("📈 Потребление")],
-                [KeyboardButton("🔙 На главную")]
-            ],
-            resize_keyboard=True
-        )
-        
-        await context.bot.send_message(
-            chat_id=query.message.chat_id,
-            text="Редактирование отменено",
-            reply_markup=admin_keyboard
-        )
-        
-        # Отправляем сообщение с информацией о пользователе
         await query.edit_message_text(
             format_user_info(user),
             reply_markup=get_user_edit_keyboard(user_id, user.get('admin', False))
@@ -1145,14 +1528,7 @@ async def handle_callback_query(update: Update, context: ContextTypes.DEFAULT_TY
     data = query.data
     
     if data == "back_to_user_list":
-        # Возвращаемся к списку пользователей
-        try:
-            await query.delete_message()  # Удаляем сообщение с кнопками редактирования
-        except Exception as e:
-            logging.error(f"Ошибка при удалении сообщения: {e}")
-        
-        # Просто вызываем функцию отображения списка пользователей
-        # она сама восстановит всю необходимую клавиатуру
+        # Возвращаемся к списку пользователей в этом же сообщении
         await handle_user_management(update, context)
     elif data.startswith("edit_user_"):
         user_id = int(data.split("_")[2])
@@ -1290,14 +1666,7 @@ async def handle_app_list_type_selection(update: Update, context: ContextTypes.D
             await update.message.reply_text(f"Заявок типа '{selected_type}' не найдено")
             
             # Возвращаем админское меню
-            admin_keyboard = ReplyKeyboardMarkup(
-                [
-                    [KeyboardButton("👥 Управление пользователями")],
-                    [KeyboardButton("📥 Загрузить таблицу"), KeyboardButton("📈 Потребление")],
-                    [KeyboardButton("🔙 На главную")]
-                ],
-                resize_keyboard=True
-            )
+            admin_keyboard = get_admin_panel_keyboard()
             await update.message.reply_text("Возврат в админ-панель", reply_markup=admin_keyboard)
             return
         
@@ -1314,36 +1683,39 @@ async def handle_app_list_type_selection(update: Update, context: ContextTypes.D
         await update.message.reply_text("❌ Ошибка при получении списка заявок")
         
         # Возвращаем админское меню в случае ошибки
-        admin_keyboard = ReplyKeyboardMarkup(
-            [
-                [KeyboardButton("👥 Управление пользователями")],
-                [KeyboardButton("📥 Загрузить таблицу"), KeyboardButton("📈 Потребление")],
-                [KeyboardButton("🔙 На главную")]
-            ],
-            resize_keyboard=True
-        )
+        admin_keyboard = get_admin_panel_keyboard()
         await update.message.reply_text("Возврат в админ-панель", reply_markup=admin_keyboard)
 
-async def send_application_info(update: Update, context: ContextTypes.DEFAULT_TYPE):
-    """Отправляет информацию о текущей заявке"""
+def get_application_card_keyboard(app_id, current_page: int, total: int) -> InlineKeyboardMarkup:
+    """Навигация по списку и действия с заявкой в одной инлайн-клавиатуре"""
+    nav_buttons = []
+    if current_page > 0:
+        nav_buttons.append(InlineKeyboardButton("◀️", callback_data=f"admin_apps_page_{current_page - 1}"))
+    if current_page < total - 1:
+        nav_buttons.append(InlineKeyboardButton("▶️", callback_data=f"admin_apps_page_{current_page + 1}"))
+    
+    keyboard = [nav_buttons] if nav_buttons else []
+    keyboard += [
+        [InlineKeyboardButton("✏️ Редактировать", callback_data=f"edit_app_{app_id}")],
+        [InlineKeyboardButton("❌ Удалить", callback_data=f"delete_app_{app_id}")]
+    ]
+    return InlineKeyboardMarkup(keyboard)
+
+async def send_application_info(update: Update, context: ContextTypes.DEFAULT_TYPE, in_place: bool = False, notice: str = None):
+    """Показывает текущую заявку списка одним сообщением с навигацией и действиями"""
     applications = context.user_data.get('applications', [])
     current_page = context.user_data.get('app_current_page', 0)
+    prefix = f"{notice}\n\n" if notice else ""
     
     if not applications:
-        if update.message:
-            await update.message.reply_text("Список заявок пуст")
-        else:
-            await context.bot.send_message(
-                chat_id=update.effective_chat.id,
-                text="Список заявок пуст"
-            )
+        await _show_admin_screen(update, context, ADMIN_SCREEN_APPLICATIONS, f"{prefix}Список заявок пуст", in_place=in_place)
         return
     
     # Получаем текущую заявку
     app = applications[current_page]
     
     # Форматируем информацию о заявке
-    message = f"Заявка {current_page + 1} из {len(applications)}:\n\n"
+    message = f"{prefix}Заявка {current_page + 1} из {len(applications)}:\n\n"
     message += f"🆔 ID: {app.get('id', 'Нет ID')}\n"
     message += f"📝 Тип: {app.get('form_type', 'Неизвестный тип')}\n"
     message += f"📅 Дата: {app.get('date', 'Без даты')}\n"
@@ -1362,53 +1734,24 @@ async def send_application_info(update: Update, context: ContextTypes.DEFAULT_TY
         if key not in ['id', 'user_id', 'form_type', 'date']:
             message += f"- {key}: {value}\n"
     
-    # Создаем клавиатуру с кнопками навигации
-    nav_buttons = []
-    
-    # Если это не первая заявка - добавляем кнопку "<"
-    if current_page > 0:
-        nav_buttons.append(KeyboardButton("<"))
-    
-    # Всегда добавляем кнопку "Вернуться"
-    nav_buttons.append(KeyboardButton("🔙 Вернуться"))
-    
-    # Если это не последняя заявка - добавляем кнопку ">"
-    if current_page < len(applications) - 1:
-        nav_buttons.append(KeyboardButton(">"))
-    
-    reply_markup = ReplyKeyboardMarkup([nav_buttons], resize_keyboard=True)
-    
-    # Создаем инлайн-кнопки для действий с заявкой
-    app_id = app.get('id')
-    inline_keyboard = [
-        [InlineKeyboardButton("✏️ Редактировать", callback_data=f"edit_app_{app_id}")],
-        [InlineKeyboardButton("❌ Удалить", callback_data=f"delete_app_{app_id}")]
-    ]
-    inline_markup = InlineKeyboardMarkup(inline_keyboard)
+    await _show_admin_screen(
+        update, context, ADMIN_SCREEN_APPLICATIONS, message,
+        reply_markup=get_application_card_keyboard(app.get('id'), current_page, len(applications)),
+        in_place=in_place
+    )
+
+async def handle_application_page_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Листание списка заявок инлайн-кнопками ◀️/▶️"""
+    query = update.callback_query
+    await query.answer()
     
-    # Отправляем сообщения
-    if update.message:
-        await update.message.reply_text(
-            message,
-            reply_markup=reply_markup
-        )
-        
-        await update.message.reply_text(
-            "Действия с заявкой:",
-            reply_markup=inline_markup
-        )
-    else:
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text=message,
-            reply_markup=reply_markup
-        )
-        
-        await context.bot.send_message(
-            chat_id=update.effective_chat.id,
-            text="Действия с заявкой:",
-            reply_markup=inline_markup
-        )
+    applications = context.user_data.get('applications')
+    if not applications:
+        await query.edit_message_text("Список заявок устарел, откройте его заново")
+        return
+    page = int(query.data.rsplit("_", 1)[1])
+    context.user_data['app_current_page'] = min(max(page, 0), len(applications) - 1)
+    await send_application_info(update, context)
 
 async def handle_prev_application(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик перехода к предыдущей заявке"""
@@ -1417,7 +1760,7 @@ async def handle_prev_application(update: Update, context: ContextTypes.DEFAULT_
     
     if current_page > 0:
         context.user_data['app_current_page'] = current_page - 1
-        await send_application_info(update, context)
+        await send_application_info(update, context, in_place=True)
 
 async def handle_next_application(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик перехода к следующей заявке"""
@@ -1426,7 +1769,7 @@ async def handle_next_application(update: Update, context: ContextTypes.DEFAULT_
     
     if current_page < len(applications) - 1:
         context.user_data['app_current_page'] = current_page + 1
-        await send_application_info(update, context)
+        await send_application_info(update, context, in_place=True)
 
 async def handle_edit_application_request(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Обработчик запроса на редактирование заявки"""
@@ -1546,10 +1889,7 @@ async def handle_app_id_input(update: Update, context: ContextTypes.DEFAULT_TYPE
             )])
         
         keyboard.append([InlineKeyboardButton("🔙 Отмена", callback_data="cancel_app_edit")])
-        await update.message.reply_text(
-            message,
-            reply_markup=InlineKeyboardMarkup(keyboard)
-        )
+        await _show_admin_screen(update, context, ADMIN_SCREEN_APPLICATIONS, message, reply_markup=InlineKeyboardMarkup(keyboard))
         
     except Exception as e:
         logging.error(f"Ошибка при поиске заявки: {e}")
@@ -1664,11 +2004,8 @@ async def handle_app_field_value_input(update: Update, context: ContextTypes.DEF
         elif field == "carrying":
             field_name = "Грузоподъемность"
         
-        # Сообщаем об успешном обновлении
-        await update.message.reply_text(f"✅ Поле '{field_name}' успешно обновлено")
-        
-        # Создаем сообщение с выбором полей для редактирования
-        await send_edit_fields_menu(update, context)
+        # Результат и меню полей — в сообщении, где был запрос ввода
+        await send_edit_fields_menu(update, context, notice=f"✅ Поле '{field_name}' успешно обновлено")
     
     except Exception as e:
         logging.error(f"Ошибка при обновлении заявки: {e}")
@@ -1677,11 +2014,11 @@ async def handle_app_field_value_input(update: Update, context: ContextTypes.DEF
     # Важно! Сбрасываем флаг ожидания ввода значения
     context.user_data.pop('waiting_for_app_field_value', None)
 
-async def send_edit_fields_menu(update, context):
-    """Отправляет меню с полями для редактирования заявки"""
+async def send_edit_fields_menu(update, context, notice: str = None):
+    """Показывает меню с полями для редактирования заявки в сообщении экрана заявок"""
     app = context.user_data.get('current_app')
     if not app:
-        await update.message.reply_text("❌ Ошибка: данные заявки не найдены")
+        await update.effective_message.reply_text("❌ Ошибка: данные заявки не найдены")
         return
     
     app_type = app.get('form_type', '')
@@ -1698,7 +2035,8 @@ async def send_edit_fields_menu(update, context):
     }.get(app_type, app_type)
     
     # Формируем сообщение
-    message = f"📝 Данные заявки ({form_type_str}):\n\n"
+    message = f"{notice}\n\n" if notice else ""
+    message += f"📝 Данные заявки ({form_type_str}):\n\n"
     message += f"🆔 ID: {app.get('id', 'Нет ID')}\n"
     message += f"📅 Дата: {app.get('date', 'Без даты')}\n\n"
     
@@ -1744,10 +2082,10 @@ async def send_edit_fields_menu(update, context):
         InlineKeyboardButton("✅ Готово", callback_data="back_to_admin")
     ])
     
-    # Отправляем меню
-    await update.message.reply_text(
-        message,
-        reply_markup=InlineKeyboardMarkup(keyboard)
+    await _show_admin_screen(
+        update, context, ADMIN_SCREEN_APPLICATIONS, message,
+        reply_markup=InlineKeyboardMarkup(keyboard),
+        in_place=True
     )
 
 async def handle_edit_application(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1773,18 +2111,7 @@ async def handle_edit_application(update: Update, context: ContextTypes.DEFAULT_
             await query.edit_message_text("❌ Ошибка при получении заявки")
             return
     
-    # Отправляем сообщение с выбором полей для редактирования через сообщение в чате,
-    # а не через редактирование текущего сообщения с инлайн-клавиатурой
-    # Это позволит пользователю видеть все предыдущие действия в истории чата
-    message = await context.bot.send_message(
-        chat_id=update.effective_chat.id,
-        text="Загрузка данных заявки..."
-    )
-    
-    # Обновляем контекст, чтобы send_edit_fields_menu мог использовать message
-    update.message = message
-    
-    # Отправляем меню с полями для редактирования
+    # Меню полей заменяет карточку заявки в этом же сообщении
     await send_edit_fields_menu(update, context)
 
 async def handle_delete_application(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -1832,25 +2159,8 @@ async def handle_confirm_delete_app(update: Update, context: ContextTypes.DEFAUL
             if context.user_data.get('app_current_page', 0) >= len(applications):
                 context.user_data['app_current_page'] = max(0, len(applications) - 1)
         
-        await query.edit_message_text("✅ Заявка успешно удалена")
-        
-        # Отправляем обновленный список заявок, если он не пустой
-        if applications:
-            await send_application_info(update, context)
-        else:
-            admin_keyboard = ReplyKeyboardMarkup(
-                [
-                    [KeyboardButton("👥 Управление пользователями")],
-                    [KeyboardButton("📥 Загрузить таблицу"), KeyboardButton("📈 Потребление")],
-                    [KeyboardButton("🔙 На главную")]
-                ],
-                resize_keyboard=True
-            )
-            await context.bot.send_message(
-                chat_id=query.message.chat_id,
-                text="Список заявок пуст. Возврат в админ-панель.",
-                reply_markup=admin_keyboard
-            )
+        # Следующая заявка списка показывается в этом же сообщении
+        await send_application_info(update, context, notice="✅ Заявка успешно удалена")
     
     except Exception as e:
         logging.error(f"Ошибка при удалении заявки: {e}")
@@ -1908,14 +2218,7 @@ async def handle_cancel_app_edit(update: Update, context: ContextTypes.DEFAULT_T
     context.user_data.pop('waiting_for_app_field_value', None)
     
     # Возвращаемся к админ-панели
-    admin_keyboard = ReplyKeyboardMarkup(
-        [
-            [KeyboardButton("👥 Управление пользователями")],
-            [KeyboardButton("📥 Загрузить таблицу"), KeyboardButton("📈 Потребление")],
-            [KeyboardButton("🔙 На главную")]
-        ],
-        resize_keyboard=True
-    )
+    admin_keyboard = get_admin_panel_keyboard()
     
     await query.edit_message_text("✅ Редактирование заявки отменено")
     
@@ -1935,14 +2238,7 @@ async def handle_back_to_admin(update: Update, context: ContextTypes.DEFAULT_TYP
     context.user_data.pop('edit_app_field', None)
     
     # Возвращаемся к админ-панели
-    admin_keyboard = ReplyKeyboardMarkup(
-        [
-            [KeyboardButton("👥 Управление пользователями")],
-            [KeyboardButton("📥 Загрузить таблицу"), KeyboardButton("📈 Потребление")],
-            [KeyboardButton("🔙 На главную")]
-        ],
-        resize_keyboard=True
-    )
+    admin_keyboard = get_admin_panel_keyboard()
     
     await context.bot.send_message(
         chat_id=query.message.chat_id,
@@ -1,19 +1,25 @@
 ﻿from telegram import Update, InlineKeyboardMarkup, InlineKeyboardButton, ReplyKeyboardRemove, ReplyKeyboardMarkup
 from telegram.ext import ContextTypes, ConversationHandler, MessageHandler, CallbackQueryHandler, filters
-from bot.commands.utils import get_reply_keyboard, get_cancel_keyboard, get_owner_fullname, is_admin, get_user_settings, update_user_settings
+from telegram.error import BadRequest
+from bot.commands.utils import get_reply_keyboard, get_cancel_keyboard, get_contract_keyboard, get_owner_fullname, is_admin, get_user_settings, update_user_settings
 from config import Config
 import logging
 import os, asyncio
-from datetime import datetime
+from datetime import datetime, timedelta, timezone
 from bot.services.supabase_storage import (
     get_admin_username,
     get_form_by_type_and_number,
     get_next_form_number,
-    get_user_by_id as get_user_by_id_from_supabase,
-    is_user_registered as is_user_registered_in_supabase,
+    get_application_by_id,
+    list_user_applications_page,
     save_form_to_supabase,
     upsert_user,
 )
+from bot.services.notifications import notify
+from bot.services.recent_contracts import forget_recent_contracts, get_recent_contracts
+from bot.services.task_routing import get_routing_rule
+from bot.services.user_flags import get_user_flags
+from bot.services.user_profile import forget_user_profile, load_user_profile
 
 # Состояния для ConversationHandler
 FULLNAME, PHONE, POSITION, DEPARTMENT = range(4)
@@ -28,7 +34,8 @@ def save_user_to_json(user_data):
 def is_user_registered(user_id):
     """Check user registration status."""
     try:
-        return is_user_registered_in_supabase(user_id)
+        flags = get_user_flags(user_id)
+        return bool(flags and flags["approved"])
     except Exception as e:
         logging.error(f"Failed to check registration: {e}")
         return False
@@ -83,7 +90,8 @@ async def help(update, context):
             "2. 🚚 Доставка - формирование заявки на доставку материалов в системе Битрикс24\n"
             "3. 🚗 Заезд - формирование заявки на заезд в системе Битрикс24\n"
             "4. 🔄 Возврат - оформление процедуры возврата материалов через Битрикс24\n"
-            "5. 🎨 Покраска - создание заявки на услуги покраски в системе Битрикс24\n\n"
+            "5. 🎨 Покраска - создание заявки на услуги покраски в системе Битрикс24\n"
+            "6. 📜 Мои заявки - история ваших заявок с фильтром по типу\n\n"
             f"❗ Для получения дополнительной помощи обратитесь к [специалисту]({contact_link}) ❗"
         )
     else:
@@ -255,31 +263,12 @@ async def get_department(update: Update, context: ContextTypes.DEFAULT_TYPE):
             reply_markup=get_reply_keyboard(user_id, is_registered=False)
         )
         
-        # Отправляем уведомление администраторам
-        for admin_id in Config.ADMIN_IDS:
-            try:
-                # Создаем клавиатуру с кнопками для одобрения/отклонения
-                keyboard = InlineKeyboardMarkup([
-                    [
-                        InlineKeyboardButton("✅ Одобрить", callback_data=f"approve_{user_id}"),
-                        InlineKeyboardButton("❌ Отклонить", callback_data=f"reject_{user_id}")
-                    ]
-                ])
-                
-                await context.bot.send_message(
-                    chat_id=admin_id,
-                    text=f"📝 Новая заявка на регистрацию:\n\n"
-                         f"👤 Пользователь: {user_data['fullname']}\n"
-                         f"🆔 ID: {user_id}\n"
-                         f"👤 Username: @{username}\n"
-                         f"📱 Телефон: {user_data['phone']}\n"
-                         f"💼 Должность: {user_data['position']}\n"
-                         f"🏢 Подразделение: {user_data['department']}\n\n"
-                         f"Пожалуйста, одобрите или отклоните заявку:",
-                    reply_markup=keyboard
-                )
-            except Exception as e:
-                logging.error(f"Ошибка при отправке уведомления администратору {admin_id}: {e}")
+        # Уведомление администраторам рассылается в фоне, всем параллельно
+        text, keyboard = registration_request_message(user_data)
+        notify(
+            context.application, Config.ADMIN_IDS, text, reply_markup=keyboard,
+            kind="registration_request"
+        )
     else:
         await update.message.reply_text(
             "❌ Ошибка сохранения данных",
@@ -288,6 +277,27 @@ async def get_department(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     return ConversationHandler.END
 
+def registration_request_message(user_data: dict, title: str = "📝 Новая заявка на регистрацию:"):
+    """Текст и кнопки одобрения/отклонения заявки на регистрацию для администратора"""
+    user_id = user_data['user_id']
+    keyboard = InlineKeyboardMarkup([
+        [
+            InlineKeyboardButton("✅ Одобрить", callback_data=f"approve_{user_id}"),
+            InlineKeyboardButton("❌ Отклонить", callback_data=f"reject_{user_id}")
+        ]
+    ])
+    text = (
+        f"{title}\n\n"
+        f"👤 Пользователь: {user_data['fullname']}\n"
+        f"🆔 ID: {user_id}\n"
+        f"👤 Username: @{user_data['username'] or 'Нет username'}\n"
+        f"📱 Телефон: {user_data['phone']}\n"
+        f"💼 Должность: {user_data['position']}\n"
+        f"🏢 Подразделение: {user_data['department']}\n\n"
+        f"Пожалуйста, одобрите или отклоните заявку:"
+    )
+    return text, keyboard
+
 async def cancel(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Отмена регистрации"""
     user_id = update.effective_user.id
@@ -345,14 +355,23 @@ async def button_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 FORM_CONTRACT, FORM_TEXT, FORM_CONFIRM = range(3, 6)
 CHECKIN_CONTRACT, CHECKIN_DATE, CHECKIN_BRIG_NAME, CHECKIN_BRIG_PHONE, CHECKIN_CARRYING, CHECKIN_CONFIRM = range(6, 12)
 
+async def contract_prompt(user_id, form_emoji):
+    """Текст и клавиатура запроса номера договора с последними договорами пользователя"""
+    contracts = await asyncio.to_thread(get_recent_contracts, user_id)
+    text = f"{form_emoji} Пожалуйста, введите номер договора"
+    if contracts:
+        text += " или выберите из последних"
+    return text + ":", get_contract_keyboard(contracts)
+
 async def form_process(update: Update, context: ContextTypes.DEFAULT_TYPE, form_type: str, form_emoji: str):
     user_id = update.effective_user.id
     context.user_data['form_type'] = form_type
     context.user_data['form_emoji'] = form_emoji
     context.user_data['form_state'] = 'contract_number'
-    await update.message.reply_text(
-        f"{form_emoji} Пожалуйста, введите номер договора:",
-        reply_markup=get_cancel_keyboard())
+    # Профиль (ФИО, настройки) читается одним запросом на весь диалог
+    await load_user_profile(context, user_id, refresh=True)
+    text, reply_markup = await contract_prompt(user_id, form_emoji)
+    await update.message.reply_text(text, reply_markup=reply_markup)
     return FORM_CONTRACT
 
 async def delivery(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -362,9 +381,9 @@ async def checkin(update: Update, context: ContextTypes.DEFAULT_TYPE):
     user_id = update.effective_user.id
     context.user_data['form_type'] = "checkin"
     context.user_data['form_emoji'] = "🏎️"
-    await update.message.reply_text(
-        "🏎️ Пожалуйста, введите номер договора:",
-        reply_markup=get_cancel_keyboard())
+    await load_user_profile(context, user_id, refresh=True)
+    text, reply_markup = await contract_prompt(user_id, "🏎️")
+    await update.message.reply_text(text, reply_markup=reply_markup)
     return CHECKIN_CONTRACT
 
 async def refund(update: Update, context: ContextTypes.DEFAULT_TYPE):
@@ -467,8 +486,8 @@ async def get_form_text(update: Update, context: ContextTypes.DEFAULT_TYPE):
     
     # Если это доставка, проверяем настройку автонумерации
     if form_type == "delivery":
-        # Получаем настройки пользователя
-        user_settings = get_user_settings(update.effective_user.id)
+        # Получаем настройки пользователя из профиля диалога
+        user_settings = (await load_user_profile(context, update.effective_user.id))["settings"]
         
         # Если включена автонумерация и текст не содержит нумерацию
         if user_settings.get('auto_numbering', False):
@@ -889,13 +908,7 @@ async def checkin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "created_at": datetime.now().strftime("%Y-%m-%d %H:%M:%S")
         }
 
-        user_fullname = ""
-        try:
-            user_record = get_user_by_id_from_supabase(user_id)
-            if user_record:
-                user_fullname = user_record.get("fullname", "")
-        except Exception as e:
-            logging.error(f"Failed to load user data: {e}")
+        user_fullname = (await load_user_profile(context, user_id))["fullname"]
         form_data["creator_fullname"] = user_fullname
 
         # Отправка задачи в Битрикс
@@ -903,19 +916,14 @@ async def checkin_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         try:
             save_form_to_supabase(form_data)
+            forget_recent_contracts(user_id)
         except Exception as e:
             logging.error(f"Ошибка при сохранении в Supabase: {e}")
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"✅ Ваша заявка на заезд №{form_number} успешно создана!")
-        except Exception as e:
-            logging.error(f"Ошибка при отправке сообщения: {e}")
-        
-        await context.bot.send_message(
-            chat_id=user_id,
-            text="Вы вернулись в главное меню",
-            reply_markup=get_reply_keyboard(user_id, is_registered=True))
+        # Подтверждение и меню уходят через очередь уведомлений в этом порядке
+        notify(context.application, user_id, f"✅ Ваша заявка на заезд №{form_number} успешно создана!",
+               kind="form_confirmation", dedup_key=f"form_created:checkin:{form_number}")
+        notify(context.application, user_id, "Вы вернулись в главное меню",
+               reply_markup=get_reply_keyboard(user_id, is_registered=True), kind="main_menu")
         
         for key in ['num_contract', 'date', 'name_brig', 'phone_brig', 'carring', 'form_type', 'form_emoji']:
             if key in context.user_data:
@@ -1070,13 +1078,7 @@ async def form_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
             "form_text": context.user_data.get('form_text', ''),
             "created_at": datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")}
 
-        user_fullname = ""
-        try:
-            user_record = get_user_by_id_from_supabase(user_id)
-            if user_record:
-                user_fullname = user_record.get("fullname", "")
-        except Exception as e:
-            logging.error(f"Failed to load user data: {e}")
+        user_fullname = (await load_user_profile(context, user_id))["fullname"]
         form_data["creator_fullname"] = user_fullname
 
         # Отправка задачи в Битрикс
@@ -1111,20 +1113,15 @@ async def form_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
         try:
             save_form_to_supabase(form_data)
+            forget_recent_contracts(user_id)
         except Exception as e:
             logging.error(f"Ошибка при сохранении в Supabase: {e}")
             
-        try:
-            await context.bot.send_message(
-                chat_id=user_id,
-                text=f"✅ Ваша заявка на {text_name} №{form_number} успешно создана!")
-        except Exception as e:
-            logging.error(f"Ошибка при отправке сообщения: {e}")
-            
-        await context.bot.send_message(
-            chat_id=user_id,
-            text="Вы вернулись в главное меню",
-            reply_markup=get_reply_keyboard(user_id, is_registered=True))
+        # Подтверждение и меню уходят через очередь уведомлений в этом порядке
+        notify(context.application, user_id, f"✅ Ваша заявка на {text_name} №{form_number} успешно создана!",
+               kind="form_confirmation", dedup_key=f"form_created:{form_type}:{form_number}")
+        notify(context.application, user_id, "Вы вернулись в главное меню",
+               reply_markup=get_reply_keyboard(user_id, is_registered=True), kind="main_menu")
         
         # Очищаем данные формы
         for key in ['contract_number', 'form_text', 'form_state', 'form_type', 'form_emoji']:
@@ -1169,26 +1166,29 @@ async def form_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
         return ConversationHandler.END
 
 async def send_task_to_bitrix(user_id, user_fullname, form_type, form_data):
-    import requests
     import logging
-    import os
     import datetime
     from bot.commands.utils import get_owner_fullname
+    from bitrix_addon import BitrixUnavailableError, bitrix_breaker
+    
+    # Пока Битрикс24 недоступен, не заставляем пользователя ждать таймаутов
+    if bitrix_breaker.is_open():
+        error_message = "Битрикс24 временно недоступен. Попробуйте отправить заявку повторно через минуту"
+        logging.warning("Bitrix circuit breaker is open, task for form %s skipped", form_data.get('form_number'))
+        return False, error_message
     
     try:
         # Проверяем, является ли пользователь владельцем бота
         # Если да, используем ФИО из переменной FULLNAME
-        admin_ids = os.getenv('ADMIN_IDS', '').split(',')
-        admin_ids = [int(id.strip()) for id in admin_ids if id.strip().isdigit()]
-        
-        if user_id in admin_ids:
+        if user_id in Config.ADMIN_IDS:
             user_fullname = get_owner_fullname()
             logging.info(f"Используем ФИО владельца бота: {user_fullname}")
         
         # Получаем данные пользователя из Битрикс по ФИО
-        from bitrix_addon import get_bitrix_user_by_fullname, create_bitrix_task_as_user
+        from bitrix_addon import get_bitrix_user_by_fullname
         
-        bitrix_user = get_bitrix_user_by_fullname(user_fullname)
+        # HTTP-запросы к Битрикс выполняем в отдельном потоке, чтобы не блокировать event loop
+        bitrix_user = await asyncio.to_thread(get_bitrix_user_by_fullname, user_fullname)
         if not bitrix_user:
             error_message = f"Пользователь с ФИО '{user_fullname}' не найден в Битрикс24"
             logging.warning(error_message)
@@ -1203,78 +1203,21 @@ async def send_task_to_bitrix(user_id, user_fullname, form_type, form_data):
         # Получаем текущую дату для заявки
         current_date = datetime.datetime.now().strftime("%d.%m.%Y")
         form_number = form_data.get('form_number', '')
+        
+        # Ответственный, аудиторы и шаблон заголовка берутся из закешированных правил маршрутизации
+        rule = await asyncio.to_thread(get_routing_rule, form_type)
+        if rule:
+            task_title = rule.render_title(form_data)
+            responsible_id = rule.responsible_id
+            auditors = list(rule.auditors)
+        else:
+            # Для неизвестных типов задач используем пустые значения
+            task_title = f"Заявка Договор: {form_data.get('contract_number', '')}"
+            responsible_id = None
+            auditors = []
             
-        # Формируем заголовок и описание задачи
-        if form_type == "delivery":
-            task_title = f"Доставка Договор: {form_data.get('contract_number', '')}"
-            
-            # Получаем текст заявки как есть, без дополнительной обработки
-            form_text = form_data.get('form_text', '')
-            
-            # Добавляем информацию о заявке
-            task_description = form_text + f"\n\nЗаявка #{form_number} от {current_date}\n{user_fullname}"
-            
-            # Получаем ID ответственного и аудиторов из .env для доставки
-            responsible_id = os.getenv('DELIVERY_RESPONSIBLE_ID')
-            auditors_str = os.getenv('DELIVERY_AUDITORS', '[]')
-            try:
-                # Используем более надежный метод преобразования строки в список
-                import ast
-                try:
-                    auditors = ast.literal_eval(auditors_str)
-                except (ValueError, SyntaxError):
-                    # Если метод не сработал, используем базовый разбор строки с фильтрацией невалидных значений
-                    auditors = [x.strip() for x in auditors_str.strip('[]').replace("'", "").replace('"', '').split(',') if x.strip()]
-                
-                logging.info(f"Аудиторы для доставки: {auditors}")
-            except Exception as e:
-                logging.error(f"Ошибка при обработке аудиторов для доставки: {str(e)}")
-                auditors = []
-            
-        elif form_type == "refund":
-            task_title = f"Возврат материалов Договор: {form_data.get('contract_number', '')}"
-            task_description = f"{form_data.get('form_text', '')}\n\nЗаявка #{form_number} от {current_date}\n{user_fullname}"
-            
-            # Получаем ID ответственного и аудиторов из .env для возврата
-            responsible_id = os.getenv('RETURN_MATERIALS_RESPONSIBLE_ID')
-            auditors_str = os.getenv('RETURN_MATERIALS_AUDITORS', '[]')
-            try:
-                # Используем более надежный метод преобразования строки в список
-                import ast
-                try:
-                    auditors = ast.literal_eval(auditors_str)
-                except (ValueError, SyntaxError):
-                    # Если метод не сработал, используем базовый разбор строки с фильтрацией невалидных значений
-                    auditors = [x.strip() for x in auditors_str.strip('[]').replace("'", "").replace('"', '').split(',') if x.strip()]
-                
-                logging.info(f"Аудиторы для возврата: {auditors}")
-            except Exception as e:
-                logging.error(f"Ошибка при обработке аудиторов для возврата: {str(e)}")
-                auditors = []
-            
-        elif form_type == "painting":
-            task_title = f"Покраска Договор: {form_data.get('contract_number', '')}"
-            task_description = f"{form_data.get('form_text', '')}\n\nЗаявка #{form_number} от {current_date}\n{user_fullname}"
-            
-            # Получаем ID ответственного и аудиторов из .env для покраски
-            responsible_id = os.getenv('PAINTING_RESPONSIBLE_ID')
-            auditors_str = os.getenv('PAINTING_AUDITORS', '[]')
-            try:
-                # Используем более надежный метод преобразования строки в список
-                import ast
-                try:
-                    auditors = ast.literal_eval(auditors_str)
-                except (ValueError, SyntaxError):
-                    # Если метод не сработал, используем базовый разбор строки с фильтрацией невалидных значений
-                    auditors = [x.strip() for x in auditors_str.strip('[]').replace("'", "").replace('"', '').split(',') if x.strip()]
-                
-                logging.info(f"Аудиторы для покраски: {auditors}")
-            except Exception as e:
-                logging.error(f"Ошибка при обработке аудиторов для покраски: {str(e)}")
-                auditors = []
-            
-        elif form_type == "checkin":
-            task_title = f"Заезд Договор: {form_data.get('num_contract', '')}"
+        # Формируем описание задачи
+        if form_type == "checkin":
             task_description = (
                 f"Договор: {form_data.get('num_contract', '')}\n"
                 f"Дата Заезда: {form_data.get('date', '')}\n"
@@ -1283,33 +1226,16 @@ async def send_task_to_bitrix(user_id, user_fullname, form_type, form_data):
                 f"Грузоподъёмность: {form_data.get('carring', '')}\n\n"
                 f"Заявка #{form_number} от {current_date}\n{user_fullname}"
             )
-            
-            # Получаем ID ответственного и аудиторов из .env для заезда
-            responsible_id = os.getenv('CHECKIN_RESPONSIBLE_ID')
-            auditors_str = os.getenv('CHECKIN_AUDITORS', '[]')
-            try:
-                # Используем более надежный метод преобразования строки в список
-                import ast
-                try:
-                    auditors = ast.literal_eval(auditors_str)
-                except (ValueError, SyntaxError):
-                    # Если метод не сработал, используем базовый разбор строки с фильтрацией невалидных значений
-                    auditors = [x.strip() for x in auditors_str.strip('[]').replace("'", "").replace('"', '').split(',') if x.strip()]
-                
-                logging.info(f"Аудиторы для заезда: {auditors}")
-            except Exception as e:
-                logging.error(f"Ошибка при обработке аудиторов для заезда: {str(e)}")
-                auditors = []
         else:
-            # Для неизвестных типов задач используем пустые значения
-            responsible_id = None
-            auditors = []
+            # Текст заявки передаем как есть, без дополнительной обработки
+            task_description = f"{form_data.get('form_text', '')}\n\nЗаявка #{form_number} от {current_date}\n{user_fullname}"
         
         # Создаем задачу в Битрикс от имени пользователя
         # с передачей ответственного и аудиторов
         from bitrix_addon import create_bitrix_task_with_responsible
         
-        result = create_bitrix_task_with_responsible(
+        result = await asyncio.to_thread(
+            create_bitrix_task_with_responsible,
             creator_id=bitrix_user_id,
             title=task_title,
             description=task_description,
@@ -1325,6 +1251,10 @@ async def send_task_to_bitrix(user_id, user_fullname, form_type, form_data):
             logging.error(error_message)
             return False, error_message
             
+    except BitrixUnavailableError:
+        error_message = "Битрикс24 временно недоступен. Попробуйте отправить заявку повторно через минуту"
+        logging.warning(error_message)
+        return False, error_message
     except Exception as e:
         error_message = f"Ошибка при отправке задачи в Битрикс24: {str(e)}"
         logging.error(error_message)
@@ -1402,6 +1332,7 @@ async def retry_bitrix_callback(update: Update, context: ContextTypes.DEFAULT_TY
 
     try:
         save_form_to_supabase(form_data)
+        forget_recent_contracts(user_id)
     except Exception as e:
         logging.error(f"Ошибка при сохранении в Supabase: {e}")
     
@@ -1460,6 +1391,7 @@ async def handle_settings_callback(update: Update, context: ContextTypes.DEFAULT
         
         # Обновляем настройки
         update_user_settings(user_id, {'auto_numbering': new_value})
+        forget_user_profile(context)
         
         # Обновляем сообщение с новым статусом
         auto_numbering_status = "✅ Включен" if new_value else "❌ Выключен"
@@ -1496,6 +1428,161 @@ async def handle_settings_callback(update: Update, context: ContextTypes.DEFAULT
             logging.error(f"Ошибка при удалении сообщения: {e}")
 
 
+MY_APPS_PAGE_SIZE = 5
+MY_APPS_FILTERS = [
+    ("all", "Все"),
+    ("delivery", "🚚"),
+    ("checkin", "🏎️"),
+    ("refund", "🔙"),
+    ("painting", "🎨"),
+]
+MY_APPS_TYPE_NAMES = {
+    "delivery": "🚚 Доставка",
+    "checkin": "🏎️ Заезд",
+    "refund": "🔙 Возврат",
+    "painting": "🎨 Покраска",
+}
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
 
+def _encode_cursor(cursor) -> str:
+    """(created_at, id) -> строка для callback_data (микросекунды от эпохи и id)"""
+    created_at, app_id = cursor
+    return f"{(created_at - _EPOCH) // timedelta(microseconds=1)}_{app_id}"
+
+def _decode_cursor(micros: str, app_id: str):
+    return _EPOCH + timedelta(microseconds=int(micros)), int(app_id)
+
+def format_my_applications(apps: list[dict], form_type: str, page: int) -> str:
+    title = MY_APPS_TYPE_NAMES.get(form_type, "все типы")
+    if not apps:
+        return f"📜 Мои заявки ({title})\n\nЗаявок пока нет"
+    lines = [f"📜 Мои заявки ({title}), стр. {page + 1}\n"]
+    for app in apps:
+        name = MY_APPS_TYPE_NAMES.get(app['form_type'], app['form_type'])
+        details = f"Договор {app['contract']}" if app.get('contract') else ""
+        preview = (app.get('text') or "").replace("\n", " ")
+        if len(preview) > 60:
+            preview = preview[:57] + "..."
+        lines.append(
+            f"{name} №{app['form_number']} от {app['date']}"
+            + (f" · {details}" if details else "")
+            + (f"\n   {preview}" if preview else "")
+        )
+    return "\n".join(lines)
 
+def get_my_applications_keyboard(apps: list[dict], form_type: str, page: int) -> InlineKeyboardMarkup:
+    keyboard = [[
+        InlineKeyboardButton(f"• {label}" if key == form_type else label, callback_data=f"myapps_{key}_0")
+        for key, label in MY_APPS_FILTERS
+    ]]
+    for i in range(0, len(apps), 2):
+        keyboard.append([
+            InlineKeyboardButton(f"Открыть №{app['form_number']}", callback_data=f"myapps_open_{app['id']}")
+            for app in apps[i:i + 2]
+        ])
+    nav_buttons = []
+    if page > 0 and apps:
+        nav_buttons.append(InlineKeyboardButton(
+            "⬅️", callback_data=f"myapps_{form_type}_{page - 1}_n_{_encode_cursor(apps[0]['cursor'])}"
+        ))
+    if len(apps) == MY_APPS_PAGE_SIZE:
+        # Полная страница — дальше могут быть ещё заявки
+        nav_buttons.append(InlineKeyboardButton(
+            "➡️", callback_data=f"myapps_{form_type}_{page + 1}_o_{_encode_cursor(apps[-1]['cursor'])}"
+        ))
+    if nav_buttons:
+        keyboard.append(nav_buttons)
+    return InlineKeyboardMarkup(keyboard)
 
+async def _my_applications_page(user_id: int, form_type: str, older_than=None, newer_than=None) -> list[dict]:
+    return await asyncio.to_thread(
+        list_user_applications_page,
+        user_id,
+        None if form_type == "all" else form_type,
+        older_than,
+        newer_than,
+        MY_APPS_PAGE_SIZE,
+    )
+
+async def my_applications(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Обработчик кнопки 'Мои заявки': первая страница истории заявок пользователя"""
+    user_id = update.effective_user.id
+    if not (is_user_registered(user_id) or is_admin(user_id)):
+        await update.message.reply_text("⛔ Сначала пройдите регистрацию")
+        return
+
+    try:
+        apps = await _my_applications_page(user_id, "all")
+    except Exception as e:
+        logging.error(f"Ошибка при загрузке заявок пользователя {user_id}: {e}")
+        await update.message.reply_text("❌ Не удалось загрузить ваши заявки")
+        return
+
+    context.user_data['my_apps_page'] = "myapps_all_0"
+    await update.message.reply_text(
+        format_my_applications(apps, "all", 0),
+        reply_markup=get_my_applications_keyboard(apps, "all", 0)
+    )
+
+async def handle_my_applications_callback(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Листание, фильтр по типу и просмотр заявки в 'Мои заявки' (редактирует то же сообщение)"""
+    query = update.callback_query
+    await query.answer()
+    user_id = update.effective_user.id
+    parts = query.data.split("_")
+
+    try:
+        if parts[1] == "open":
+            app = await asyncio.to_thread(get_application_by_id, parts[2])
+            if not app or app.get('user_id') != user_id:
+                await query.edit_message_text("❌ Заявка не найдена")
+                return
+            message = (
+                f"{MY_APPS_TYPE_NAMES.get(app['form_type'], app['form_type'])} №{app['form_number']}\n"
+                f"📅 Дата: {app['date']}\n\n"
+            )
+            for key, label in (
+                ('contract', 'Договор'),
+                ('text', 'Текст заявки'),
+                ('date_checkin', 'Дата заезда'),
+                ('brigadier_name', 'Бригадир'),
+                ('brigadier_phone', 'Телефон бригадира'),
+                ('carrying', 'Грузоподъёмность'),
+            ):
+                if app.get(key):
+                    message += f"{label}: {app[key]}\n"
+            await query.edit_message_text(
+                message,
+                reply_markup=InlineKeyboardMarkup([[
+                    InlineKeyboardButton("🔙 К списку", callback_data=context.user_data.get('my_apps_page', "myapps_all_0"))
+                ]])
+            )
+            return
+
+        form_type, page = parts[1], int(parts[2])
+        older_than = newer_than = None
+        if len(parts) == 6:
+            cursor = _decode_cursor(parts[4], parts[5])
+            if parts[3] == "o":
+                older_than = cursor
+            else:
+                newer_than = cursor
+        apps = await _my_applications_page(user_id, form_type, older_than, newer_than)
+        if page > 0 and (not apps or (newer_than and len(apps) < MY_APPS_PAGE_SIZE)):
+            # Заявки удалили или добавили между нажатиями — начинаем с первой страницы
+            page = 0
+            apps = await _my_applications_page(user_id, form_type)
+
+        context.user_data['my_apps_page'] = query.data if page else f"myapps_{form_type}_0"
+        try:
+            await query.edit_message_text(
+                format_my_applications(apps, form_type, page),
+                reply_markup=get_my_applications_keyboard(apps, form_type, page)
+            )
+        except BadRequest as e:
+            # Повторное нажатие на ту же страницу: сообщение не изменилось
+            if "not modified" not in str(e):
+                raise
+    except Exception as e:
+        logging.error(f"Ошибка при загрузке заявок пользователя {user_id}: {e}")
+        await query.edit_message_text("❌ Не удалось загрузить ваши заявки")
@@ -6,13 +6,12 @@ import logging
 from bot.services.supabase_storage import (
     get_user_by_id as get_user_by_id_from_supabase,
     get_user_settings_from_supabase,
-    is_user_admin as is_user_admin_in_supabase,
-    is_user_registered as is_user_registered_in_supabase,
     list_applications_by_user,
     update_user_fields as update_user_fields_in_supabase,
     update_user_settings_in_supabase,
     upsert_user,
 )
+from bot.services.user_flags import get_user_flags
 
 def is_admin(user_id):
     """Check whether user is bot admin."""
@@ -21,14 +20,16 @@ def is_admin(user_id):
         admin_ids = [int(id.strip()) for id in admin_ids if id.strip().isdigit()]
         if user_id in admin_ids:
             return True
-        return is_user_admin_in_supabase(user_id)
+        flags = get_user_flags(user_id)
+        return bool(flags and flags["admin"])
     except Exception as e:
         logging.error(f"Admin check failed: {e}")
         return False
 
 def is_user_registered(user_id):
     """Check user registration status."""
-    return is_user_registered_in_supabase(user_id)
+    flags = get_user_flags(user_id)
+    return bool(flags and flags["approved"])
 
 async def cancel_operation(update, context, operation_name):
     """Отмена операции"""
@@ -37,7 +38,7 @@ async def cancel_operation(update, context, operation_name):
 
 def check_user_registration(user_id: int) -> bool:
     """Check user approved status."""
-    return is_user_registered_in_supabase(user_id)
+    return is_user_registered(user_id)
 
 def get_reply_keyboard(user_id: int, is_registered: bool = False) -> ReplyKeyboardMarkup:
     """Возвращает клавиатуру в зависимости от статуса регистрации"""
@@ -46,7 +47,7 @@ def get_reply_keyboard(user_id: int, is_registered: bool = False) -> ReplyKeyboa
             [KeyboardButton("🚚 Доставка"), KeyboardButton("🏎️ Заезд")],
             [KeyboardButton("🔙 Возврат"), KeyboardButton("🎨 Покраска")],
             #[KeyboardButton("⚙️ Настройки")], 
-            [KeyboardButton("ℹ️ Помощь")]
+            [KeyboardButton("📜 Мои заявки"), KeyboardButton("ℹ️ Помощь")]
         ]
     else:
         # Клавиатура для незарегистрированных
@@ -63,7 +64,7 @@ def get_reply_keyboard(user_id: int, is_registered: bool = False) -> ReplyKeyboa
                 [KeyboardButton("🚚 Доставка"), KeyboardButton("🏎️ Заезд")],
                 [KeyboardButton("🔙 Возврат"), KeyboardButton("🎨 Покраска")],
                 #[KeyboardButton("⚙️ Настройки")], 
-                [KeyboardButton("ℹ️ Помощь")],
+                [KeyboardButton("📜 Мои заявки"), KeyboardButton("ℹ️ Помощь")],
                 [KeyboardButton("⚙️ Админ-панель")]
             ]
     
@@ -73,6 +74,15 @@ def get_cancel_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура с кнопкой 'Отмена'"""
     return ReplyKeyboardMarkup([[KeyboardButton("❌ Отмена")]], resize_keyboard=True)
 
+def get_contract_keyboard(contracts: list[str]) -> ReplyKeyboardMarkup:
+    """Клавиатура с последними договорами пользователя и кнопкой 'Отмена'"""
+    keyboard = [
+        [KeyboardButton(contract) for contract in contracts[i:i + 2]]
+        for i in range(0, len(contracts), 2)
+    ]
+    keyboard.append([KeyboardButton("❌ Отмена")])
+    return ReplyKeyboardMarkup(keyboard, resize_keyboard=True)
+
 def get_admin_keyboard() -> ReplyKeyboardMarkup:
     """Клавиатура для админ-панели"""
     keyboard = [
@@ -92,7 +102,7 @@ def save_user_to_json(user_data: dict) -> bool:
     
 def check_user_registration(user_id: int) -> bool:
     """Check user approved status."""
-    return is_user_registered_in_supabase(user_id)
+    return is_user_registered(user_id)
     
 async def force_update_keyboard(update: Update, context: ContextTypes.DEFAULT_TYPE):
     """Принудительное обновление клавиатуры"""
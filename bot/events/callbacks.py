@@ -1,6 +1,7 @@
 from telegram import Update
 from telegram.ext import ContextTypes, CallbackQueryHandler
 from bot.commands.user import save_user_to_json
+from bot.services.notifications import notify
 import logging
 
 # Удаляем импорт из main, чтобы избежать циклического импорта
@@ -25,11 +26,13 @@ async def handle_admin_approval(update: Update, context: ContextTypes.DEFAULT_TY
                 # Импортируем функцию здесь, чтобы избежать циклического импорта
                 from main import get_reply_keyboard
                 
-                # Отправляем новую клавиатуру пользователю
-                await context.bot.send_message(
-                    chat_id=user_id,
-                    text="🎉 Ваша регистрация подтверждена! Теперь вам доступны все функции.",
-                    reply_markup=get_reply_keyboard(user_id, is_registered=True)
+                # Новая клавиатура уходит пользователю через очередь уведомлений.
+                # dedup_key не нужен: повторное нажатие не найдёт pending_user_ и не дойдёт сюда
+                notify(
+                    context.application, user_id,
+                    "🎉 Ваша регистрация подтверждена! Теперь вам доступны все функции.",
+                    reply_markup=get_reply_keyboard(user_id, is_registered=True),
+                    kind="registration_result"
                 )
                 
                 # Отправляем сообщение администратору о том, что регистрация подтверждена
@@ -43,11 +46,12 @@ async def handle_admin_approval(update: Update, context: ContextTypes.DEFAULT_TY
             # Импортируем функцию здесь, чтобы избежать циклического импорта
             from main import get_reply_keyboard
             
-            # Отправляем сообщение пользователю
-            await context.bot.send_message(
-                chat_id=user_id,
-                text="❌ Ваша регистрация отклонена. Пожалуйста, обратитесь к администратору.",
-                reply_markup=get_reply_keyboard(user_id, is_registered=False)
+            # Сообщение пользователю уходит через очередь уведомлений
+            notify(
+                context.application, user_id,
+                "❌ Ваша регистрация отклонена. Пожалуйста, обратитесь к администратору.",
+                reply_markup=get_reply_keyboard(user_id, is_registered=False),
+                kind="registration_result"
             )
             
             # Отправляем сообщение администратору
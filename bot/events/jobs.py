@@ -0,0 +1,140 @@
+import asyncio
+import json
+import logging
+import os
+import time
+from datetime import datetime
+
+from config import Config
+from bot.commands.user import registration_request_message
+from bot.services.notifications import DUPLICATE, notify
+from bot.services.scheduler import Job
+from bot.services.supabase_storage import (
+    archive_form_partitions,
+    ensure_form_partitions,
+    get_table_maintenance_hints,
+    list_pending_registrations,
+)
+
+
+# Данные диалога пользователя, который молчит дольше этого срока, удаляются из памяти
+CONVERSATION_DATA_TTL_HOURS = int(os.getenv("CONVERSATION_DATA_TTL_HOURS", "72"))
+# Напоминать о заявках на регистрацию, которые ждут дольше этого срока
+REGISTRATION_REMINDER_AFTER_MINUTES = int(os.getenv("REGISTRATION_REMINDER_AFTER_MINUTES", "60"))
+RESOURCE_PEAKS_PATH = os.path.join("data", "resource_peaks.json")
+RESOURCE_PEAKS_HISTORY_PATH = os.path.join("data", "resource_peaks_history.json")
+RESOURCE_PEAKS_HISTORY_SIZE = 12
+
+HOUR = 3600
+DAY = 24 * HOUR
+# Недельные слоты от эпохи (четверг) сдвинуты на понедельник
+WEEK_FROM_MONDAY = 4 * DAY
+
+
+def _every(name: str, default: int) -> int:
+    """JOB_<NAME>_EVERY из окружения, 0 — задача выключена."""
+    return int(os.getenv(f"JOB_{name.upper()}_EVERY", str(default)))
+
+
+def purge_stale_conversations(app):
+    async def job() -> str:
+        cutoff = time.time() - CONVERSATION_DATA_TTL_HOURS * HOUR
+        stale = [
+            user_id
+            for user_id, user_data in list(app.user_data.items())
+            if user_data.get("last_seen", 0) < cutoff
+        ]
+        for user_id in stale:
+            app.drop_user_data(user_id)
+            # Личный чат с пользователем имеет тот же id
+            if user_id in app.chat_data:
+                app.drop_chat_data(user_id)
+        return f"dropped {len(stale)} of {len(stale) + len(app.user_data)} users"
+
+    return job
+
+
+def remind_pending_registrations(app):
+    async def job() -> str:
+        pending = await asyncio.to_thread(list_pending_registrations, REGISTRATION_REMINDER_AFTER_MINUTES)
+        queued = 0
+        for user_data in pending:
+            # Кнопки одобрения берут данные из bot_data, как при самой регистрации
+            app.bot_data.setdefault(f"pending_user_{user_data['user_id']}", user_data)
+            text, keyboard = registration_request_message(
+                user_data, title="⏳ Заявка на регистрацию всё ещё ждёт решения:"
+            )
+            notifications = notify(
+                app, Config.ADMIN_IDS, text, reply_markup=keyboard, kind="registration_reminder",
+                dedup_key=f"registration_reminder:{user_data['user_id']}:{datetime.now():%Y-%m-%d}"
+            )
+            queued += sum(n.status != DUPLICATE for n in notifications)
+        return f"{len(pending)} pending, {queued} reminders queued"
+
+    return job
+
+
+async def rotate_resource_peaks() -> str:
+    """Закрывает период пиковых CPU/памяти (экран «Потребление») и начинает новый."""
+    try:
+        with open(RESOURCE_PEAKS_PATH, "r") as f:
+            peaks = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return "no peaks recorded"
+
+    try:
+        with open(RESOURCE_PEAKS_HISTORY_PATH, "r") as f:
+            history = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        history = []
+    history.append({"period_end": datetime.now().strftime("%Y-%m-%d %H:%M:%S"), **peaks})
+
+    os.makedirs("data", exist_ok=True)
+    with open(RESOURCE_PEAKS_HISTORY_PATH, "w") as f:
+        json.dump(history[-RESOURCE_PEAKS_HISTORY_SIZE:], f, ensure_ascii=False, indent=2)
+    with open(RESOURCE_PEAKS_PATH, "w") as f:
+        json.dump({"bot_cpu_peak": 0, "bot_memory_peak": 0}, f)
+    return f"cpu {peaks.get('bot_cpu_peak', 0)}%, memory {peaks.get('bot_memory_peak', 0)}%"
+
+
+async def table_maintenance_hints() -> str:
+    hints = await asyncio.to_thread(get_table_maintenance_hints)
+    for hint in hints:
+        actions = " and ".join(
+            action for action, needed in (("VACUUM", hint["needs_vacuum"]), ("ANALYZE", hint["needs_analyze"])) if needed
+        )
+        logging.warning(
+            f"{hint['table_name']}: consider {actions} "
+            f"(live {hint['live_rows']}, dead {hint['dead_rows']}, modified since analyze {hint['modified_since_analyze']}, "
+            f"last vacuum {hint['last_vacuum']}, last analyze {hint['last_analyze']})"
+        )
+    return ", ".join(hint["table_name"] for hint in hints) or "no tables need attention"
+
+
+async def maintain_form_partitions() -> str:
+    created = await asyncio.to_thread(
+        ensure_form_partitions, int(os.getenv("FORMS_PARTITIONS_AHEAD_MONTHS", "3"))
+    )
+    keep_months = int(os.getenv("FORMS_ARCHIVE_AFTER_MONTHS", "24"))
+    archived = await asyncio.to_thread(archive_form_partitions, keep_months) if keep_months > 0 else []
+    return f"created {created}, archived {', '.join(archived) or 'none'}"
+
+
+def build_jobs(app) -> list[Job]:
+    """Фоновые задачи бота; интервалы переопределяются через JOB_<NAME>_EVERY (секунды)."""
+    jobs = [
+        # Данные в памяти у каждой реплики свои, поэтому без блокировки
+        Job("purge_stale_conversations", purge_stale_conversations(app), _every("purge_stale_conversations", HOUR),
+            jitter=300, exclusive=False),
+        # 06:00 UTC — 09:00 по Москве
+        Job("remind_pending_registrations", remind_pending_registrations(app),
+            _every("remind_pending_registrations", DAY), offset=6 * HOUR, jitter=300),
+        # Файл пиков лежит в контейнере, поэтому у каждой реплики свой
+        Job("rotate_resource_peaks", rotate_resource_peaks, _every("rotate_resource_peaks", 7 * DAY),
+            offset=WEEK_FROM_MONDAY, jitter=600, exclusive=False),
+        Job("table_maintenance_hints", table_maintenance_hints, _every("table_maintenance_hints", DAY),
+            offset=3 * HOUR, jitter=600),
+        Job("maintain_form_partitions", maintain_form_partitions, _every("maintain_form_partitions", DAY),
+            offset=2 * HOUR, jitter=600),
+    ]
+    return [job for job in jobs if job.every > 0]
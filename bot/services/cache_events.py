@@ -0,0 +1,99 @@
+"""Cross-process cache invalidation over LISTEN/NOTIFY.
+
+Triggers from 008_cache_notify.sql publish ``{"table": ..., "key": ...}`` on
+the bot_cache channel when a row commits. listen() keeps one dedicated async
+connection on that channel and calls the callbacks subscribed to the table
+with the changed key; ``None`` means "drop everything" and is sent after each
+(re)connect, since events may have been missed while disconnected.
+
+While the listener is connected, caches may keep entries for
+CACHE_TTL_WHEN_LISTENING seconds; otherwise they fall back to their own short
+TTLs. LISTEN needs a session, so the listener uses DATABASE_LISTEN_URL, else
+DATABASE_SESSION_URL, else DATABASE_URL unless it is the transaction pooler.
+"""
+import asyncio
+import json
+import logging
+import os
+from collections import defaultdict
+from typing import Callable
+
+import psycopg
+
+from bot.services import db
+
+
+CHANNEL = "bot_cache"
+CACHE_TTL_WHEN_LISTENING = int(os.getenv("CACHE_TTL_WHEN_LISTENING", "3600"))
+LISTEN_RECONNECT_DELAY = 5
+
+_subscribers: dict[str, list[Callable[[str | None], None]]] = defaultdict(list)
+_listening = False
+
+
+def subscribe(table: str, callback: Callable[[str | None], None]) -> None:
+    """Calls callback(key) when a row of bot.<table> changes (key None: evict everything)."""
+    _subscribers[table].append(callback)
+
+
+def is_listening() -> bool:
+    return _listening
+
+
+def cache_ttl(fallback: int) -> int:
+    """TTL for a cache kept fresh by invalidation events."""
+    return max(fallback, CACHE_TTL_WHEN_LISTENING) if _listening else fallback
+
+
+def dispatch(table: str, key: str | None) -> None:
+    for callback in _subscribers.get(table, ()):
+        try:
+            callback(key)
+        except Exception as e:
+            logging.error(f"Cache invalidation for {table}:{key} failed: {e}")
+
+
+def _dispatch_all() -> None:
+    for table in list(_subscribers):
+        dispatch(table, None)
+
+
+def listen_url() -> str | None:
+    url = os.getenv("DATABASE_LISTEN_URL") or os.getenv("DATABASE_SESSION_URL")
+    if url:
+        return url
+    url = db.resolve_database_url()
+    if url and not db.is_transaction_pooler(url):
+        return url
+    return None
+
+
+async def listen() -> None:
+    """Runs until cancelled, reconnecting after errors."""
+    global _listening
+    url = listen_url()
+    if not url:
+        logging.warning("Cache invalidation listener disabled: no session-mode database URL")
+        return
+
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(url, autocommit=True) as conn:
+                await conn.execute(f"listen {CHANNEL}")
+                _listening = True
+                _dispatch_all()
+                logging.info(f"Listening for cache invalidation on {CHANNEL}")
+                async for notify in conn.notifies():
+                    try:
+                        event = json.loads(notify.payload)
+                    except ValueError:
+                        logging.warning(f"Bad cache invalidation payload: {notify.payload!r}")
+                        continue
+                    dispatch(event.get("table"), event.get("key"))
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logging.error(f"Cache invalidation listener failed: {e}")
+        finally:
+            _listening = False
+        await asyncio.sleep(LISTEN_RECONNECT_DELAY)
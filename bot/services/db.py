@@ -0,0 +1,339 @@
+"""Connection pool and named-query registry for the storage layer.
+
+The connection mode is picked from the configuration:
+
+* session: a direct connection or the Supavisor session port
+  (DATABASE_SESSION_URL, or DATABASE_URL not on the transaction pooler).
+  Registered queries are prepared server-side once per pooled connection,
+  so repeated calls skip parse/plan.
+* transaction: the Supabase transaction pooler (port 6543), where a prepared
+  statement may land on another backend. Queries use client-side binding:
+  one simple-protocol message per query and nothing to prepare.
+
+DATABASE_PREPARE=on/off overrides the detection.
+
+Pooled connections run in autocommit, so a storage call that sends one
+statement costs one network round trip (no separate BEGIN/COMMIT). Functions
+that need several statements combine them into one query; the cursors count
+statements per thread (round_trips()) so the benchmark can check that.
+
+With DATABASE_READ_URL set, read-only storage functions use a second pool on
+that endpoint (a read replica), so exports and dashboards do not compete with
+form submission. For DATABASE_READ_AFTER_WRITE_SECONDS after a user writes
+(as the actor of an update or as the subject of the row), that user's reads
+go to the primary, so they see their own changes despite replica lag.
+"""
+import logging
+import os
+import threading
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from urllib.parse import urlsplit
+
+import psycopg
+from psycopg_pool import ConnectionPool
+
+
+TRANSACTION_POOLER_PORT = os.getenv("POOLER_PROXY_PORT_TRANSACTION", "6543")
+DATABASE_POOL_MIN_SIZE = int(os.getenv("DATABASE_POOL_MIN_SIZE", "1"))
+DATABASE_POOL_MAX_SIZE = int(os.getenv("DATABASE_POOL_MAX_SIZE", "10"))
+DATABASE_POOL_TIMEOUT = float(os.getenv("DATABASE_POOL_TIMEOUT", "30"))
+DATABASE_READ_AFTER_WRITE_SECONDS = float(os.getenv("DATABASE_READ_AFTER_WRITE_SECONDS", "10"))
+# Порог psycopg для прочих запросов: подготовка после N выполнений на соединении
+DEFAULT_PREPARE_THRESHOLD = 5
+
+# Пользователь Telegram, чей апдейт сейчас обрабатывается (ставится в main, переходит в asyncio.to_thread)
+current_user_id: ContextVar[int | None] = ContextVar("db_current_user_id", default=None)
+
+
+def _strip_host_scheme(value: str | None) -> str:
+    """Убирает https:// и http:// из хоста, чтобы не ломать парсинг postgres URL."""
+    if not value:
+        return value or ""
+    s = value.strip()
+    for prefix in ("https://", "http://"):
+        if s.lower().startswith(prefix):
+            return s[len(prefix) :].strip()
+    return s
+
+
+def resolve_database_url() -> str | None:
+    database_url = os.getenv("DATABASE_URL")
+    if database_url:
+        # Если в URL хост указан как https://... — убрать схему, иначе resolve host "https"
+        if "@https://" in database_url or "@http://" in database_url:
+            database_url = database_url.replace("@https://", "@").replace("@http://", "@")
+        return database_url
+
+    supabase_host = _strip_host_scheme(os.getenv("SUPABASE_HOST"))
+    postgres_password = os.getenv("POSTGRES_PASSWORD")
+    if supabase_host and postgres_password:
+        db = os.getenv("POSTGRES_DB", "postgres")
+        tenant = os.getenv("POOLER_TENANT_ID")
+        base_user = os.getenv("POSTGRES_USER", "postgres")
+        user = f"{base_user}.{tenant}" if tenant else base_user
+        port = os.getenv("POOLER_PROXY_PORT_TRANSACTION", "6543")
+        return f"postgresql://{user}:{postgres_password}@{supabase_host}:{port}/{db}"
+
+    host = _strip_host_scheme(os.getenv("SUPABASE_DB_HOST"))
+    port = os.getenv("SUPABASE_DB_PORT", "5432")
+    db = os.getenv("SUPABASE_DB_NAME", "postgres")
+    user = os.getenv("SUPABASE_DB_USER", "postgres")
+    password = os.getenv("SUPABASE_DB_PASSWORD")
+    if host and password:
+        return f"postgresql://{user}:{password}@{host}:{port}/{db}"
+
+    return None
+
+
+def is_transaction_pooler(database_url: str) -> bool:
+    try:
+        port = urlsplit(database_url).port
+    except ValueError:
+        port = None
+    return str(port) == TRANSACTION_POOLER_PORT or "pgbouncer=true" in database_url
+
+
+def _use_prepare(database_url: str, session: bool) -> bool:
+    override = os.getenv("DATABASE_PREPARE", "auto").lower()
+    if override in ("on", "true", "1"):
+        return True
+    if override in ("off", "false", "0"):
+        return False
+    return session or not is_transaction_pooler(database_url)
+
+
+def connection_settings() -> tuple[str, bool]:
+    """Returns (database url, use prepared statements)."""
+    session_url = os.getenv("DATABASE_SESSION_URL")
+    database_url = session_url or resolve_database_url()
+    if not database_url:
+        raise RuntimeError("Supabase/Postgres is not configured. Set DATABASE_URL or SUPABASE variables.")
+    return database_url, _use_prepare(database_url, bool(session_url))
+
+
+def read_connection_settings() -> tuple[str, bool] | None:
+    """(replica url, use prepared statements), or None when DATABASE_READ_URL is not set."""
+    read_url = os.getenv("DATABASE_READ_URL")
+    if not read_url:
+        return None
+    return read_url, _use_prepare(read_url, False)
+
+
+_local = threading.local()
+
+
+def round_trips() -> int:
+    """Statements sent by this thread so far; with autocommit each is one network round trip."""
+    return getattr(_local, "round_trips", 0)
+
+
+class _RoundTripCounter:
+    def execute(self, *args, **kwargs):
+        _local.round_trips = round_trips() + 1
+        return super().execute(*args, **kwargs)
+
+
+class Cursor(_RoundTripCounter, psycopg.Cursor):
+    pass
+
+
+class ClientCursor(_RoundTripCounter, psycopg.ClientCursor):
+    pass
+
+
+@dataclass
+class RegisteredQuery:
+    name: str
+    sql: str
+    calls: int = 0
+    total_s: float = 0.0
+    max_s: float = 0.0
+    last_params: object = field(default=None, repr=False)
+
+
+_registry_lock = threading.Lock()
+QUERY_REGISTRY: dict[str, RegisteredQuery] = {}
+
+_pool_lock = threading.Lock()
+_pool: ConnectionPool | None = None
+_read_pool: ConnectionPool | None = None
+_prepare = False
+_cursor_factory = None
+
+_writes_lock = threading.Lock()
+_recent_writes: dict[int, float] = {}
+_write_listeners: list = []
+
+
+def configure(cursor_factory=None) -> None:
+    """Overrides the cursor class for new pooled connections (used by the load test)."""
+    global _cursor_factory
+    _cursor_factory = cursor_factory
+
+
+def cursor_class() -> type:
+    """Cursor class matching the current mode: server-side binding only where statements can be prepared."""
+    _, prepare = connection_settings()
+    return Cursor if prepare else ClientCursor
+
+
+def _open_pool(database_url: str, prepare: bool, name: str) -> ConnectionPool:
+    kwargs = {
+        # Без autocommit каждый вызов стоил бы ещё BEGIN и COMMIT по сети
+        "autocommit": True,
+        # None выключает подготовку целиком, даже execute(prepare=True), — только для pooler.
+        # В режиме session зарегистрированные запросы готовятся с первого вызова (prepare=True)
+        "prepare_threshold": DEFAULT_PREPARE_THRESHOLD if prepare else None,
+        "cursor_factory": _cursor_factory or (Cursor if prepare else ClientCursor),
+    }
+    pool = ConnectionPool(
+        database_url,
+        min_size=DATABASE_POOL_MIN_SIZE,
+        max_size=DATABASE_POOL_MAX_SIZE,
+        timeout=DATABASE_POOL_TIMEOUT,
+        kwargs=kwargs,
+        open=True,
+        name=name,
+    )
+    logging.info(f"DB pool {name} opened ({'session, prepared statements' if prepare else 'transaction pooler, client-side binding'})")
+    return pool
+
+
+def _get_pool() -> ConnectionPool:
+    global _pool, _prepare
+    if _pool is not None:
+        return _pool
+    with _pool_lock:
+        if _pool is None:
+            database_url, _prepare = connection_settings()
+            _pool = _open_pool(database_url, _prepare, "supabase_storage")
+    return _pool
+
+
+def _get_read_pool() -> ConnectionPool | None:
+    global _read_pool
+    if _read_pool is not None:
+        return _read_pool
+    settings = read_connection_settings()
+    if settings is None:
+        return None
+    with _pool_lock:
+        if _read_pool is None:
+            _read_pool = _open_pool(*settings, "supabase_storage_read")
+    return _read_pool
+
+
+def connection():
+    """Pooled autocommit connection; use conn.transaction() where statements must be atomic."""
+    return _get_pool().connection()
+
+
+def add_write_listener(callback) -> None:
+    """Calls callback(user_id) after this process writes a row of that user (local cache eviction)."""
+    _write_listeners.append(callback)
+
+
+def note_write(*user_ids: int | None) -> None:
+    """Sends reads of these users and of the current actor to the primary for a short window."""
+    for user_id in user_ids:
+        if user_id is None:
+            continue
+        for callback in _write_listeners:
+            try:
+                callback(user_id)
+            except Exception as e:
+                logging.error(f"Write listener failed for {user_id}: {e}")
+
+    ids = {user_id for user_id in (*user_ids, current_user_id.get()) if user_id is not None}
+    if not ids or not os.getenv("DATABASE_READ_URL"):
+        return
+    now = time.monotonic()
+    with _writes_lock:
+        if len(_recent_writes) > 1000:
+            for user_id in [user_id for user_id, until in _recent_writes.items() if until < now]:
+                del _recent_writes[user_id]
+        for user_id in ids:
+            _recent_writes[user_id] = now + DATABASE_READ_AFTER_WRITE_SECONDS
+
+
+def _wrote_recently(user_ids) -> bool:
+    now = time.monotonic()
+    with _writes_lock:
+        return any(_recent_writes.get(user_id, 0) > now for user_id in user_ids if user_id is not None)
+
+
+def read_connection(user_id: int | None = None):
+    """Connection for a read-only query: the replica pool, or the primary if there is none
+    or the current actor / ``user_id`` wrote within the read-after-write window."""
+    read_pool = _get_read_pool()
+    if read_pool is None or _wrote_recently((user_id, current_user_id.get())):
+        return connection()
+    return read_pool.connection()
+
+
+def close_pool() -> None:
+    global _pool, _read_pool
+    with _pool_lock:
+        for pool in (_pool, _read_pool):
+            if pool is not None:
+                pool.close()
+        _pool = None
+        _read_pool = None
+
+
+def prepared_statements_enabled() -> bool:
+    _get_pool()
+    return _prepare
+
+
+def server_prepared_statements() -> int:
+    """Statements prepared on the server for one pooled connection (0 on the transaction pooler)."""
+    with connection() as conn:
+        with conn.cursor() as cur:
+            cur.execute("select count(*) from pg_prepared_statements where not from_sql", prepare=False)
+            return cur.fetchone()[0]
+
+
+def execute(cur: psycopg.Cursor, name: str, sql: str, params=None) -> psycopg.Cursor:
+    """Runs a registered query by name; prepared server-side where the pool binds on the server."""
+    query = QUERY_REGISTRY.get(name)
+    if query is None:
+        with _registry_lock:
+            query = QUERY_REGISTRY.setdefault(name, RegisteredQuery(name, sql))
+
+    started = time.perf_counter()
+    # Класс курсора задаёт пул: ClientCursor — transaction pooler, без prepare
+    if not isinstance(cur, psycopg.ClientCursor):
+        cur.execute(query.sql, params, prepare=True)
+    else:
+        cur.execute(query.sql, params)
+    elapsed = time.perf_counter() - started
+
+    with _registry_lock:
+        query.calls += 1
+        query.total_s += elapsed
+        query.max_s = max(query.max_s, elapsed)
+        query.last_params = params
+    return cur
+
+
+def query_stats() -> dict[str, dict]:
+    with _registry_lock:
+        return {
+            name: {
+                "calls": query.calls,
+                "mean_ms": round(query.total_s / query.calls * 1000, 3) if query.calls else 0.0,
+                "max_ms": round(query.max_s * 1000, 3),
+            }
+            for name, query in sorted(QUERY_REGISTRY.items())
+        }
+
+
+def reset_query_stats() -> None:
+    with _registry_lock:
+        for query in QUERY_REGISTRY.values():
+            query.calls = 0
+            query.total_s = 0.0
+            query.max_s = 0.0
@@ -0,0 +1,127 @@
+"""Building table exports in a process pool.
+
+Serializing tens of thousands of rows to XLSX or CSV is CPU-bound and would
+block the event loop, so it runs in worker processes. Each form type is one
+task: the worker queries its sheet and serializes it, and the parent merges
+the results. CSV sheets are zipped together. An openpyxl workbook cannot be
+split across processes, so for XLSX a single worker fetches the sheets (in
+threads, the queries wait on the DB) and writes the workbook; rows never pass
+through the bot process.
+
+Workers are spawned rather than forked (the parent has DB pool and asyncio
+threads) and open their own small connection pool on first use.
+"""
+import asyncio
+import csv
+import io
+import multiprocessing
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+
+EXPORT_FORM_TYPES = ("delivery", "refund", "painting", "checkin")
+EXPORT_WORKERS = int(os.getenv("EXPORT_WORKERS", str(min(len(EXPORT_FORM_TYPES), os.cpu_count() or 1))))
+EMPTY_EXPORT_NOTE = "Нет данных в Supabase"
+
+_executor: ProcessPoolExecutor | None = None
+_executor_lock = threading.Lock()
+
+
+def _init_worker() -> None:
+    from bot.services import db
+
+    # Лист CSV обходится одним соединением; XLSX читает все листы в потоках,
+    # и только тогда пул воркера дорастает до числа листов
+    db.DATABASE_POOL_MIN_SIZE = 1
+    db.DATABASE_POOL_MAX_SIZE = len(EXPORT_FORM_TYPES)
+
+
+def _get_executor() -> ProcessPoolExecutor:
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=EXPORT_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+                initializer=_init_worker,
+            )
+        return _executor
+
+
+def shutdown_executor() -> None:
+    global _executor
+    with _executor_lock:
+        if _executor is not None:
+            _executor.shutdown(wait=False, cancel_futures=True)
+            _executor = None
+
+
+def _fetch_sheet(form_type: str) -> list[dict]:
+    from bot.services.supabase_storage import get_forms_for_export
+
+    return get_forms_for_export(form_type)
+
+
+def _sheet_csv(form_type: str) -> bytes | None:
+    rows = _fetch_sheet(form_type)
+    if not rows:
+        return None
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=list(rows[0].keys()))
+    writer.writeheader()
+    writer.writerows(rows)
+    return buffer.getvalue().encode("utf-8")
+
+
+def _write_workbook(sheet_names: dict[str, str]) -> bytes:
+    import pandas as pd
+
+    with ThreadPoolExecutor(max_workers=len(EXPORT_FORM_TYPES)) as pool:
+        fetched = pool.map(_fetch_sheet, EXPORT_FORM_TYPES)
+        sheets = {
+            sheet_names.get(form_type, form_type): rows
+            for form_type, rows in zip(EXPORT_FORM_TYPES, fetched)
+            if rows
+        }
+
+    buffer = io.BytesIO()
+    with pd.ExcelWriter(buffer, engine="openpyxl") as writer:
+        for sheet_name, rows in sheets.items():
+            pd.DataFrame(rows).to_excel(writer, sheet_name=sheet_name[:31], index=False)
+        if not sheets:
+            pd.DataFrame([{"info": EMPTY_EXPORT_NOTE}]).to_excel(writer, sheet_name="export", index=False)
+    return buffer.getvalue()
+
+
+def _zip_files(files: dict[str, bytes]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zipf:
+        for name, content in files.items():
+            zipf.writestr(name, content)
+    return buffer.getvalue()
+
+
+async def build_xlsx(sheet_names: dict[str, str]) -> bytes:
+    """Workbook with one sheet per non-empty form type, named by sheet_names."""
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(_get_executor(), _write_workbook, sheet_names)
+
+
+async def build_csv_zip(sheet_names: dict[str, str]) -> bytes:
+    """Zip with <sheet name>.csv per non-empty form type."""
+    loop = asyncio.get_running_loop()
+    executor = _get_executor()
+    sheets = await asyncio.gather(
+        *(loop.run_in_executor(executor, _sheet_csv, form_type) for form_type in EXPORT_FORM_TYPES)
+    )
+    files = {
+        f"{sheet_names.get(form_type, form_type)}.csv": content
+        for form_type, content in zip(EXPORT_FORM_TYPES, sheets)
+        if content is not None
+    }
+    if not files:
+        files = {"export.csv": f"info\r\n{EMPTY_EXPORT_NOTE}\r\n".encode("utf-8")}
+    # zlib отпускает GIL, склейка в потоке не мешает циклу событий
+    return await asyncio.to_thread(_zip_files, files)
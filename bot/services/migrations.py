@@ -0,0 +1,258 @@
+"""Versioned schema migrations from database/supabase.
+
+Files named NNN_name.sql / NNN_name.py are applied in version order and
+recorded in bot.schema_migrations, so each runs once per database.
+
+* SQL migrations run in a single transaction. A file starting with
+  ``-- migrate:no-transaction`` is split into statements (on ``;`` at line
+  end, so no dollar-quoted bodies there) and run in autocommit, which
+  CREATE INDEX CONCURRENTLY requires.
+* Python migrations define ``upgrade(conn)`` and may set
+  ``TRANSACTIONAL = False`` to get an autocommit connection.
+
+Only one runner works at a time (session advisory lock), so the runner needs
+a session-mode or direct connection: MIGRATIONS_DATABASE_URL, else DATABASE_URL.
+"""
+import hashlib
+import importlib.util
+import logging
+import os
+import re
+import time
+from dataclasses import dataclass
+from pathlib import Path
+
+import psycopg
+
+from bot.services.supabase_storage import resolve_database_url
+
+
+MIGRATIONS_DIR = Path(__file__).resolve().parents[2] / "database" / "supabase"
+NO_TRANSACTION_MARKER = "-- migrate:no-transaction"
+
+_FILE_RE = re.compile(r"^(\d+)_([\w-]+)\.(sql|py)$")
+_CONCURRENT_INDEX_RE = re.compile(
+    r"create\s+(?:unique\s+)?index\s+concurrently\s+(?:if\s+not\s+exists\s+)?([\w.]+)\s+on\s+(?:only\s+)?([\w.]+)",
+    re.IGNORECASE,
+)
+
+
+@dataclass(frozen=True)
+class Migration:
+    version: int
+    name: str
+    path: Path
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.path.read_bytes()).hexdigest()
+
+    @property
+    def transactional(self) -> bool:
+        if self.path.suffix == ".sql":
+            return not self.path.read_text(encoding="utf-8").lstrip().startswith(NO_TRANSACTION_MARKER)
+        return getattr(self.load_module(), "TRANSACTIONAL", True)
+
+    def load_module(self):
+        spec = importlib.util.spec_from_file_location(f"migration_{self.version:03d}", self.path)
+        module = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(module)
+        return module
+
+
+def migrations_database_url() -> str | None:
+    return os.getenv("MIGRATIONS_DATABASE_URL") or resolve_database_url()
+
+
+def discover_migrations(directory: Path = MIGRATIONS_DIR) -> list[Migration]:
+    migrations = []
+    for path in directory.iterdir():
+        match = _FILE_RE.match(path.name)
+        if match:
+            migrations.append(Migration(int(match.group(1)), match.group(2), path))
+    migrations.sort(key=lambda migration: migration.version)
+
+    versions = [migration.version for migration in migrations]
+    duplicates = sorted({version for version in versions if versions.count(version) > 1})
+    if duplicates:
+        raise RuntimeError(f"Duplicate migration versions: {duplicates}")
+    return migrations
+
+
+def split_statements(sql: str) -> list[str]:
+    """Splits a no-transaction SQL file into statements (comments dropped)."""
+    statements = []
+    current = []
+    for line in sql.splitlines():
+        stripped = line.strip()
+        if not stripped or stripped.startswith("--"):
+            continue
+        current.append(line)
+        if stripped.endswith(";"):
+            statements.append("\n".join(current).rstrip().rstrip(";"))
+            current = []
+    if current:
+        statements.append("\n".join(current))
+    return statements
+
+
+def create_partitioned_index_concurrently(
+    conn: psycopg.Connection, name: str, table: str, definition: str
+) -> None:
+    """CREATE INDEX CONCURRENTLY for a partitioned table (Postgres cannot do it directly).
+
+    Creates an invalid index on the parent only, builds each partition's index
+    concurrently and attaches it; the parent becomes valid once all are attached.
+    Requires an autocommit connection. ``definition`` is e.g. ``(user_id, created_at desc, id desc)``.
+    """
+    schema = table.rpartition(".")[0] or "public"
+    conn.execute(f"create index if not exists {name} on only {table} {definition}")
+    partitions = conn.execute(
+        """
+        select c.relname
+        from pg_inherits i
+        join pg_class c on c.oid = i.inhrelid
+        where i.inhparent = %s::regclass
+        order by c.relname
+        """,
+        (table,),
+    ).fetchall()
+    for (partition,) in partitions:
+        child = f"{partition}_{name}"[:63]
+        _drop_invalid_index(conn, schema, child)
+        conn.execute(f"create index concurrently if not exists {child} on {schema}.{partition} {definition}")
+        attached = conn.execute(
+            """
+            select 1 from pg_inherits
+            where inhrelid = to_regclass(%s) and inhparent = to_regclass(%s)
+            """,
+            (f"{schema}.{child}", f"{schema}.{name}"),
+        ).fetchone()
+        if not attached:
+            conn.execute(f"alter index {schema}.{name} attach partition {schema}.{child}")
+
+
+def _drop_invalid_index(conn: psycopg.Connection, schema: str, name: str) -> None:
+    # Прерванный CREATE INDEX CONCURRENTLY оставляет невалидный индекс, и "if not exists" его бы пропустил
+    row = conn.execute(
+        "select not indisvalid from pg_index where indexrelid = to_regclass(%s)",
+        (f"{schema}.{name}",),
+    ).fetchone()
+    if row and row[0]:
+        logging.warning(f"Dropping invalid index {schema}.{name} left by an interrupted build")
+        conn.execute(f"drop index concurrently if exists {schema}.{name}")
+
+
+def _ensure_migrations_table(conn: psycopg.Connection) -> None:
+    conn.execute("create schema if not exists bot")
+    conn.execute(
+        """
+        create table if not exists bot.schema_migrations (
+          version integer primary key,
+          name text not null,
+          checksum text not null,
+          applied_at timestamptz not null default now(),
+          duration_ms integer
+        )
+        """
+    )
+
+
+def _applied(conn: psycopg.Connection) -> dict[int, str]:
+    rows = conn.execute("select version, checksum from bot.schema_migrations").fetchall()
+    return {version: checksum for version, checksum in rows}
+
+
+def _record(conn: psycopg.Connection, migration: Migration, duration_ms: int | None) -> None:
+    conn.execute(
+        """
+        insert into bot.schema_migrations (version, name, checksum, duration_ms)
+        values (%s, %s, %s, %s)
+        on conflict (version) do update set
+          name = excluded.name, checksum = excluded.checksum,
+          applied_at = now(), duration_ms = excluded.duration_ms
+        """,
+        (migration.version, migration.name, migration.checksum, duration_ms),
+    )
+
+
+def _apply(conn: psycopg.Connection, migration: Migration) -> None:
+    if migration.path.suffix == ".py":
+        module = migration.load_module()
+        if migration.transactional:
+            with conn.transaction():
+                module.upgrade(conn)
+                _record(conn, migration, None)
+        else:
+            module.upgrade(conn)
+        return
+
+    sql = migration.path.read_text(encoding="utf-8")
+    if migration.transactional:
+        with conn.transaction():
+            conn.execute(sql)
+            _record(conn, migration, None)
+        return
+
+    for statement in split_statements(sql):
+        for name, table in _CONCURRENT_INDEX_RE.findall(statement):
+            schema, _, index = name.rpartition(".")
+            # Индекс создаётся в схеме таблицы, если имя не квалифицировано
+            schema = schema or table.rpartition(".")[0] or "public"
+            _drop_invalid_index(conn, schema, index)
+        conn.execute(statement)
+
+
+def pending_migrations(conn: psycopg.Connection, migrations: list[Migration] | None = None) -> list[Migration]:
+    _ensure_migrations_table(conn)
+    applied = _applied(conn)
+    result = []
+    for migration in migrations if migrations is not None else discover_migrations():
+        if migration.version not in applied:
+            result.append(migration)
+        elif applied[migration.version] != migration.checksum:
+            logging.warning(f"Migration {migration.path.name} changed after it was applied")
+    return result
+
+
+def run_migrations(
+    database_url: str | None = None,
+    target: int | None = None,
+    baseline: int | None = None,
+    dry_run: bool = False,
+) -> list[str]:
+    """Applies pending migrations up to target; returns the applied file names.
+
+    baseline marks migrations up to that version as applied without running
+    them (for databases where they were applied by hand with psql).
+    """
+    database_url = database_url or migrations_database_url()
+    if not database_url:
+        raise RuntimeError("Supabase/Postgres is not configured. Set MIGRATIONS_DATABASE_URL or DATABASE_URL.")
+
+    applied_names = []
+    with psycopg.connect(database_url, autocommit=True, prepare_threshold=None) as conn:
+        conn.execute("select pg_advisory_lock(hashtext('bot.schema_migrations'))")
+        try:
+            for migration in pending_migrations(conn):
+                if target is not None and migration.version > target:
+                    break
+                if baseline is not None and migration.version <= baseline:
+                    if not dry_run:
+                        _record(conn, migration, None)
+                    logging.info(f"Migration {migration.path.name} marked as applied (baseline)")
+                    continue
+                if dry_run:
+                    applied_names.append(migration.path.name)
+                    continue
+
+                started = time.perf_counter()
+                logging.info(f"Applying migration {migration.path.name}")
+                _apply(conn, migration)
+                duration_ms = round((time.perf_counter() - started) * 1000)
+                _record(conn, migration, duration_ms)
+                logging.info(f"Migration {migration.path.name} applied in {duration_ms} ms")
+                applied_names.append(migration.path.name)
+        finally:
+            conn.execute("select pg_advisory_unlock(hashtext('bot.schema_migrations'))")
+    return applied_names
@@ -0,0 +1,221 @@
+"""Queued notification delivery for the bot.
+
+Handlers enqueue a notification and return at once. Worker tasks send it:
+
+* several recipients are served concurrently (NOTIFY_WORKERS), while sends
+  are paced globally to NOTIFY_RATE_PER_SECOND (Telegram allows ~30/s);
+* messages to one chat are sent in the order they were enqueued;
+* a notification with a dedup_key is sent to a chat only once within
+  NOTIFY_DEDUP_SECONDS (e.g. a daily reminder re-run after a restart);
+* RetryAfter, timeouts and network errors are retried with backoff up to
+  NOTIFY_MAX_ATTEMPTS; BadRequest and Forbidden (bot blocked) are final.
+
+Every notification keeps its delivery status; counters and recent failures
+are reported by metrics().
+"""
+import asyncio
+import logging
+import os
+import time
+from collections import Counter, deque
+from contextlib import asynccontextmanager
+from dataclasses import dataclass, field
+from typing import Iterable
+
+from telegram.error import BadRequest, Forbidden, NetworkError, RetryAfter, TimedOut
+
+
+NOTIFY_WORKERS = int(os.getenv("NOTIFY_WORKERS", "8"))
+NOTIFY_RATE_PER_SECOND = float(os.getenv("NOTIFY_RATE_PER_SECOND", "25"))
+NOTIFY_MAX_ATTEMPTS = int(os.getenv("NOTIFY_MAX_ATTEMPTS", "4"))
+NOTIFY_DEDUP_SECONDS = int(os.getenv("NOTIFY_DEDUP_SECONDS", "600"))
+NOTIFY_HISTORY_SIZE = 200
+
+QUEUED = "queued"
+SENT = "sent"
+FAILED = "failed"
+DUPLICATE = "duplicate"
+
+
+@dataclass
+class Notification:
+    chat_id: int
+    text: str
+    reply_markup: object = None
+    kind: str = "message"
+    dedup_key: str | None = None
+    status: str = QUEUED
+    attempts: int = 0
+    error: str | None = None
+    message_id: int | None = None
+    created_at: float = field(default_factory=time.monotonic)
+    finished_at: float | None = None
+
+
+class NotificationDispatcher:
+    def __init__(self, bot, workers: int = NOTIFY_WORKERS, rate_per_second: float = NOTIFY_RATE_PER_SECOND):
+        self.bot = bot
+        self.workers = workers
+        self._interval = 1 / rate_per_second if rate_per_second > 0 else 0.0
+        self._queue: asyncio.Queue[Notification] = asyncio.Queue()
+        self._tasks: list[asyncio.Task] = []
+        self._next_send = 0.0
+        self._chat_locks: dict[int, list] = {}
+        self._recent: dict[tuple[int, str], tuple[float, Notification]] = {}
+        self._counts: Counter = Counter()
+        self._history: deque[Notification] = deque(maxlen=NOTIFY_HISTORY_SIZE)
+        self._latency_s = 0.0
+
+    def enqueue(self, chat_ids: int | Iterable[int], text: str, reply_markup=None, kind: str = "message",
+                dedup_key: str | None = None) -> list[Notification]:
+        """Queues one notification per chat and returns them (status updates in place)."""
+        self._start()
+        if isinstance(chat_ids, int):
+            chat_ids = [chat_ids]
+        now = time.monotonic()
+        self._forget_expired(now)
+
+        notifications = []
+        for chat_id in chat_ids:
+            notification = Notification(chat_id, text, reply_markup, kind, dedup_key)
+            notifications.append(notification)
+            if dedup_key is not None:
+                previous = self._recent.get((chat_id, dedup_key))
+                if previous and previous[1].status != FAILED:
+                    notification.status = DUPLICATE
+                    notification.finished_at = now
+                    self._counts[DUPLICATE] += 1
+                    continue
+                self._recent[(chat_id, dedup_key)] = (now + NOTIFY_DEDUP_SECONDS, notification)
+            self._counts[QUEUED] += 1
+            self._queue.put_nowait(notification)
+        return notifications
+
+    async def close(self, timeout: float = 10.0) -> None:
+        """Waits up to timeout for queued notifications, then stops the workers."""
+        if self._tasks:
+            try:
+                await asyncio.wait_for(self._queue.join(), timeout)
+            except asyncio.TimeoutError:
+                logging.warning(f"Stopping notifications with {self._queue.qsize()} undelivered")
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks = []
+
+    def metrics(self) -> dict:
+        sent = self._counts[SENT]
+        return {
+            "queued": self._queue.qsize(),
+            "enqueued": self._counts[QUEUED],
+            "sent": sent,
+            "failed": self._counts[FAILED],
+            "duplicates": self._counts[DUPLICATE],
+            "retries": self._counts["retries"],
+            "mean_delivery_ms": round(self._latency_s / sent * 1000) if sent else None,
+            "recent_failures": [
+                {"chat_id": n.chat_id, "kind": n.kind, "attempts": n.attempts, "error": n.error}
+                for n in self._history
+                if n.status == FAILED
+            ][-5:],
+        }
+
+    def _start(self) -> None:
+        if not self._tasks:
+            self._tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    def _forget_expired(self, now: float) -> None:
+        expired = [key for key, (expires_at, _) in self._recent.items() if expires_at <= now]
+        for key in expired:
+            del self._recent[key]
+
+    async def _worker(self) -> None:
+        while True:
+            notification = await self._queue.get()
+            try:
+                # Между get() и захватом замка нет await, так что чат получает сообщения по порядку
+                async with self._chat_lock(notification.chat_id):
+                    await self._deliver(notification)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self._finish(notification, FAILED, f"{type(e).__name__}: {e}")
+            finally:
+                self._queue.task_done()
+
+    @asynccontextmanager
+    async def _chat_lock(self, chat_id: int):
+        entry = self._chat_locks.setdefault(chat_id, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if not entry[1]:
+                self._chat_locks.pop(chat_id, None)
+
+    async def _pace(self) -> None:
+        now = time.monotonic()
+        start = max(now, self._next_send)
+        self._next_send = start + self._interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    async def _deliver(self, notification: Notification) -> None:
+        delay = 1.0
+        while True:
+            notification.attempts += 1
+            await self._pace()
+            try:
+                message = await self.bot.send_message(
+                    chat_id=notification.chat_id,
+                    text=notification.text,
+                    reply_markup=notification.reply_markup,
+                )
+            except RetryAfter as e:
+                error, wait = f"RetryAfter: {e.retry_after}", float(e.retry_after)
+            except (BadRequest, Forbidden) as e:
+                self._finish(notification, FAILED, f"{type(e).__name__}: {e}")
+                return
+            except (TimedOut, NetworkError) as e:
+                error, wait = f"{type(e).__name__}: {e}", delay
+                delay *= 2
+            else:
+                notification.message_id = message.message_id
+                self._finish(notification, SENT)
+                return
+
+            if notification.attempts >= NOTIFY_MAX_ATTEMPTS:
+                self._finish(notification, FAILED, error)
+                return
+            self._counts["retries"] += 1
+            await asyncio.sleep(wait)
+
+    def _finish(self, notification: Notification, status: str, error: str | None = None) -> None:
+        notification.status = status
+        notification.error = error
+        notification.finished_at = time.monotonic()
+        self._counts[status] += 1
+        self._history.append(notification)
+        if status == SENT:
+            self._latency_s += notification.finished_at - notification.created_at
+        else:
+            logging.error(
+                f"Notification {notification.kind} to {notification.chat_id} failed "
+                f"after {notification.attempts} attempts: {error}"
+            )
+
+
+def get_dispatcher(application) -> NotificationDispatcher:
+    """The application's dispatcher (bot_data['notifications']), created on first use."""
+    dispatcher = application.bot_data.get("notifications")
+    if dispatcher is None:
+        dispatcher = application.bot_data["notifications"] = NotificationDispatcher(application.bot)
+    return dispatcher
+
+
+def notify(application, chat_ids: int | Iterable[int], text: str, reply_markup=None, kind: str = "message",
+           dedup_key: str | None = None) -> list[Notification]:
+    """Queues a message to each chat; returns immediately."""
+    return get_dispatcher(application).enqueue(chat_ids, text, reply_markup, kind, dedup_key)
@@ -0,0 +1,63 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from bot.services import cache_events
+from bot.services.supabase_storage import list_recent_contracts
+
+
+# Сколько последних договоров предлагать кнопками
+RECENT_CONTRACTS_LIMIT = int(os.getenv("RECENT_CONTRACTS_LIMIT", "6"))
+RECENT_CONTRACTS_CACHE_TTL = int(os.getenv("RECENT_CONTRACTS_CACHE_TTL", "600"))
+# Ограничение на число пользователей в кеше
+RECENT_CONTRACTS_CACHE_SIZE = 1000
+
+_lock = threading.Lock()
+_cache: "OrderedDict[int, tuple[float, list[str]]]" = OrderedDict()
+
+
+def get_recent_contracts(user_id: int) -> list[str]:
+    """Returns the user's most recent distinct contract numbers, newest first."""
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(user_id)
+        if cached and now - cached[0] < cache_events.cache_ttl(RECENT_CONTRACTS_CACHE_TTL):
+            _cache.move_to_end(user_id)
+            return list(cached[1])
+
+    try:
+        contracts = list_recent_contracts(user_id, RECENT_CONTRACTS_LIMIT)
+    except Exception as e:
+        logging.error(f"Failed to load recent contracts for {user_id}: {e}")
+        return list(cached[1]) if cached else []
+
+    _store(user_id, contracts, now)
+    return list(contracts)
+
+
+def _store(user_id: int, contracts: list[str], loaded_at: float) -> None:
+    with _lock:
+        _cache[user_id] = (loaded_at, contracts)
+        _cache.move_to_end(user_id)
+        while len(_cache) > RECENT_CONTRACTS_CACHE_SIZE:
+            _cache.popitem(last=False)
+
+
+def forget_recent_contracts(user_id: int | None = None) -> None:
+    """Evicts one user (or everyone when user_id is None).
+
+    Called after a form is saved and by the user_recent_contracts NOTIFY; the
+    list is rebuilt from the trigger-maintained table on the next request.
+    """
+    with _lock:
+        if user_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(user_id, None)
+
+
+cache_events.subscribe(
+    "user_recent_contracts", lambda key: forget_recent_contracts(int(key) if key is not None else None)
+)
@@ -0,0 +1,167 @@
+"""In-process periodic job scheduler.
+
+Each job runs every ``every`` seconds, aligned to the wall clock (slots start
+at multiples of ``every`` plus ``offset`` from the Unix epoch, UTC), with a
+random delay of up to ``jitter`` seconds so replicas do not wake in lockstep.
+
+Exclusive jobs run on one replica per slot. The runner takes
+pg_try_advisory_xact_lock for the job on its own connection, skips the slot if
+bot.scheduled_jobs shows it has already been run, and records the result in
+the same transaction. Transaction-scoped locks also work through the
+transaction pooler. Local jobs (in-memory state of this process) run on
+every replica without the lock.
+"""
+import asyncio
+import logging
+import os
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from typing import Awaitable, Callable
+
+import psycopg
+
+from bot.services import db
+
+
+@dataclass
+class Job:
+    name: str
+    func: Callable[[], Awaitable[str | None]]
+    every: int
+    offset: int = 0
+    jitter: int = 0
+    exclusive: bool = True
+    runs: int = field(default=0, init=False)
+    failures: int = field(default=0, init=False)
+    skipped: int = field(default=0, init=False)
+    last_started_at: datetime | None = field(default=None, init=False)
+    last_duration_ms: int | None = field(default=None, init=False)
+    max_duration_ms: int = field(default=0, init=False)
+    total_duration_s: float = field(default=0.0, init=False)
+    last_result: str | None = field(default=None, init=False)
+    last_error: str | None = field(default=None, init=False)
+
+    def slot_start(self, now: float) -> float:
+        return (now - self.offset) // self.every * self.every + self.offset
+
+    def next_run(self, now: float) -> float:
+        return self.slot_start(now) + self.every + random.uniform(0, self.jitter)
+
+    def metrics(self) -> dict:
+        return {
+            "every_s": self.every,
+            "exclusive": self.exclusive,
+            "runs": self.runs,
+            "failures": self.failures,
+            "skipped": self.skipped,
+            "last_started_at": self.last_started_at.isoformat() if self.last_started_at else None,
+            "last_duration_ms": self.last_duration_ms,
+            "max_duration_ms": self.max_duration_ms,
+            "mean_duration_ms": round(self.total_duration_s / self.runs * 1000) if self.runs else None,
+            "last_result": self.last_result,
+            "last_error": self.last_error,
+        }
+
+
+def scheduler_database_url() -> str | None:
+    return os.getenv("DATABASE_SESSION_URL") or db.resolve_database_url()
+
+
+class Scheduler:
+    def __init__(self, jobs: list[Job]):
+        self.jobs = {job.name: job for job in jobs}
+
+    async def run(self) -> None:
+        """Runs all jobs until cancelled."""
+        if not self.jobs:
+            return
+        logging.info(f"Scheduler started: {', '.join(self.jobs)}")
+        await asyncio.gather(*(self._loop(job) for job in self.jobs.values()))
+
+    def metrics(self) -> dict[str, dict]:
+        return {name: job.metrics() for name, job in self.jobs.items()}
+
+    async def _loop(self, job: Job) -> None:
+        while True:
+            now = time.time()
+            await asyncio.sleep(max(0.0, job.next_run(now) - now))
+            slot = datetime.fromtimestamp(job.slot_start(time.time()), timezone.utc)
+            try:
+                if job.exclusive:
+                    await self._run_exclusive(job, slot)
+                else:
+                    await self._run(job)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                # Ошибка блокировки/журнала — сама задача уже учтена в _run
+                logging.error(f"Scheduler failed to run job {job.name}: {e}")
+
+    async def _run(self, job: Job) -> tuple[str, str | None, int]:
+        job.last_started_at = datetime.now(timezone.utc)
+        started = time.perf_counter()
+        try:
+            result = await job.func()
+            status = "ok"
+            job.last_result, job.last_error = result, None
+        except Exception as e:
+            result = f"{type(e).__name__}: {e}"
+            status = "failed"
+            job.failures += 1
+            job.last_error = result
+            logging.error(f"Job {job.name} failed: {result}")
+        duration_ms = round((time.perf_counter() - started) * 1000)
+        job.runs += 1
+        job.last_duration_ms = duration_ms
+        job.max_duration_ms = max(job.max_duration_ms, duration_ms)
+        job.total_duration_s += duration_ms / 1000
+        logging.info(f"Job {job.name} {status} in {duration_ms} ms{f': {result}' if result else ''}")
+        return status, result, duration_ms
+
+    async def _run_exclusive(self, job: Job, slot: datetime) -> None:
+        url = scheduler_database_url()
+        if not url:
+            raise RuntimeError("Supabase/Postgres is not configured")
+
+        async with await psycopg.AsyncConnection.connect(url, autocommit=True, prepare_threshold=None) as conn:
+            async with conn.transaction():
+                cur = await conn.execute("select pg_try_advisory_xact_lock(hashtext(%s))", (f"bot.job:{job.name}",))
+                if not (await cur.fetchone())[0]:
+                    job.skipped += 1
+                    return
+                cur = await conn.execute("select last_slot from bot.scheduled_jobs where name = %s", (job.name,))
+                row = await cur.fetchone()
+                if row and row[0] >= slot:
+                    # Этот слот уже отработала другая реплика
+                    job.skipped += 1
+                    return
+
+                status, result, duration_ms = await self._run(job)
+                await conn.execute(
+                    """
+                    insert into bot.scheduled_jobs (
+                      name, last_slot, last_started_at, last_duration_ms, last_status, last_result,
+                      runs, failures, updated_at
+                    ) values (%s, %s, %s, %s, %s, %s, 1, %s, now())
+                    on conflict (name) do update set
+                      last_slot = excluded.last_slot,
+                      last_started_at = excluded.last_started_at,
+                      last_duration_ms = excluded.last_duration_ms,
+                      last_status = excluded.last_status,
+                      last_result = excluded.last_result,
+                      runs = bot.scheduled_jobs.runs + 1,
+                      failures = bot.scheduled_jobs.failures + excluded.failures,
+                      updated_at = now()
+                    """,
+                    (
+                        job.name,
+                        slot,
+                        job.last_started_at,
+                        duration_ms,
+                        status,
+                        (result or "")[:1000] or None,
+                        1 if status == "failed" else 0,
+                    ),
+                )
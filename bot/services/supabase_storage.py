@@ -1,10 +1,12 @@
-import os
-from datetime import datetime, timezone
+from datetime import date, datetime, timezone
 
 import psycopg
 from psycopg.rows import dict_row
 from psycopg.types.json import Jsonb
 
+from bot.services import db
+from bot.services.db import resolve_database_url  # noqa: F401 (used by scripts and migrations)
+
 
 FORM_TYPES = {"delivery", "refund", "painting", "checkin"}
 
@@ -24,53 +26,32 @@ APP_FIELD_TO_COLUMN = {
 }
 
 
-def _strip_host_scheme(value: str | None) -> str:
-    """Убирает https:// и http:// из хоста, чтобы не ломать парсинг postgres URL."""
-    if not value:
-        return value or ""
-    s = value.strip()
-    for prefix in ("https://", "http://"):
-        if s.lower().startswith(prefix):
-            return s[len(prefix) :].strip()
-    return s
-
-
-def resolve_database_url() -> str | None:
-    database_url = os.getenv("DATABASE_URL")
-    if database_url:
-        # Если в URL хост указан как https://... — убрать схему, иначе resolve host "https"
-        if "@https://" in database_url or "@http://" in database_url:
-            database_url = database_url.replace("@https://", "@").replace("@http://", "@")
-        return database_url
-
-    supabase_host = _strip_host_scheme(os.getenv("SUPABASE_HOST"))
-    postgres_password = os.getenv("POSTGRES_PASSWORD")
-    if supabase_host and postgres_password:
-        db = os.getenv("POSTGRES_DB", "postgres")
-        tenant = os.getenv("POOLER_TENANT_ID")
-        base_user = os.getenv("POSTGRES_USER", "postgres")
-        user = f"{base_user}.{tenant}" if tenant else base_user
-        port = os.getenv("POOLER_PROXY_PORT_TRANSACTION", "6543")
-        return f"postgresql://{user}:{postgres_password}@{supabase_host}:{port}/{db}"
-
-    host = _strip_host_scheme(os.getenv("SUPABASE_DB_HOST"))
-    port = os.getenv("SUPABASE_DB_PORT", "5432")
-    db = os.getenv("SUPABASE_DB_NAME", "postgres")
-    user = os.getenv("SUPABASE_DB_USER", "postgres")
-    password = os.getenv("SUPABASE_DB_PASSWORD")
-    if host and password:
-        return f"postgresql://{user}:{password}@{host}:{port}/{db}"
+# Поля заявки дублируются в payload под старыми именами из JSON-хранилища
+APP_FIELD_PAYLOAD_ALIASES = {
+    "contract": ("contract_number", "num_contract"),
+    "text": ("form_text",),
+    "date_checkin": ("checkin_date", "date"),
+    "brigadier_name": ("brig_name", "name_brig"),
+    "brigadier_phone": ("brig_phone", "phone_brig"),
+    "carrying": ("carring",),
+}
 
-    return None
+USER_TEXT_COLUMNS = ("username", "fullname", "phone", "position", "department")
+USER_FLAG_COLUMNS = ("approved", "admin")
 
 
+def _connect():
+    return db.connection()
 
 
-def _connect():
-    database_url = resolve_database_url()
-    if not database_url:
-        raise RuntimeError("Supabase/Postgres is not configured. Set DATABASE_URL or SUPABASE variables.")
-    return psycopg.connect(database_url, prepare_threshold=None)
+def _connect_read(user_id: int | None = None):
+    """Read-only queries: the replica from DATABASE_READ_URL unless the user has just written."""
+    return db.read_connection(user_id)
+
+
+def _execute(cur, name: str, sql: str, params=None):
+    """Named query from the registry in bot.services.db (prepared where the connection allows it)."""
+    return db.execute(cur, name, sql, params)
 
 
 def _normalize_form_type(form_type: str | None) -> str:
@@ -183,7 +164,7 @@ def upsert_user(user_data: dict) -> bool:
 
     with _connect() as conn:
         with conn.cursor() as cur:
-            cur.execute(
+            _execute(cur, "upsert_user",
                 """
                 insert into bot.users (
                   user_id, username, fullname, phone, position, department,
@@ -213,143 +194,209 @@ def upsert_user(user_data: dict) -> bool:
                 ),
             )
         conn.commit()
+    db.note_write(user_id)
     return True
 
 
 def get_user_by_id(user_id: int) -> dict | None:
     with _connect() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute("select * from bot.users where user_id = %s", (_to_int(user_id),))
+            _execute(cur, "get_user_by_id", "select * from bot.users where user_id = %s", (_to_int(user_id),))
             row = cur.fetchone()
     return _row_to_user(row) if row else None
 
 
 def list_users() -> list[dict]:
-    with _connect() as conn:
+    with _connect_read() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute("select * from bot.users order by created_at, user_id")
+            _execute(cur, "list_users", "select * from bot.users order by created_at, user_id")
             rows = cur.fetchall()
     return [_row_to_user(row) for row in rows]
 
 
 def update_user_fields(user_id: int, new_data: dict) -> bool:
-    existing = get_user_by_id(user_id)
-    if not existing:
-        return False
-    merged = existing.copy()
-    merged.update(new_data or {})
-    return upsert_user(merged)
+    """Patches the given columns and merges new_data into payload in one statement."""
+    new_data = dict(new_data or {})
+    new_data.pop("user_id", None)
+    if not new_data:
+        return get_user_by_id(user_id) is not None
+
+    columns = {column: new_data[column] for column in USER_TEXT_COLUMNS if column in new_data}
+    columns.update({column: bool(new_data[column]) for column in USER_FLAG_COLUMNS if column in new_data})
+
+    assignments = "".join(f"{column} = %s, " for column in columns)
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                f"""
+                update bot.users
+                set {assignments}payload = payload || %s, updated_at = now()
+                where user_id = %s
+                returning user_id
+                """,
+                (*columns.values(), Jsonb(new_data), _to_int(user_id)),
+            )
+            updated = cur.fetchone() is not None
+        conn.commit()
+    db.note_write(_to_int(user_id))
+    return updated
 
 
 def delete_user(user_id: int) -> bool:
     with _connect() as conn:
         with conn.cursor() as cur:
-            cur.execute("delete from bot.users where user_id = %s", (_to_int(user_id),))
+            _execute(cur, "delete_user", "delete from bot.users where user_id = %s", (_to_int(user_id),))
             deleted = cur.rowcount > 0
         conn.commit()
+    db.note_write(_to_int(user_id))
     return deleted
 
 
 def is_user_registered(user_id: int) -> bool:
     with _connect() as conn:
         with conn.cursor() as cur:
-            cur.execute("select approved from bot.users where user_id = %s", (_to_int(user_id),))
+            _execute(
+                cur, "is_user_registered", "select approved from bot.users where user_id = %s", (_to_int(user_id),)
+            )
             row = cur.fetchone()
     return bool(row and row[0])
 
 
+def get_user_flags(user_id: int) -> dict | None:
+    """approved/admin flags of the user, or None if there is no such user."""
+    with _connect() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            _execute(
+                cur, "get_user_flags", "select approved, admin from bot.users where user_id = %s", (_to_int(user_id),)
+            )
+            row = cur.fetchone()
+    return {"approved": bool(row["approved"]), "admin": bool(row["admin"])} if row else None
+
+
 def is_user_admin(user_id: int) -> bool:
     with _connect() as conn:
         with conn.cursor() as cur:
-            cur.execute("select admin from bot.users where user_id = %s", (_to_int(user_id),))
+            _execute(cur, "is_user_admin", "select admin from bot.users where user_id = %s", (_to_int(user_id),))
             row = cur.fetchone()
     return bool(row and row[0])
 
 
 def get_admin_username(admin_ids: list[int] | None = None) -> str | None:
+    """Username of a listed admin id, falling back to any admin, in one query."""
     admin_ids = [int(x) for x in (admin_ids or [])]
     with _connect() as conn:
         with conn.cursor() as cur:
-            if admin_ids:
-                cur.execute(
-                    """
-                    select username
-                    from bot.users
-                    where user_id = any(%s)
-                      and username is not null
-                      and username <> ''
-                    order by admin desc, approved desc, updated_at desc
-                    limit 1
-                    """,
-                    (admin_ids,),
-                )
-                row = cur.fetchone()
-                if row and row[0]:
-                    return row[0]
-
-            cur.execute(
+            _execute(cur, "get_admin_username",
                 """
                 select username
                 from bot.users
-                where admin = true
+                where (user_id = any(%(admin_ids)s::bigint[]) or admin = true)
                   and username is not null
                   and username <> ''
-                order by updated_at desc
+                order by user_id = any(%(admin_ids)s::bigint[]) desc, admin desc, approved desc, updated_at desc
                 limit 1
-                """
+                """,
+                {"admin_ids": admin_ids},
             )
             row = cur.fetchone()
     return row[0] if row and row[0] else None
 
 
 def get_user_settings_from_supabase(user_id: int) -> dict:
+    """Settings of the user; a missing row is created with defaults by the same query."""
     user_id = _to_int(user_id)
+    default_payload = {"auto_numbering": False}
     with _connect() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(
-                "select auto_numbering, payload from bot.user_settings where user_id = %s",
-                (user_id,),
+            _execute(cur, "get_user_settings",
+                """
+                with existing as (
+                  select auto_numbering, payload from bot.user_settings where user_id = %(user_id)s
+                ),
+                inserted as (
+                  insert into bot.user_settings (user_id, auto_numbering, payload, updated_at)
+                  select %(user_id)s, false, %(payload)s, now()
+                  where not exists (select 1 from existing)
+                  on conflict (user_id) do nothing
+                  returning auto_numbering, payload
+                )
+                select auto_numbering, payload from existing
+                union all
+                select auto_numbering, payload from inserted
+                """,
+                {"user_id": user_id, "payload": Jsonb(default_payload)},
             )
             row = cur.fetchone()
-            if not row:
-                default_payload = {"auto_numbering": False}
-                cur.execute(
-                    """
-                    insert into bot.user_settings (user_id, auto_numbering, payload, updated_at)
-                    values (%s, %s, %s, now())
-                    on conflict (user_id) do nothing
-                    """,
-                    (user_id, False, Jsonb(default_payload)),
-                )
-                conn.commit()
-                return default_payload
 
+    if not row:
+        # Строку параллельно создал другой запрос
+        return default_payload
     payload = _to_payload_dict(row.get("payload")).copy()
     payload["auto_numbering"] = bool(row.get("auto_numbering", False))
     return payload
 
 
+def get_user_profile(user_id: int) -> dict:
+    """Loads user fields, flags and settings in one query.
+
+    Works for ids without a users/user_settings row (e.g. admins from ADMIN_IDS):
+    user fields are empty and settings fall back to defaults. "version" changes
+    whenever either row is updated.
+    """
+    with _connect() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            _execute(cur, "get_user_profile",
+                """
+                select k.user_id, u.username, u.fullname, u.phone, u.position, u.department,
+                       coalesce(u.approved, false) as approved,
+                       coalesce(u.admin, false) as admin,
+                       u.payload,
+                       u.user_id is not null as exists,
+                       coalesce(s.auto_numbering, false) as auto_numbering,
+                       s.payload as settings_payload,
+                       coalesce(u.version, 0) + coalesce(s.version, 0) as version
+                from (select %s::bigint as user_id) k
+                left join bot.users u on u.user_id = k.user_id
+                left join bot.user_settings s on s.user_id = k.user_id
+                """,
+                (_to_int(user_id),),
+            )
+            row = cur.fetchone()
+
+    settings = _to_payload_dict(row.get("settings_payload")).copy()
+    settings["auto_numbering"] = bool(row["auto_numbering"])
+    profile = _row_to_user(row)
+    profile.update({"exists": row["exists"], "settings": settings, "version": row["version"]})
+    return profile
+
+
 def update_user_settings_in_supabase(user_id: int, new_settings: dict) -> bool:
-    user_id = _to_int(user_id)
-    existing = get_user_settings_from_supabase(user_id)
-    merged = existing.copy()
-    merged.update(new_settings or {})
-    auto_numbering = bool(merged.get("auto_numbering", False))
+    """Merges new_settings into the stored settings with a single upsert."""
+    new_settings = dict(new_settings or {})
+    auto_numbering = bool(new_settings["auto_numbering"]) if "auto_numbering" in new_settings else None
+    if auto_numbering is not None:
+        new_settings["auto_numbering"] = auto_numbering
 
     with _connect() as conn:
         with conn.cursor() as cur:
-            cur.execute(
+            _execute(cur, "update_user_settings",
                 """
                 insert into bot.user_settings (user_id, auto_numbering, payload, updated_at)
-                values (%s, %s, %s, now())
+                values (%(user_id)s, coalesce(%(auto_numbering)s::boolean, false), %(insert_payload)s, now())
                 on conflict (user_id) do update set
-                  auto_numbering = excluded.auto_numbering,
-                  payload = excluded.payload,
+                  auto_numbering = coalesce(%(auto_numbering)s::boolean, bot.user_settings.auto_numbering),
+                  payload = bot.user_settings.payload || %(patch)s,
                   updated_at = now()
                 """,
-                (user_id, auto_numbering, Jsonb(merged)),
+                {
+                    "user_id": _to_int(user_id),
+                    "auto_numbering": auto_numbering,
+                    "insert_payload": Jsonb({"auto_numbering": False, **new_settings}),
+                    "patch": Jsonb(new_settings),
+                },
             )
         conn.commit()
+    db.note_write(_to_int(user_id))
     return True
 
 
@@ -360,14 +407,71 @@ def get_next_form_number(application_type: str) -> int:
 
     with _connect() as conn:
         with conn.cursor() as cur:
-            cur.execute(
-                "select coalesce(max(form_number), 0) + 1 from bot.forms where application_type = %s",
+            _execute(cur, "get_next_form_number",
+                "select coalesce(max(form_number), 0) + 1 from bot.form_keys where application_type = %s",
                 (form_type,),
             )
             row = cur.fetchone()
     return int(row[0] if row else 1)
 
 
+# bot.forms is partitioned by month, so uniqueness of (type, number) lives in
+# bot.form_keys: update the existing form (hot or archived) if the key is taken,
+# insert otherwise.
+SAVE_FORM_SQL = """
+with key as (
+  select form_id, created_at
+  from bot.form_keys
+  where application_type = %(application_type)s and form_number = %(form_number)s
+), updated as (
+  update bot.forms f set
+    user_id = %(user_id)s,
+    creator_fullname = %(creator_fullname)s,
+    contract_number = %(contract_number)s,
+    form_text = %(form_text)s,
+    checkin_date = %(checkin_date)s,
+    brig_name = %(brig_name)s,
+    brig_phone = %(brig_phone)s,
+    carring = %(carring)s,
+    created_at = coalesce(%(created_at)s, f.created_at),
+    payload = %(payload)s
+  from key
+  where f.id = key.form_id and f.created_at = key.created_at
+  returning f.id
+), archived as (
+  -- Форма в перенесённом в архив месяце; дата не меняется, партиции архива закрыты
+  update bot_archive.forms f set
+    user_id = %(user_id)s,
+    creator_fullname = %(creator_fullname)s,
+    contract_number = %(contract_number)s,
+    form_text = %(form_text)s,
+    checkin_date = %(checkin_date)s,
+    brig_name = %(brig_name)s,
+    brig_phone = %(brig_phone)s,
+    carring = %(carring)s,
+    payload = %(payload)s
+  from key
+  where f.id = key.form_id and f.created_at = key.created_at
+  returning f.id
+)
+insert into bot.forms (
+  application_type, form_number, user_id, creator_fullname,
+  contract_number, form_text, checkin_date, brig_name, brig_phone, carring,
+  created_at, payload
+)
+select %(application_type)s::text, %(form_number)s::bigint, %(user_id)s::bigint, %(creator_fullname)s::text,
+       %(contract_number)s::text, %(form_text)s::text, %(checkin_date)s::text, %(brig_name)s::text,
+       %(brig_phone)s::text, %(carring)s::text, coalesce(%(created_at)s::timestamptz, now()), %(payload)s::jsonb
+where not exists (select 1 from key)
+"""
+
+# Pins a lookup by id to the partition holding the form (run-time pruning)
+FORM_ID_FILTER = "id = %(id)s and created_at = (select created_at from bot.form_keys where form_id = %(id)s)"
+
+# Hot table first, then the archive: admins open archived forms through bot.forms_all
+FORM_TABLES = ("bot.forms", "bot_archive.forms")
+
+
 def save_form_to_supabase(form_data: dict) -> None:
     application_type = _normalize_form_type(form_data.get("type"))
     if application_type not in FORM_TYPES:
@@ -396,56 +500,85 @@ def save_form_to_supabase(form_data: dict) -> None:
         brig_phone = None
         carring = None
 
+    params = {
+        "application_type": application_type,
+        "form_number": form_number,
+        "user_id": user_id,
+        "creator_fullname": creator_fullname,
+        "contract_number": contract_number,
+        "form_text": form_text,
+        "checkin_date": checkin_date,
+        "brig_name": brig_name,
+        "brig_phone": brig_phone,
+        "carring": carring,
+        "created_at": created_at,
+        "payload": Jsonb(form_data),
+    }
+
     with _connect() as conn:
         with conn.cursor() as cur:
-            cur.execute(
+            for attempt in range(3):
+                try:
+                    _execute(cur, "save_form", SAVE_FORM_SQL, params)
+                    break
+                except psycopg.errors.UniqueViolation:
+                    # Та же заявка сохранена параллельно: повтор обновит её, как раньше делал on conflict
+                    conn.rollback()
+                    if attempt == 2:
+                        raise
+                except psycopg.errors.CheckViolation as e:
+                    # Нет партиции на месяц created_at (задание обслуживания не успело её создать)
+                    conn.rollback()
+                    if attempt == 2 or "partition" not in str(e):
+                        raise
+                    month = created_at or datetime.now(timezone.utc)
+                    _execute(
+                        cur,
+                        "ensure_forms_partitions.month",
+                        """
+                        select bot.ensure_forms_partitions(%(month)s, %(month)s),
+                               to_regclass('bot_archive.forms_p' || to_char(%(month)s::date, 'YYYY_MM')) is not null
+                        """,
+                        {"month": month.date()},
+                    )
+                    if cur.fetchone()[1]:
+                        # Месяц уже перенесён в bot_archive, ensure_forms_partitions его не пересоздаёт
+                        raise ValueError(
+                            f"Form {application_type} #{form_number} is dated {month:%Y-%m}, which is archived"
+                        )
+        conn.commit()
+    db.note_write(user_id)
+
+
+def list_recent_contracts(user_id: int, limit: int = 6) -> list[str]:
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            _execute(cur, "list_recent_contracts",
                 """
-                insert into bot.forms (
-                  application_type, form_number, user_id, creator_fullname,
-                  contract_number, form_text, checkin_date, brig_name, brig_phone, carring,
-                  created_at, payload
-                ) values (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-                on conflict (application_type, form_number) do update set
-                  user_id = excluded.user_id,
-                  creator_fullname = excluded.creator_fullname,
-                  contract_number = excluded.contract_number,
-                  form_text = excluded.form_text,
-                  checkin_date = excluded.checkin_date,
-                  brig_name = excluded.brig_name,
-                  brig_phone = excluded.brig_phone,
-                  carring = excluded.carring,
-                  created_at = excluded.created_at,
-                  payload = excluded.payload
+                select contract_number
+                from bot.user_recent_contracts
+                where user_id = %s
+                order by last_used_at desc
+                limit %s
                 """,
-                (
-                    application_type,
-                    form_number,
-                    user_id,
-                    creator_fullname,
-                    contract_number,
-                    form_text,
-                    checkin_date,
-                    brig_name,
-                    brig_phone,
-                    carring,
-                    created_at,
-                    Jsonb(form_data),
-                ),
+                (_to_int(user_id), limit),
             )
-        conn.commit()
+            rows = cur.fetchall()
+    return [row[0] for row in rows]
 
 
 def get_form_by_type_and_number(application_type: str, form_number: int) -> dict | None:
     form_type = _normalize_form_type(application_type)
     with _connect() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(
+            _execute(cur, "get_form_by_type_and_number",
                 """
-                select application_type, form_number, user_id, creator_fullname,
-                       contract_number, form_text, checkin_date, brig_name, brig_phone, carring,
-                       created_at, payload
-                from bot.forms
-                where application_type = %s and form_number = %s
+                select f.application_type, f.form_number, f.user_id, f.creator_fullname,
+                       f.contract_number, f.form_text, f.checkin_date, f.brig_name, f.brig_phone, f.carring,
+                       f.created_at, f.payload
+                from bot.form_keys k
+                join bot.forms_all f on f.id = k.form_id and f.created_at = k.created_at
+                where k.application_type = %s and k.form_number = %s
                 limit 1
                 """,
                 (form_type, _to_int(form_number)),
@@ -456,9 +589,9 @@ def get_form_by_type_and_number(application_type: str, form_number: int) -> dict
 
 def list_applications_by_type(application_type: str) -> list[dict]:
     form_type = _normalize_form_type(application_type)
-    with _connect() as conn:
+    with _connect_read() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(
+            _execute(cur, "list_applications_by_type",
                 """
                 select id, application_type, form_number, user_id, creator_fullname,
                        contract_number, form_text, checkin_date, brig_name, brig_phone, carring,
@@ -474,9 +607,9 @@ def list_applications_by_type(application_type: str) -> list[dict]:
 
 
 def list_applications_by_user(user_id: int) -> list[dict]:
-    with _connect() as conn:
+    with _connect_read(_to_int(user_id)) as conn:
         with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(
+            _execute(cur, "list_applications_by_user",
                 """
                 select id, application_type, form_number, user_id, creator_fullname,
                        contract_number, form_text, checkin_date, brig_name, brig_phone, carring,
@@ -491,105 +624,458 @@ def list_applications_by_user(user_id: int) -> list[dict]:
     return [_row_to_application(row) for row in rows]
 
 
+def list_user_applications_page(
+    user_id: int,
+    application_type: str | None = None,
+    older_than: tuple[datetime, int] | None = None,
+    newer_than: tuple[datetime, int] | None = None,
+    limit: int = 5,
+) -> list[dict]:
+    """One page of the user's forms, newest first, keyset-paginated on (created_at, id).
+
+    older_than / newer_than take the (created_at, id) cursor of the last / first
+    row of the current page; each application carries its own "cursor".
+    Reads bot.forms_all, so archived months stay in the history; with
+    idx_forms_user_created_id and its archive twin (013) a page is a merge of
+    two index range scans.
+    """
+    conditions = ["user_id = %(user_id)s"]
+    if application_type:
+        conditions.append("application_type = %(application_type)s")
+    direction = "first"
+    if older_than:
+        conditions.append("(created_at, id) < (%(cursor_created_at)s, %(cursor_id)s)")
+        direction = "older"
+    elif newer_than:
+        conditions.append("(created_at, id) > (%(cursor_created_at)s, %(cursor_id)s)")
+        direction = "newer"
+    # Более новые строки читаются по индексу в обратную сторону и переворачиваются ниже
+    order = "asc" if direction == "newer" else "desc"
+    cursor = older_than or newer_than or (None, None)
+
+    with _connect_read(_to_int(user_id)) as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            _execute(cur, f"list_user_applications_page.{'typed' if application_type else 'all'}.{direction}",
+                f"""
+                select id, application_type, form_number, user_id, creator_fullname,
+                       contract_number, form_text, checkin_date, brig_name, brig_phone, carring,
+                       created_at, payload
+                from bot.forms_all
+                where {" and ".join(conditions)}
+                order by created_at {order}, id {order}
+                limit %(limit)s
+                """,
+                {
+                    "user_id": _to_int(user_id),
+                    "application_type": _normalize_form_type(application_type) if application_type else None,
+                    "cursor_created_at": cursor[0],
+                    "cursor_id": cursor[1],
+                    "limit": limit,
+                },
+            )
+            rows = cur.fetchall()
+    if direction == "newer":
+        rows.reverse()
+    return [{**_row_to_application(row), "cursor": (row["created_at"], row["id"])} for row in rows]
+
+
 def get_application_by_id(application_id: int | str) -> dict | None:
     with _connect() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(
-                """
+            _execute(cur, "get_application_by_id",
+                f"""
                 select id, application_type, form_number, user_id, creator_fullname,
                        contract_number, form_text, checkin_date, brig_name, brig_phone, carring,
                        created_at, payload
-                from bot.forms
-                where id = %s
+                from bot.forms_all
+                where {FORM_ID_FILTER}
                 limit 1
                 """,
-                (_to_int(application_id),),
+                {"id": _to_int(application_id)},
             )
             row = cur.fetchone()
     return _row_to_application(row) if row else None
 
 
-def update_application_field(application_id: int | str, field: str, value: str) -> bool:
-    form_id = _to_int(application_id)
-    column = APP_FIELD_TO_COLUMN.get(field)
+def update_application_fields(application_id: int | str, changes: dict) -> bool:
+    """Updates several application fields (columns and payload aliases) in one statement."""
+    columns = {}
+    payload_patch = {}
+    for field, value in (changes or {}).items():
+        payload_patch[field] = value
+        for alias in APP_FIELD_PAYLOAD_ALIASES.get(field, ()):
+            payload_patch[alias] = value
+        column = APP_FIELD_TO_COLUMN.get(field)
+        if column:
+            columns[column] = value
+    if not payload_patch:
+        return False
 
+    assignments = "".join(f"{column} = %({column})s, " for column in columns)
+    params = {**columns, "payload_patch": Jsonb(payload_patch), "id": _to_int(application_id)}
+    row = None
     with _connect() as conn:
-        with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute("select payload from bot.forms where id = %s", (form_id,))
-            row = cur.fetchone()
-            if not row:
-                return False
-
-            payload = _to_payload_dict(row.get("payload")).copy()
-            payload[field] = value
-
-            if field == "contract":
-                payload["contract_number"] = value
-                payload["num_contract"] = value
-            elif field == "text":
-                payload["form_text"] = value
-            elif field == "date_checkin":
-                payload["checkin_date"] = value
-                payload["date"] = value
-            elif field == "brigadier_name":
-                payload["brig_name"] = value
-                payload["name_brig"] = value
-            elif field == "brigadier_phone":
-                payload["brig_phone"] = value
-                payload["phone_brig"] = value
-            elif field == "carrying":
-                payload["carring"] = value
-
-            if column:
-                cur.execute(
-                    f"update bot.forms set {column} = %s, payload = %s where id = %s",
-                    (value, Jsonb(payload), form_id),
-                )
-            else:
+        with conn.cursor() as cur:
+            for table in FORM_TABLES:
                 cur.execute(
-                    "update bot.forms set payload = %s where id = %s",
-                    (Jsonb(payload), form_id),
+                    f"""
+                    update {table}
+                    set {assignments}payload = payload || %(payload_patch)s
+                    where {FORM_ID_FILTER}
+                    returning user_id
+                    """,
+                    params,
                 )
-            updated = cur.rowcount > 0
+                row = cur.fetchone()
+                if row is not None:
+                    break
         conn.commit()
-    return updated
+    if row is None:
+        return False
+    db.note_write(row[0])
+    return True
+
+
+def update_application_field(application_id: int | str, field: str, value: str) -> bool:
+    return update_application_fields(application_id, {field: value})
 
 
 def delete_application(application_id: int | str) -> bool:
+    row = None
     with _connect() as conn:
         with conn.cursor() as cur:
-            cur.execute("delete from bot.forms where id = %s", (_to_int(application_id),))
-            deleted = cur.rowcount > 0
+            for name, table in zip(("delete_application", "delete_archived_application"), FORM_TABLES):
+                _execute(
+                    cur,
+                    name,
+                    f"delete from {table} where {FORM_ID_FILTER} returning user_id",
+                    {"id": _to_int(application_id)},
+                )
+                row = cur.fetchone()
+                if row is not None:
+                    break
         conn.commit()
-    return deleted
+    if row is None:
+        return False
+    db.note_write(row[0])
+    return True
 
 
-def get_usage_stats() -> dict:
+def ensure_form_partitions(months_ahead: int = 3) -> int:
+    """Creates missing monthly partitions of bot.forms up to months_ahead; returns how many were created."""
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            _execute(cur, "ensure_forms_partitions",
+                "select bot.ensure_forms_partitions(current_date, (current_date + make_interval(months => %s))::date)",
+                (months_ahead,),
+            )
+            row = cur.fetchone()
+        conn.commit()
+    return int(row[0] or 0)
+
+
+def archive_form_partitions(keep_months: int) -> list[str]:
+    """Moves partitions older than keep_months to bot_archive; returns the archived partition names."""
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            _execute(cur, "archive_forms_partitions", "select bot.archive_forms_partitions(%s)", (keep_months,))
+            rows = cur.fetchall()
+        conn.commit()
+    return [row[0] for row in rows]
+
+
+def list_pending_registrations(older_than_minutes: int = 60, limit: int = 20) -> list[dict]:
+    """Users waiting for approval longer than older_than_minutes, oldest first."""
     with _connect() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute("select count(*) as total_users from bot.users")
-            total_users = int(cur.fetchone()["total_users"])
+            _execute(cur, "list_pending_registrations",
+                """
+                select *
+                from bot.users
+                where approved = false
+                  and admin = false
+                  and created_at < now() - make_interval(mins => %s)
+                order by created_at
+                limit %s
+                """,
+                (older_than_minutes, limit),
+            )
+            rows = cur.fetchall()
+    return [_row_to_user(row) for row in rows]
 
-            cur.execute("select count(*) as total_applications from bot.forms")
-            total_applications = int(cur.fetchone()["total_applications"])
 
-            cur.execute(
+def get_table_maintenance_hints(dead_ratio: float = 0.2, min_dead_rows: int = 1000) -> list[dict]:
+    """Tables of bot/bot_archive with many dead or unanalyzed rows, from pg_stat_user_tables."""
+    with _connect() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            _execute(cur, "get_table_maintenance_hints",
                 """
-                select count(*) as today_applications
-                from bot.forms
-                where coalesce(created_at::date, inserted_at::date) = current_date
+                select *
+                from (
+                  select schemaname || '.' || relname as table_name,
+                         n_live_tup as live_rows,
+                         n_dead_tup as dead_rows,
+                         n_mod_since_analyze as modified_since_analyze,
+                         greatest(last_vacuum, last_autovacuum) as last_vacuum,
+                         greatest(last_analyze, last_autoanalyze) as last_analyze,
+                         n_dead_tup >= %(min_dead_rows)s
+                           and n_dead_tup > %(dead_ratio)s * greatest(n_live_tup, 1) as needs_vacuum,
+                         n_mod_since_analyze >= %(min_dead_rows)s
+                           and n_mod_since_analyze > %(dead_ratio)s * greatest(n_live_tup, 1) as needs_analyze
+                  from pg_stat_user_tables
+                  where schemaname in ('bot', 'bot_archive')
+                ) t
+                where needs_vacuum or needs_analyze
+                order by dead_rows desc
+                """,
+                {"dead_ratio": dead_ratio, "min_dead_rows": min_dead_rows},
+            )
+            rows = cur.fetchall()
+    return rows
+
+
+def search_forms(query: str, limit: int = 5, offset: int = 0) -> tuple[int, list[dict]]:
+    """Ranked search over contract number, text, creator and brigadier name.
+
+    Returns (total matches, applications for the requested page).
+    """
+    query = (query or "").strip()
+    if not query:
+        return 0, []
+
+    pattern = "%" + query.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_") + "%"
+    with _connect_read() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            # Итог считается отдельно от страницы: за последней страницей он не обнуляется
+            _execute(cur, "search_forms",
                 """
+                with q as (
+                  select websearch_to_tsquery('russian', %(query)s) as tsq
+                ), matches as (
+                  select f.id, f.application_type, f.form_number, f.user_id, f.creator_fullname,
+                         f.contract_number, f.form_text, f.checkin_date, f.brig_name, f.brig_phone, f.carring,
+                         f.created_at, f.payload,
+                         greatest(
+                           ts_rank(f.search_vector, q.tsq),
+                           similarity(coalesce(f.contract_number, ''), %(query)s),
+                           similarity(coalesce(f.creator_fullname, ''), %(query)s),
+                           similarity(coalesce(f.brig_name, ''), %(query)s)
+                         ) as rank
+                  from bot.forms_all f, q
+                  where f.search_vector @@ q.tsq
+                     or f.contract_number ilike %(pattern)s
+                     or f.creator_fullname ilike %(pattern)s
+                     or f.brig_name ilike %(pattern)s
+                     or f.creator_fullname %% %(query)s
+                     or f.brig_name %% %(query)s
+                )
+                select p.*, t.total
+                from (select count(*) as total from matches) t
+                left join lateral (
+                  select * from matches
+                  order by rank desc, created_at desc nulls last, id desc
+                  limit %(limit)s offset %(offset)s
+                ) p on true
+                """,
+                {"query": query, "pattern": pattern, "limit": limit, "offset": offset},
             )
-            today_applications = int(cur.fetchone()["today_applications"])
+            rows = cur.fetchall()
+
+    total = int(rows[0]["total"]) if rows else 0
+    return total, [_row_to_application(row) for row in rows if row["id"] is not None]
+
+
+def get_config_version(name: str) -> int:
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            _execute(cur, "get_config_version", "select version from bot.config_versions where name = %s", (name,))
+            row = cur.fetchone()
+    return int(row[0]) if row else 0
+
+
+def list_task_routing() -> tuple[int, list[dict]]:
+    """Returns (version, rules) from one query so the version always matches the rules."""
+    with _connect() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            _execute(cur, "list_task_routing",
+                """
+                select v.version, r.form_type, r.responsible_id, r.auditors, r.title_template
+                from bot.config_versions v
+                left join bot.task_routing r on true
+                where v.name = 'task_routing'
+                order by r.form_type
+                """
+            )
+            rows = cur.fetchall()
+
+    version = int(rows[0]["version"]) if rows else 0
+    rules = [
+        {
+            "form_type": row["form_type"],
+            "responsible_id": row["responsible_id"],
+            "auditors": list(row["auditors"] or []),
+            "title_template": row["title_template"],
+        }
+        for row in rows
+        if row["form_type"]
+    ]
+    return version, rules
+
+
+def upsert_task_routing(
+    form_type: str,
+    responsible_id: int | None,
+    auditors: list[int],
+    title_template: str,
+    updated_by: int | None = None,
+) -> bool:
+    form_type = _normalize_form_type(form_type)
+    if form_type not in FORM_TYPES:
+        raise ValueError(f"Unsupported form type: {form_type}")
+
+    with _connect() as conn:
+        with conn.cursor() as cur:
+            _execute(cur, "upsert_task_routing",
+                """
+                insert into bot.task_routing (
+                  form_type, responsible_id, auditors, title_template, updated_by, updated_at
+                ) values (%s, %s, %s, %s, %s, now())
+                on conflict (form_type) do update set
+                  responsible_id = excluded.responsible_id,
+                  auditors = excluded.auditors,
+                  title_template = excluded.title_template,
+                  updated_by = excluded.updated_by,
+                  updated_at = now()
+                """,
+                (form_type, _to_int(responsible_id), [int(x) for x in auditors], title_template, _to_int(updated_by)),
+            )
+        conn.commit()
+    return True
+
+
+def get_usage_stats() -> dict:
+    """Totals for the consumption screen, served from bot.form_stats_daily in one query."""
+    with _connect_read() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            _execute(cur, "get_usage_stats",
+                """
+                select
+                  (select count(*) from bot.users) as total_users,
+                  coalesce(sum(forms_count), 0) as total_applications,
+                  coalesce(sum(forms_count) filter (where day = current_date), 0) as today_applications
+                from bot.form_stats_daily
+                """
+            )
+            row = cur.fetchone()
 
     return {
-        "total_users": total_users,
-        "total_applications": total_applications,
-        "today_applications": today_applications,
+        "total_users": int(row["total_users"]),
+        "total_applications": int(row["total_applications"]),
+        "today_applications": int(row["today_applications"]),
         "messages_sent": 0,
     }
 
 
+def get_form_stats(days: int = 30, weeks: int = 8) -> dict:
+    """Per-type, per-department and per-week breakdowns from bot.form_stats_daily.
+
+    All three are built by one query over the rollup rows for the requested
+    period and come back as JSON arrays.
+    """
+    with _connect_read() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            _execute(cur, "get_form_stats",
+                """
+                with period as (
+                  select application_type, department, user_id, day, forms_count
+                  from bot.form_stats_daily
+                  where day > current_date - %(days)s::int
+                ),
+                by_type as (
+                  select application_type,
+                         sum(forms_count) as total,
+                         sum(forms_count) filter (where day = current_date) as today
+                  from period
+                  group by application_type
+                ),
+                by_department as (
+                  select department, sum(forms_count) as total, count(distinct user_id) as users
+                  from period
+                  group by department
+                  having sum(forms_count) > 0
+                  order by total desc
+                  limit 10
+                ),
+                by_week as (
+                  select date_trunc('week', day)::date as week, sum(forms_count) as total
+                  from bot.form_stats_daily
+                  where day >= date_trunc('week', current_date)::date - (%(weeks)s::int - 1) * 7
+                  group by 1
+                )
+                select
+                  (select coalesce(json_agg(t order by t.total desc), '[]') from by_type t) as by_type,
+                  (select coalesce(json_agg(d order by d.total desc), '[]') from by_department d) as by_department,
+                  (select coalesce(json_agg(w order by w.week), '[]') from by_week w) as by_week
+                """,
+                {"days": days, "weeks": weeks},
+            )
+            row = cur.fetchone()
+
+    return {
+        "days": days,
+        "by_type": [
+            {"application_type": item["application_type"], "total": int(item["total"] or 0), "today": int(item["today"] or 0)}
+            for item in row["by_type"]
+        ],
+        "by_department": [
+            {"department": item["department"], "total": int(item["total"]), "users": int(item["users"])}
+            for item in row["by_department"]
+        ],
+        "by_week": [
+            {"week": date.fromisoformat(item["week"]), "total": int(item["total"])}
+            for item in row["by_week"]
+        ],
+    }
+
+
+def get_forms_export_version() -> str:
+    """Returns a key that changes whenever the exported forms change.
+
+    It is the change counter from 011_forms_export_version.sql, bumped by every
+    statement against bot.forms and bot_archive.forms: a single-row lookup.
+    Read from the same pool as get_forms_grouped_for_export, so a lagging
+    replica yields a key that matches the data it serves.
+    """
+    with _connect_read() as conn:
+        with conn.cursor() as cur:
+            _execute(cur, "get_forms_export_version",
+                "select version from bot.config_versions where name = 'forms'"
+            )
+            row = cur.fetchone()
+    return str(row[0] if row else 0)
+
+
+def _export_row(row: dict) -> dict:
+    if row["application_type"] == "checkin":
+        return {
+            "created_at": _format_ts(row["created_at"]),
+            "creator_fullname": row["creator_fullname"] or "",
+            "form_number": row["form_number"] or "",
+            "contract_number": row["contract_number"] or "",
+            "checkin_date": row["checkin_date"] or "",
+            "brig_name": row["brig_name"] or "",
+            "brig_phone": row["brig_phone"] or "",
+            "carring": row["carring"] or "",
+        }
+    return {
+        "created_at": _format_ts(row["created_at"]),
+        "creator_fullname": row["creator_fullname"] or "",
+        "form_number": row["form_number"] or "",
+        "contract_number": row["contract_number"] or "",
+        "form_text": row["form_text"] or "",
+    }
+
+
 def get_forms_grouped_for_export() -> dict:
     grouped = {
         "delivery": [],
@@ -598,14 +1084,14 @@ def get_forms_grouped_for_export() -> dict:
         "checkin": [],
     }
 
-    with _connect() as conn:
+    with _connect_read() as conn:
         with conn.cursor(row_factory=dict_row) as cur:
-            cur.execute(
+            _execute(cur, "get_forms_grouped_for_export",
                 """
                 select
                   application_type, created_at, creator_fullname, form_number, contract_number,
                   form_text, checkin_date, brig_name, brig_phone, carring
-                from bot.forms
+                from bot.forms_all
                 order by created_at nulls last, id
                 """
             )
@@ -613,31 +1099,27 @@ def get_forms_grouped_for_export() -> dict:
 
     for row in rows:
         application_type = row["application_type"]
-        if application_type not in grouped:
-            continue
+        if application_type in grouped:
+            grouped[application_type].append(_export_row(row))
 
-        if application_type == "checkin":
-            grouped[application_type].append(
-                {
-                    "created_at": _format_ts(row["created_at"]),
-                    "creator_fullname": row["creator_fullname"] or "",
-                    "form_number": row["form_number"] or "",
-                    "contract_number": row["contract_number"] or "",
-                    "checkin_date": row["checkin_date"] or "",
-                    "brig_name": row["brig_name"] or "",
-                    "brig_phone": row["brig_phone"] or "",
-                    "carring": row["carring"] or "",
-                }
-            )
-        else:
-            grouped[application_type].append(
-                {
-                    "created_at": _format_ts(row["created_at"]),
-                    "creator_fullname": row["creator_fullname"] or "",
-                    "form_number": row["form_number"] or "",
-                    "contract_number": row["contract_number"] or "",
-                    "form_text": row["form_text"] or "",
-                }
+    return grouped
+
+
+def get_forms_for_export(application_type: str) -> list[dict]:
+    """Returns one sheet of get_forms_grouped_for_export, so sheets can be fetched in parallel."""
+    with _connect_read() as conn:
+        with conn.cursor(row_factory=dict_row) as cur:
+            _execute(cur, "get_forms_for_export",
+                """
+                select
+                  application_type, created_at, creator_fullname, form_number, contract_number,
+                  form_text, checkin_date, brig_name, brig_phone, carring
+                from bot.forms_all
+                where application_type = %s
+                order by created_at nulls last, id
+                """,
+                (application_type,),
             )
+            rows = cur.fetchall()
 
-    return grouped
+    return [_export_row(row) for row in rows]
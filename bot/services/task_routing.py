@@ -0,0 +1,188 @@
+import ast
+import logging
+import os
+import threading
+import time
+from dataclasses import dataclass, replace
+from types import MappingProxyType
+
+from bot.services import cache_events
+from bot.services.supabase_storage import (
+    FORM_TYPES,
+    get_config_version,
+    list_task_routing,
+    upsert_task_routing,
+)
+
+
+# Как часто (в секундах) сверять версию правил в БД с закешированной.
+# Пока подключён слушатель NOTIFY, сверка идёт по событию, а интервал удлиняется
+ROUTING_CHECK_INTERVAL = int(os.getenv("TASK_ROUTING_CHECK_INTERVAL", "30"))
+
+DEFAULT_TITLE_TEMPLATES = {
+    "delivery": "Доставка Договор: {contract_number}",
+    "refund": "Возврат материалов Договор: {contract_number}",
+    "painting": "Покраска Договор: {contract_number}",
+    "checkin": "Заезд Договор: {num_contract}",
+}
+
+# Префиксы переменных окружения *_RESPONSIBLE_ID / *_AUDITORS
+ENV_PREFIXES = {
+    "delivery": "DELIVERY",
+    "refund": "RETURN_MATERIALS",
+    "painting": "PAINTING",
+    "checkin": "CHECKIN",
+}
+
+
+class _FormValues(dict):
+    """Подставляет пустую строку для полей, которых нет в заявке."""
+
+    def __missing__(self, key):
+        return ""
+
+
+@dataclass(frozen=True)
+class RoutingRule:
+    form_type: str
+    responsible_id: int | None
+    auditors: tuple[int, ...]
+    title_template: str
+    source: str = "env"
+
+    def render_title(self, form_data: dict) -> str:
+        try:
+            return self.title_template.format_map(_FormValues(form_data))
+        except (ValueError, IndexError, AttributeError, KeyError, TypeError) as e:
+            logging.warning(f"Invalid title template for {self.form_type}: {e}")
+            return DEFAULT_TITLE_TEMPLATES[self.form_type].format_map(_FormValues(form_data))
+
+
+def parse_auditors(value) -> tuple[int, ...]:
+    """Parses '[1, 2]', '1,2' or a list into a tuple of Bitrix user IDs."""
+    if value is None:
+        return ()
+    if isinstance(value, str):
+        try:
+            value = ast.literal_eval(value) if value.strip() else []
+        except (ValueError, SyntaxError):
+            value = value.strip('[]').replace("'", "").replace('"', '').replace(' ', ',').split(',')
+        if isinstance(value, (int, str)):
+            value = [value]
+    auditors = []
+    for item in value:
+        try:
+            auditors.append(int(str(item).strip()))
+        except (TypeError, ValueError):
+            continue
+    return tuple(auditors)
+
+
+def validate_title_template(template: str) -> bool:
+    try:
+        template.format_map(_FormValues())
+    except (ValueError, IndexError, AttributeError, KeyError, TypeError):
+        return False
+    return bool(template.strip())
+
+
+def _env_rules() -> dict:
+    rules = {}
+    for form_type, prefix in ENV_PREFIXES.items():
+        responsible_id = os.getenv(f"{prefix}_RESPONSIBLE_ID")
+        try:
+            responsible_id = int(responsible_id) if responsible_id else None
+        except ValueError:
+            logging.error(f"Invalid {prefix}_RESPONSIBLE_ID: {responsible_id}")
+            responsible_id = None
+        rules[form_type] = RoutingRule(
+            form_type=form_type,
+            responsible_id=responsible_id,
+            auditors=parse_auditors(os.getenv(f"{prefix}_AUDITORS", "[]")),
+            title_template=DEFAULT_TITLE_TEMPLATES[form_type],
+        )
+    return rules
+
+
+# Переменные окружения разбираются один раз при импорте
+_ENV_RULES = _env_rules()
+
+_lock = threading.Lock()
+_rules = MappingProxyType(dict(_ENV_RULES))
+_version = None
+_checked_at = 0.0
+
+
+def _build_rules(rows: list[dict]) -> MappingProxyType:
+    rules = dict(_ENV_RULES)
+    for row in rows:
+        if row["form_type"] not in FORM_TYPES:
+            continue
+        rules[row["form_type"]] = RoutingRule(
+            form_type=row["form_type"],
+            responsible_id=row["responsible_id"],
+            auditors=tuple(int(x) for x in row["auditors"]),
+            title_template=row["title_template"] or DEFAULT_TITLE_TEMPLATES[row["form_type"]],
+            source="db",
+        )
+    return MappingProxyType(rules)
+
+
+def _refresh(force: bool = False) -> None:
+    global _rules, _version, _checked_at
+    with _lock:
+        if not force and time.monotonic() - _checked_at < cache_events.cache_ttl(ROUTING_CHECK_INTERVAL):
+            return
+        _checked_at = time.monotonic()
+        try:
+            if not force and _version is not None and get_config_version("task_routing") == _version:
+                return
+            version, rows = list_task_routing()
+            _rules = _build_rules(rows)
+            _version = version
+            logging.info(f"Task routing rules loaded (version {version})")
+        except Exception as e:
+            # Остаемся на последних загруженных правилах (или на значениях из .env)
+            logging.error(f"Failed to load task routing rules: {e}")
+
+
+def get_routing_rules() -> MappingProxyType:
+    """Returns the immutable form type -> RoutingRule mapping."""
+    if time.monotonic() - _checked_at >= cache_events.cache_ttl(ROUTING_CHECK_INTERVAL):
+        _refresh()
+    return _rules
+
+
+def get_routing_rule(form_type: str) -> RoutingRule | None:
+    return get_routing_rules().get(form_type)
+
+
+def invalidate_routing_cache() -> None:
+    """Forces the next lookup to compare versions with the database."""
+    global _checked_at
+    _checked_at = 0.0
+
+
+def _on_config_event(key: str | None) -> None:
+    if key in (None, "task_routing"):
+        invalidate_routing_cache()
+
+
+cache_events.subscribe("config_versions", _on_config_event)
+
+
+def update_routing_rule(form_type: str, updated_by: int | None = None, **changes) -> RoutingRule:
+    """Saves the current rule with `changes` applied and reloads the cache."""
+    current = get_routing_rule(form_type)
+    if current is None:
+        raise ValueError(f"Unsupported form type: {form_type}")
+    rule = replace(current, source="db", **changes)
+    upsert_task_routing(
+        rule.form_type,
+        rule.responsible_id,
+        list(rule.auditors),
+        rule.title_template,
+        updated_by,
+    )
+    _refresh(force=True)
+    return get_routing_rule(form_type)
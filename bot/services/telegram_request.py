@@ -0,0 +1,148 @@
+"""Bot API HTTP layer: tuned HTTPXRequest instances with latency metrics.
+
+getUpdates long-polls on its own request object, so it never holds a
+connection that outgoing calls (messages, edits, document uploads) wait for.
+Pool size, timeouts and the HTTP version come from the environment:
+
+    TELEGRAM_CONNECTION_POOL_SIZE   outgoing connections (default 64)
+    TELEGRAM_GET_UPDATES_POOL_SIZE  getUpdates connections (default 1)
+    TELEGRAM_CONNECT_TIMEOUT        seconds (default 5)
+    TELEGRAM_READ_TIMEOUT           seconds (default 10)
+    TELEGRAM_WRITE_TIMEOUT          seconds (default 30, uploads of exports)
+    TELEGRAM_POOL_TIMEOUT           seconds to wait for a free connection (default 5)
+    TELEGRAM_HTTP_VERSION           "1.1" or "2" (needs the h2 package)
+
+With HTTP/2 all calls are multiplexed over few connections, so pool waits
+mostly disappear. Each request object records per-call latency and pool wait:
+the time from handing the request to httpx until it starts connecting or
+sending headers, which is how long it queued for a connection.
+"""
+import importlib.util
+import logging
+import os
+import time
+from collections import Counter, deque
+
+from telegram.request import HTTPXRequest
+
+
+METRICS_SAMPLES = 1000
+
+
+def _float_env(name: str, default: float) -> float:
+    return float(os.getenv(name, str(default)))
+
+
+def _percentile(values: list[float], fraction: float) -> float | None:
+    if not values:
+        return None
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * fraction))]
+
+
+class RequestStats:
+    """Rolling latency and pool-wait samples of one request object."""
+
+    def __init__(self, samples: int = METRICS_SAMPLES):
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self.pool_timeouts = 0
+        self.errors: Counter = Counter()
+        self.methods: Counter = Counter()
+        self.latency_ms: deque = deque(maxlen=samples)
+        self.pool_wait_ms: deque = deque(maxlen=samples)
+
+    def snapshot(self) -> dict:
+        latency = list(self.latency_ms)
+        pool_wait = list(self.pool_wait_ms)
+        return {
+            "calls": self.calls,
+            "in_flight": self.in_flight,
+            "max_in_flight": self.max_in_flight,
+            "pool_timeouts": self.pool_timeouts,
+            "errors": dict(self.errors),
+            "top_methods": dict(self.methods.most_common(5)),
+            "latency_p50_ms": _percentile(latency, 0.5),
+            "latency_p95_ms": _percentile(latency, 0.95),
+            "latency_max_ms": max(latency, default=None),
+            "pool_wait_p50_ms": _percentile(pool_wait, 0.5),
+            "pool_wait_p95_ms": _percentile(pool_wait, 0.95),
+            "pool_wait_max_ms": max(pool_wait, default=None),
+        }
+
+
+class InstrumentedHTTPXRequest(HTTPXRequest):
+    """HTTPXRequest that records latency and connection pool wait per call."""
+
+    def __init__(self, name: str, **kwargs):
+        self.name = name
+        self.settings = dict(kwargs)
+        self.stats = RequestStats()
+        super().__init__(**kwargs)
+
+    def _build_client(self):
+        client = super()._build_client()
+        client.event_hooks = {**client.event_hooks, "request": [*client.event_hooks["request"], self._on_request]}
+        return client
+
+    async def _on_request(self, request) -> None:
+        queued_at = time.perf_counter()
+        waited = False
+
+        async def trace(event: str, info: dict) -> None:
+            nonlocal waited
+            # Первое событие соединения — запрос получил соединение из пула
+            if not waited and (event == "connection.connect_tcp.started" or event.endswith("send_request_headers.started")):
+                waited = True
+                self.stats.pool_wait_ms.append(round((time.perf_counter() - queued_at) * 1000, 1))
+
+        request.extensions["trace"] = trace
+
+    async def do_request(self, url: str, method: str, *args, **kwargs):
+        stats = self.stats
+        stats.calls += 1
+        stats.methods[url.rsplit("/", 1)[-1]] += 1
+        stats.in_flight += 1
+        stats.max_in_flight = max(stats.max_in_flight, stats.in_flight)
+        started = time.perf_counter()
+        try:
+            return await super().do_request(url, method, *args, **kwargs)
+        except Exception as e:
+            if str(e).startswith("Pool timeout"):
+                stats.pool_timeouts += 1
+            stats.errors[type(e).__name__] += 1
+            raise
+        finally:
+            stats.in_flight -= 1
+            stats.latency_ms.append(round((time.perf_counter() - started) * 1000, 1))
+
+
+def _http_version() -> str:
+    version = os.getenv("TELEGRAM_HTTP_VERSION", "1.1")
+    if version in ("2", "2.0") and importlib.util.find_spec("h2") is None:
+        logging.warning("TELEGRAM_HTTP_VERSION=2 needs the h2 package (pip install 'httpx[http2]'), using HTTP/1.1")
+        return "1.1"
+    return version
+
+
+def build_requests() -> tuple[InstrumentedHTTPXRequest, InstrumentedHTTPXRequest]:
+    """Returns (outgoing, get_updates) request objects for ApplicationBuilder."""
+    common = {
+        "connect_timeout": _float_env("TELEGRAM_CONNECT_TIMEOUT", 5.0),
+        "read_timeout": _float_env("TELEGRAM_READ_TIMEOUT", 10.0),
+        "write_timeout": _float_env("TELEGRAM_WRITE_TIMEOUT", 30.0),
+        "pool_timeout": _float_env("TELEGRAM_POOL_TIMEOUT", 5.0),
+        "http_version": _http_version(),
+    }
+    outgoing = InstrumentedHTTPXRequest(
+        "outgoing",
+        connection_pool_size=int(os.getenv("TELEGRAM_CONNECTION_POOL_SIZE", "64")),
+        **common,
+    )
+    get_updates = InstrumentedHTTPXRequest(
+        "get_updates",
+        connection_pool_size=int(os.getenv("TELEGRAM_GET_UPDATES_POOL_SIZE", "1")),
+        **common,
+    )
+    return outgoing, get_updates
@@ -0,0 +1,68 @@
+import logging
+import os
+import threading
+import time
+from collections import OrderedDict
+
+from bot.services import cache_events, db
+from bot.services.supabase_storage import get_user_flags as load_user_flags
+
+
+# Без слушателя NOTIFY флаги живут в кеше недолго: одобрение и права админа меняются извне
+USER_FLAGS_CACHE_TTL = int(os.getenv("USER_FLAGS_CACHE_TTL", "15"))
+USER_FLAGS_CACHE_SIZE = 5000
+
+_lock = threading.Lock()
+_cache: "OrderedDict[int, tuple[float, dict | None]]" = OrderedDict()
+# Растёт при каждом сбросе: значение, загруженное до сброса, в кеш не кладётся
+_evictions = 0
+
+
+def get_user_flags(user_id: int) -> dict | None:
+    """Returns {"approved", "admin"} for the user (None if not registered), cached.
+
+    On a database error the last cached value is returned if there is one.
+    """
+    now = time.monotonic()
+    with _lock:
+        cached = _cache.get(user_id)
+        if cached and now - cached[0] < cache_events.cache_ttl(USER_FLAGS_CACHE_TTL):
+            _cache.move_to_end(user_id)
+            return cached[1]
+        evictions = _evictions
+
+    try:
+        flags = load_user_flags(user_id)
+    except Exception as e:
+        if cached:
+            logging.error(f"Failed to load user flags for {user_id}, using cached: {e}")
+            return cached[1]
+        raise
+
+    with _lock:
+        if evictions != _evictions:
+            return flags
+        _cache[user_id] = (now, flags)
+        _cache.move_to_end(user_id)
+        while len(_cache) > USER_FLAGS_CACHE_SIZE:
+            _cache.popitem(last=False)
+    return flags
+
+
+def forget_user_flags(user_id: int | None = None) -> None:
+    """Evicts one user (or everyone when user_id is None)."""
+    global _evictions
+    with _lock:
+        _evictions += 1
+        if user_id is None:
+            _cache.clear()
+        else:
+            _cache.pop(user_id, None)
+
+
+def _on_users_event(key: str | None) -> None:
+    forget_user_flags(int(key) if key is not None else None)
+
+
+cache_events.subscribe("users", _on_users_event)
+db.add_write_listener(forget_user_flags)
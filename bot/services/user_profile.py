@@ -0,0 +1,69 @@
+import asyncio
+import logging
+
+from config import Config
+from bot.services.supabase_storage import get_user_profile
+
+
+# Ключ в context.user_data, под которым хранится профиль на время диалога
+PROFILE_KEY = "user_profile"
+
+
+def _default_profile(user_id: int) -> dict:
+    return {
+        "user_id": user_id,
+        "username": "",
+        "fullname": "",
+        "phone": "",
+        "position": "",
+        "department": "",
+        "approved": False,
+        "admin": False,
+        "exists": False,
+        "settings": {"auto_numbering": False},
+        "version": None,
+    }
+
+
+def _with_flags(profile: dict) -> dict:
+    profile["is_registered"] = profile["approved"]
+    profile["is_admin"] = profile["user_id"] in Config.ADMIN_IDS or profile["admin"]
+    return profile
+
+
+async def load_user_profile(context, user_id: int, refresh: bool = False) -> dict:
+    """Returns the profile cached in the conversation, loading it with one query if needed.
+
+    With refresh=True the profile is re-read; the cached dict is kept as is
+    when the row versions have not changed.
+    """
+    cached = context.user_data.get(PROFILE_KEY)
+    if cached and cached["user_id"] == user_id and not refresh:
+        return cached
+
+    try:
+        profile = await asyncio.to_thread(get_user_profile, user_id)
+    except Exception as e:
+        logging.error(f"Failed to load user profile for {user_id}: {e}")
+        return cached if cached and cached["user_id"] == user_id else _with_flags(_default_profile(user_id))
+
+    if cached and cached["user_id"] == user_id and cached.get("version") == profile["version"]:
+        return cached
+    context.user_data[PROFILE_KEY] = _with_flags(profile)
+    return context.user_data[PROFILE_KEY]
+
+
+def forget_user_profile(context) -> None:
+    """Drops the cached profile so the next load re-reads it (after the bot changes it itself)."""
+    context.user_data.pop(PROFILE_KEY, None)
+
+
+def forget_user_profiles(application, user_id: int | None = None) -> None:
+    """Drops cached profiles from the application's user_data (one user or all), for invalidation events."""
+    if user_id is None:
+        for user_data in application.user_data.values():
+            user_data.pop(PROFILE_KEY, None)
+        return
+    user_data = application.user_data.get(user_id)
+    if user_data:
+        user_data.pop(PROFILE_KEY, None)
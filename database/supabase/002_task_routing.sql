@@ -0,0 +1,42 @@
+-- Task routing rules: form type -> Bitrix responsible, auditors, title template.
+-- Types without a row fall back to *_RESPONSIBLE_ID / *_AUDITORS from .env.
+
+create table if not exists bot.task_routing (
+  form_type text primary key check (form_type in ('delivery', 'refund', 'painting', 'checkin')),
+  responsible_id bigint,
+  auditors bigint[] not null default '{}',
+  title_template text not null,
+  updated_by bigint,
+  updated_at timestamptz not null default now()
+);
+
+-- Version stamps for runtime configuration: the bot compares the stored
+-- version with the cached one and reloads only when it changed.
+create table if not exists bot.config_versions (
+  name text primary key,
+  version bigint not null default 0,
+  updated_at timestamptz not null default now()
+);
+
+insert into bot.config_versions (name, version)
+values ('task_routing', 0)
+on conflict (name) do nothing;
+
+create or replace function bot.bump_config_version()
+returns trigger
+language plpgsql
+as $$
+begin
+  insert into bot.config_versions (name, version, updated_at)
+  values (tg_argv[0], 1, now())
+  on conflict (name) do update set
+    version = bot.config_versions.version + 1,
+    updated_at = now();
+  return null;
+end;
+$$;
+
+drop trigger if exists trg_task_routing_version on bot.task_routing;
+create trigger trg_task_routing_version
+  after insert or update or delete on bot.task_routing
+  for each statement execute function bot.bump_config_version('task_routing');
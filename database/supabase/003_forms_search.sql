@@ -0,0 +1,24 @@
+-- Admin search over forms: full-text (russian) plus trigram matching for
+-- contract numbers and names, which are often typed partially or with typos.
+
+create extension if not exists pg_trgm;
+
+alter table bot.forms
+  add column if not exists search_vector tsvector
+  generated always as (
+    setweight(to_tsvector('russian'::regconfig, coalesce(contract_number, '')), 'A') ||
+    setweight(to_tsvector('russian'::regconfig, coalesce(creator_fullname, '') || ' ' || coalesce(brig_name, '')), 'B') ||
+    setweight(to_tsvector('russian'::regconfig, coalesce(form_text, '')), 'C')
+  ) stored;
+
+create index if not exists idx_forms_search_vector
+  on bot.forms using gin (search_vector);
+
+create index if not exists idx_forms_contract_number_trgm
+  on bot.forms using gin (contract_number gin_trgm_ops);
+
+create index if not exists idx_forms_creator_fullname_trgm
+  on bot.forms using gin (creator_fullname gin_trgm_ops);
+
+create index if not exists idx_forms_brig_name_trgm
+  on bot.forms using gin (brig_name gin_trgm_ops);
@@ -0,0 +1,46 @@
+-- Per-user index of recently used contract numbers for quick-pick buttons.
+-- Maintained by a trigger on bot.forms, so reading suggestions never scans forms.
+
+create table if not exists bot.user_recent_contracts (
+  user_id bigint not null,
+  contract_number text not null,
+  last_used_at timestamptz not null default now(),
+  use_count integer not null default 1,
+  primary key (user_id, contract_number)
+);
+
+create index if not exists idx_user_recent_contracts_last_used
+  on bot.user_recent_contracts (user_id, last_used_at desc);
+
+create or replace function bot.touch_user_recent_contract()
+returns trigger
+language plpgsql
+as $$
+begin
+  if new.user_id is null or coalesce(btrim(new.contract_number), '') = '' then
+    return null;
+  end if;
+
+  insert into bot.user_recent_contracts (user_id, contract_number, last_used_at, use_count)
+  values (new.user_id, btrim(new.contract_number), coalesce(new.created_at, now()), 1)
+  on conflict (user_id, contract_number) do update set
+    last_used_at = greatest(bot.user_recent_contracts.last_used_at, excluded.last_used_at),
+    use_count = bot.user_recent_contracts.use_count + case when tg_op = 'INSERT' then 1 else 0 end;
+  return null;
+end;
+$$;
+
+drop trigger if exists trg_forms_recent_contract on bot.forms;
+create trigger trg_forms_recent_contract
+  after insert or update of user_id, contract_number on bot.forms
+  for each row execute function bot.touch_user_recent_contract();
+
+-- One-time backfill from existing forms
+insert into bot.user_recent_contracts (user_id, contract_number, last_used_at, use_count)
+select user_id, btrim(contract_number), max(coalesce(created_at, inserted_at)), count(*)
+from bot.forms
+where user_id is not null and coalesce(btrim(contract_number), '') <> ''
+group by user_id, btrim(contract_number)
+on conflict (user_id, contract_number) do update set
+  last_used_at = excluded.last_used_at,
+  use_count = excluded.use_count;
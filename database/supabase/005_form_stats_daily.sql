@@ -0,0 +1,86 @@
+-- Daily rollup of forms (type x day x department x user) for the stats dashboard.
+-- Maintained incrementally by a trigger on bot.forms; dashboards read only this table.
+-- Department is taken from bot.users at the moment the form is saved.
+
+create table if not exists bot.form_stats_daily (
+  day date not null,
+  application_type text not null,
+  department text not null default '',
+  user_id bigint not null default 0,
+  forms_count integer not null default 0,
+  primary key (day, application_type, department, user_id)
+);
+
+create or replace function bot.form_stats_apply(
+  p_day date,
+  p_application_type text,
+  p_user_id bigint,
+  p_delta integer
+)
+returns void
+language plpgsql
+as $$
+declare
+  v_department text;
+begin
+  select coalesce(u.department, '') into v_department
+  from bot.users u
+  where u.user_id = p_user_id;
+
+  insert into bot.form_stats_daily (day, application_type, department, user_id, forms_count)
+  values (p_day, p_application_type, coalesce(v_department, ''), coalesce(p_user_id, 0), p_delta)
+  on conflict (day, application_type, department, user_id) do update set
+    forms_count = bot.form_stats_daily.forms_count + excluded.forms_count;
+end;
+$$;
+
+create or replace function bot.form_stats_track()
+returns trigger
+language plpgsql
+as $$
+begin
+  if tg_op in ('UPDATE', 'DELETE') then
+    -- The user's department may have changed since the form was counted,
+    -- so decrement whichever department bucket holds it.
+    update bot.form_stats_daily s
+    set forms_count = s.forms_count - 1
+    where (s.day, s.application_type, s.department, s.user_id) = (
+      select s2.day, s2.application_type, s2.department, s2.user_id
+      from bot.form_stats_daily s2
+      where s2.day = coalesce(old.created_at, old.inserted_at)::date
+        and s2.application_type = old.application_type
+        and s2.user_id = coalesce(old.user_id, 0)
+        and s2.forms_count > 0
+      limit 1
+    );
+  end if;
+
+  if tg_op in ('INSERT', 'UPDATE') then
+    perform bot.form_stats_apply(
+      coalesce(new.created_at, new.inserted_at)::date,
+      new.application_type,
+      new.user_id,
+      1
+    );
+  end if;
+
+  return null;
+end;
+$$;
+
+drop trigger if exists trg_forms_stats on bot.forms;
+create trigger trg_forms_stats
+  after insert or delete or update of application_type, user_id, created_at on bot.forms
+  for each row execute function bot.form_stats_track();
+
+-- One-time backfill
+truncate bot.form_stats_daily;
+insert into bot.form_stats_daily (day, application_type, department, user_id, forms_count)
+select coalesce(f.created_at, f.inserted_at)::date,
+       f.application_type,
+       coalesce(u.department, ''),
+       coalesce(f.user_id, 0),
+       count(*)
+from bot.forms f
+left join bot.users u on u.user_id = f.user_id
+group by 1, 2, 3, 4;
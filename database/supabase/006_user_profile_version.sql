@@ -0,0 +1,30 @@
+-- Row versions for bot.users and bot.user_settings.
+-- The bot caches the combined user profile per conversation and compares
+-- users.version + user_settings.version to know when the cached copy is stale.
+
+alter table bot.users add column if not exists version bigint not null default 1;
+alter table bot.user_settings add column if not exists version bigint not null default 1;
+
+create or replace function bot.bump_row_version()
+returns trigger
+language plpgsql
+as $$
+begin
+  new.version := old.version + 1;
+  return new;
+end;
+$$;
+
+drop trigger if exists trg_users_version on bot.users;
+create trigger trg_users_version
+  before update on bot.users
+  for each row
+  when (old.* is distinct from new.*)
+  execute function bot.bump_row_version();
+
+drop trigger if exists trg_user_settings_version on bot.user_settings;
+create trigger trg_user_settings_version
+  before update on bot.user_settings
+  for each row
+  when (old.* is distinct from new.*)
+  execute function bot.bump_row_version();
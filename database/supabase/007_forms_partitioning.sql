@@ -0,0 +1,236 @@
+-- Monthly range partitioning of bot.forms by created_at plus a cold archive.
+--
+-- * bot.forms becomes a partitioned table (forms_pYYYY_MM partitions), so
+--   date-bounded queries touch only the months they need.
+-- * (application_type, form_number) uniqueness moves to bot.form_keys: a unique
+--   index on a partitioned table must contain the partition key.
+-- * Old partitions are detached into bot_archive.forms by
+--   bot.archive_forms_partitions(); bot.forms_all spans hot and archived rows
+--   for exports and search.
+--
+-- Columns added to bot.forms later must be added to bot_archive.forms too.
+
+create schema if not exists bot_archive;
+
+create table if not exists bot.form_keys (
+  application_type text not null,
+  form_number bigint not null,
+  form_id bigint not null,
+  created_at timestamptz not null,
+  primary key (application_type, form_number)
+);
+
+create index if not exists idx_form_keys_form_id
+  on bot.form_keys (form_id);
+
+create or replace function bot.ensure_forms_partitions(p_from date, p_to date)
+returns integer
+language plpgsql
+as $$
+declare
+  v_month date := date_trunc('month', coalesce(p_from, now()))::date;
+  v_name text;
+  v_created integer := 0;
+begin
+  while v_month <= coalesce(p_to, now())::date loop
+    v_name := 'forms_p' || to_char(v_month, 'YYYY_MM');
+    if to_regclass(format('bot.%I', v_name)) is null
+       and to_regclass(format('bot_archive.%I', v_name)) is null then
+      execute format(
+        'create table bot.%I partition of bot.forms for values from (%L) to (%L)',
+        v_name, v_month, (v_month + interval '1 month')::date
+      );
+      v_created := v_created + 1;
+    end if;
+    v_month := (v_month + interval '1 month')::date;
+  end loop;
+  return v_created;
+end;
+$$;
+
+do $$
+begin
+  if (select relkind from pg_class where oid = 'bot.forms'::regclass) = 'p' then
+    return;
+  end if;
+
+  alter table bot.forms rename to forms_unpartitioned;
+
+  -- The old identity sequence (bot.forms_id_seq) is dropped with the old table
+  create sequence if not exists bot.form_id_seq;
+  perform setval('bot.form_id_seq', coalesce((select max(id) from bot.forms_unpartitioned), 0) + 1, false);
+
+  create table bot.forms (
+    id bigint not null default nextval('bot.form_id_seq'),
+    application_type text not null check (application_type in ('delivery', 'refund', 'painting', 'checkin')),
+    form_number bigint not null,
+    user_id bigint,
+    creator_fullname text,
+    contract_number text,
+    form_text text,
+    checkin_date text,
+    brig_name text,
+    brig_phone text,
+    carring text,
+    created_at timestamptz not null default now(),
+    payload jsonb not null default '{}'::jsonb,
+    inserted_at timestamptz not null default now(),
+    search_vector tsvector generated always as (
+      setweight(to_tsvector('russian'::regconfig, coalesce(contract_number, '')), 'A') ||
+      setweight(to_tsvector('russian'::regconfig, coalesce(creator_fullname, '') || ' ' || coalesce(brig_name, '')), 'B') ||
+      setweight(to_tsvector('russian'::regconfig, coalesce(form_text, '')), 'C')
+    ) stored,
+    primary key (id, created_at)
+  ) partition by range (created_at);
+
+  perform bot.ensure_forms_partitions(
+    (select min(coalesce(created_at, inserted_at))::date from bot.forms_unpartitioned),
+    (now() + interval '3 months')::date
+  );
+
+  insert into bot.forms (
+    id, application_type, form_number, user_id, creator_fullname, contract_number, form_text,
+    checkin_date, brig_name, brig_phone, carring, created_at, payload, inserted_at
+  )
+  select id, application_type, form_number, user_id, creator_fullname, contract_number, form_text,
+         checkin_date, brig_name, brig_phone, carring, coalesce(created_at, inserted_at), payload, inserted_at
+  from bot.forms_unpartitioned;
+
+  insert into bot.form_keys (application_type, form_number, form_id, created_at)
+  select application_type, form_number, id, coalesce(created_at, inserted_at)
+  from bot.forms_unpartitioned;
+
+  drop table bot.forms_unpartitioned cascade;
+  alter sequence bot.form_id_seq owned by bot.forms.id;
+end;
+$$;
+
+-- Indexes from 001/003, now as partitioned indexes
+create index if not exists idx_forms_type_created_at
+  on bot.forms (application_type, created_at);
+
+create index if not exists idx_forms_user_id
+  on bot.forms (user_id);
+
+create index if not exists idx_forms_search_vector
+  on bot.forms using gin (search_vector);
+
+create index if not exists idx_forms_contract_number_trgm
+  on bot.forms using gin (contract_number gin_trgm_ops);
+
+create index if not exists idx_forms_creator_fullname_trgm
+  on bot.forms using gin (creator_fullname gin_trgm_ops);
+
+create index if not exists idx_forms_brig_name_trgm
+  on bot.forms using gin (brig_name gin_trgm_ops);
+
+-- form_keys follows inserts, deletes and key changes. A row moved to another
+-- partition by an update fires delete + insert, hence the upsert by form_id.
+create or replace function bot.track_form_key()
+returns trigger
+language plpgsql
+as $$
+declare
+  v_rows integer;
+begin
+  if tg_op = 'DELETE' then
+    delete from bot.form_keys
+    where form_id = old.id and created_at = old.created_at;
+    return null;
+  end if;
+
+  if tg_op = 'UPDATE' then
+    delete from bot.form_keys
+    where form_id = old.id
+      and (application_type, form_number) is distinct from (new.application_type, new.form_number);
+  end if;
+
+  insert into bot.form_keys (application_type, form_number, form_id, created_at)
+  values (new.application_type, new.form_number, new.id, new.created_at)
+  on conflict (application_type, form_number) do update set
+    created_at = excluded.created_at
+  where bot.form_keys.form_id = excluded.form_id;
+
+  get diagnostics v_rows = row_count;
+  if v_rows = 0 then
+    raise unique_violation using
+      message = format('form %s #%s already exists', new.application_type, new.form_number);
+  end if;
+  return null;
+end;
+$$;
+
+drop trigger if exists trg_forms_keys on bot.forms;
+create trigger trg_forms_keys
+  after insert or delete or update of application_type, form_number, created_at on bot.forms
+  for each row execute function bot.track_form_key();
+
+-- Triggers from 004/005 were dropped together with the old table
+drop trigger if exists trg_forms_recent_contract on bot.forms;
+create trigger trg_forms_recent_contract
+  after insert or update of user_id, contract_number on bot.forms
+  for each row execute function bot.touch_user_recent_contract();
+
+drop trigger if exists trg_forms_stats on bot.forms;
+create trigger trg_forms_stats
+  after insert or delete or update of application_type, user_id, created_at on bot.forms
+  for each row execute function bot.form_stats_track();
+
+-- Cold storage: same columns, same partitioning, only the indexes search and exports need
+create table if not exists bot_archive.forms (
+  like bot.forms including defaults including generated including constraints
+) partition by range (created_at);
+
+create index if not exists idx_archive_forms_type_created_at
+  on bot_archive.forms (application_type, created_at);
+
+create index if not exists idx_archive_forms_search_vector
+  on bot_archive.forms using gin (search_vector);
+
+create index if not exists idx_archive_forms_contract_number_trgm
+  on bot_archive.forms using gin (contract_number gin_trgm_ops);
+
+create index if not exists idx_archive_forms_creator_fullname_trgm
+  on bot_archive.forms using gin (creator_fullname gin_trgm_ops);
+
+create index if not exists idx_archive_forms_brig_name_trgm
+  on bot_archive.forms using gin (brig_name gin_trgm_ops);
+
+create or replace view bot.forms_all as
+select * from bot.forms
+union all
+select * from bot_archive.forms;
+
+-- Moves partitions that end before (current month - p_keep_months) to bot_archive.
+-- Archived forms stay visible through bot.forms_all and keep their form_keys,
+-- so form numbers are never reused. The stats rollup is not touched.
+create or replace function bot.archive_forms_partitions(p_keep_months integer)
+returns setof text
+language plpgsql
+as $$
+declare
+  v_cutoff date := (date_trunc('month', now()) - make_interval(months => p_keep_months))::date;
+  v_name text;
+  v_month date;
+begin
+  for v_name in
+    select c.relname
+    from pg_inherits i
+    join pg_class c on c.oid = i.inhrelid
+    where i.inhparent = 'bot.forms'::regclass
+      and c.relname ~ '^forms_p\d{4}_\d{2}$'
+    order by c.relname
+  loop
+    v_month := to_date(substr(v_name, 8), 'YYYY_MM');
+    continue when v_month >= v_cutoff;
+
+    execute format('alter table bot.forms detach partition bot.%I', v_name);
+    execute format('alter table bot.%I set schema bot_archive', v_name);
+    execute format(
+      'alter table bot_archive.forms attach partition bot_archive.%I for values from (%L) to (%L)',
+      v_name, v_month, (v_month + interval '1 month')::date
+    );
+    return next v_name;
+  end loop;
+end;
+$$;
@@ -0,0 +1,42 @@
+-- Cache invalidation events for bot processes.
+-- Row changes are published on the bot_cache channel as {"table": ..., "key": ...}
+-- once the transaction commits; every bot process LISTENs and evicts the
+-- matching cache entries (bot/services/cache_events.py). Edits made in
+-- Supabase Studio or by another container are picked up the same way.
+
+create or replace function bot.notify_cache_invalidation()
+returns trigger
+language plpgsql
+as $$
+declare
+  v_row jsonb := case when tg_op = 'DELETE' then to_jsonb(old) else to_jsonb(new) end;
+begin
+  -- tg_argv[0] — колонка с ключом кеша
+  perform pg_notify(
+    'bot_cache',
+    json_build_object('table', tg_table_name, 'key', v_row ->> tg_argv[0])::text
+  );
+  return null;
+end;
+$$;
+
+drop trigger if exists trg_users_cache_notify on bot.users;
+create trigger trg_users_cache_notify
+  after insert or update or delete on bot.users
+  for each row execute function bot.notify_cache_invalidation('user_id');
+
+drop trigger if exists trg_user_settings_cache_notify on bot.user_settings;
+create trigger trg_user_settings_cache_notify
+  after insert or update or delete on bot.user_settings
+  for each row execute function bot.notify_cache_invalidation('user_id');
+
+drop trigger if exists trg_user_recent_contracts_cache_notify on bot.user_recent_contracts;
+create trigger trg_user_recent_contracts_cache_notify
+  after insert or update or delete on bot.user_recent_contracts
+  for each row execute function bot.notify_cache_invalidation('user_id');
+
+-- Configuration tables bump bot.config_versions (002), so one trigger covers them all
+drop trigger if exists trg_config_versions_cache_notify on bot.config_versions;
+create trigger trg_config_versions_cache_notify
+  after insert or update or delete on bot.config_versions
+  for each row execute function bot.notify_cache_invalidation('name');
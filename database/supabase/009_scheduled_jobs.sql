@@ -0,0 +1,15 @@
+-- Run log of the in-process job scheduler (bot/services/scheduler.py).
+-- Replicas take pg_try_advisory_xact_lock per job and skip a slot that
+-- last_slot shows has already been run, so each job runs once per slot.
+
+create table if not exists bot.scheduled_jobs (
+  name text primary key,
+  last_slot timestamptz not null,
+  last_started_at timestamptz not null,
+  last_duration_ms integer,
+  last_status text not null check (last_status in ('ok', 'failed')),
+  last_result text,
+  runs bigint not null default 0,
+  failures bigint not null default 0,
+  updated_at timestamptz not null default now()
+);
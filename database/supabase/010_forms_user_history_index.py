@@ -0,0 +1,17 @@
+"""Index for the user's own form history ("📜 Мои заявки").
+
+Keyset pagination on (created_at, id) within one user reads a single index
+range. Built partition by partition with CREATE INDEX CONCURRENTLY; the old
+single-column index is a prefix of the new one and is dropped.
+"""
+from bot.services.migrations import create_partitioned_index_concurrently
+
+
+TRANSACTIONAL = False
+
+
+def upgrade(conn):
+    create_partitioned_index_concurrently(
+        conn, "idx_forms_user_created_id", "bot.forms", "(user_id, created_at desc, id desc)"
+    )
+    conn.execute("drop index if exists bot.idx_forms_user_id")
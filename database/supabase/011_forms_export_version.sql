@@ -0,0 +1,18 @@
+-- Change counter for exported forms.
+-- Every statement that writes bot.forms or bot_archive.forms bumps the 'forms'
+-- row of bot.config_versions (002). The export buttons key their cached
+-- Telegram file_id on it, so an unchanged table is resent without rebuilding.
+
+insert into bot.config_versions (name, version)
+values ('forms', 0)
+on conflict (name) do nothing;
+
+drop trigger if exists trg_forms_export_version on bot.forms;
+create trigger trg_forms_export_version
+  after insert or update or delete on bot.forms
+  for each statement execute function bot.bump_config_version('forms');
+
+drop trigger if exists trg_archive_forms_export_version on bot_archive.forms;
+create trigger trg_archive_forms_export_version
+  after insert or update or delete on bot_archive.forms
+  for each statement execute function bot.bump_config_version('forms');
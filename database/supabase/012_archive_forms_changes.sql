@@ -0,0 +1,13 @@
+-- Admins edit and delete archived forms too (bot_archive.forms, see 007).
+-- A deleted archived form leaves the stats rollup and frees its form number,
+-- like a deleted hot form. Edits touch only text columns, so no update triggers.
+
+drop trigger if exists trg_archive_forms_keys on bot_archive.forms;
+create trigger trg_archive_forms_keys
+  after delete on bot_archive.forms
+  for each row execute function bot.track_form_key();
+
+drop trigger if exists trg_archive_forms_stats on bot_archive.forms;
+create trigger trg_archive_forms_stats
+  after delete on bot_archive.forms
+  for each row execute function bot.form_stats_track();
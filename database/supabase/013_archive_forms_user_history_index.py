@@ -0,0 +1,16 @@
+"""Index for the user's form history on archived forms.
+
+"📜 Мои заявки" pages over bot.forms_all, so archived months keep showing up;
+with the same (user_id, created_at, id) index on both sides of the view the
+page is a merge of two index range scans. Built like 010.
+"""
+from bot.services.migrations import create_partitioned_index_concurrently
+
+
+TRANSACTIONAL = False
+
+
+def upgrade(conn):
+    create_partitioned_index_concurrently(
+        conn, "idx_archive_forms_user_created_id", "bot_archive.forms", "(user_id, created_at desc, id desc)"
+    )
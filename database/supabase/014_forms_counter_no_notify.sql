@@ -0,0 +1,14 @@
+-- Nobody caches by the 'forms' key of bot.config_versions (011), so its bumps
+-- must not broadcast on bot_cache (008). DELETE triggers cannot reference NEW,
+-- hence two triggers.
+drop trigger if exists trg_config_versions_cache_notify on bot.config_versions;
+create trigger trg_config_versions_cache_notify
+  after insert or update on bot.config_versions
+  for each row when (new.name <> 'forms')
+  execute function bot.notify_cache_invalidation('name');
+
+drop trigger if exists trg_config_versions_cache_notify_delete on bot.config_versions;
+create trigger trg_config_versions_cache_notify_delete
+  after delete on bot.config_versions
+  for each row when (old.name <> 'forms')
+  execute function bot.notify_cache_invalidation('name');
@@ -1,9 +1,10 @@
 import asyncio
 import logging
+import time
 import warnings
 from telegram.ext import ApplicationBuilder, CommandHandler, MessageHandler, filters, ConversationHandler, CallbackQueryHandler
 from telegram import BotCommand, ReplyKeyboardMarkup, KeyboardButton, Update
-from telegram.ext import ContextTypes, Application
+from telegram.ext import ContextTypes, Application, TypeHandler
 from telegram.warnings import PTBUserWarning
 from config import Config
 from dotenv import load_dotenv
@@ -18,6 +19,12 @@ from bot.commands import user, admin, utils
 from bot.events import messages, errors
 from bot.core import bot_core
 from bot.events.callbacks import handle_admin_approval
+from bot.events.jobs import build_jobs
+from bot.services import cache_events, db, exports
+from bot.services.user_profile import forget_user_profiles
+from bot.services.migrations import run_migrations
+from bot.services.scheduler import Scheduler
+from bot.services.telegram_request import build_requests
 
 # Настройка логирования
 logging.basicConfig(
@@ -114,7 +121,20 @@ class AdminFilter(filters.MessageFilter):
     def filter(self, message):
         return admin.is_admin(message.from_user.id)
 
+async def track_current_user(update: Update, context: ContextTypes.DEFAULT_TYPE):
+    """Запоминает автора апдейта: после его записей чтения идут в основную БД, а не в реплику.
+    Время последней активности нужно задаче очистки устаревших данных диалогов"""
+    db.current_user_id.set(update.effective_user.id if update.effective_user else None)
+    if context.user_data is not None:
+        context.user_data['last_seen'] = time.time()
+
 def setup_handlers(app):
+    app.add_handler(TypeHandler(Update, track_current_user), group=-1)
+    # Кнопки админ-панели снимают ожидание ввода до того, как их перехватит обработчик группы 0
+    app.add_handler(
+        MessageHandler(filters.Text(list(admin.ADMIN_PANEL_BUTTONS)), admin.clear_pending_input), group=-2
+    )
+
     # Настройка обработчиков команд
     app.add_handler(CommandHandler("start", user.start))
     app.add_handler(CommandHandler("help", user.help))
@@ -256,6 +276,11 @@ def setup_handlers(app):
     
     # Обработчики для кнопок помощи и других кнопок
     app.add_handler(MessageHandler(filters.Regex("^ℹ️ Помощь$"), user.help))
+    app.add_handler(MessageHandler(filters.Regex("^📜 Мои заявки$"), user.my_applications))
+    app.add_handler(CallbackQueryHandler(
+        user.handle_my_applications_callback,
+        pattern=r'^myapps_(open_\d+|(all|delivery|refund|painting|checkin)_\d+(_[on]_\d+_\d+)?)$'
+    ))
     
     # Обработчик для настроек через команду меню
     app.add_handler(CommandHandler("settings", user.settings))
@@ -266,6 +291,11 @@ def setup_handlers(app):
     app.add_handler(MessageHandler(filters.Regex("^📋 Список заявок$"), admin.handle_applications_list))
     app.add_handler(MessageHandler(filters.Regex("^📥 Загрузить таблицу$"), admin.handle_upload_table_request))
     app.add_handler(MessageHandler(filters.Regex("^📈 Потребление$"), admin.handle_bot_usage_request))
+    app.add_handler(MessageHandler(filters.Regex("^📊 Статистика$"), admin.handle_statistics))
+    app.add_handler(MessageHandler(filters.Regex("^🔎 Поиск$"), admin.handle_search_request))
+    app.add_handler(CallbackQueryHandler(admin.handle_search_callback, pattern=r'^search_(page_\d+|open_\d+_\d+)$'))
+    app.add_handler(MessageHandler(filters.Regex("^🧭 Маршруты задач$"), admin.handle_task_routing))
+    app.add_handler(CallbackQueryHandler(admin.handle_routing_callback, pattern=r'^routing_(list|edit_\w+|field_\w+)$'))
     
     # Обработчики для скачивания таблицы в разных форматах
     app.add_handler(CallbackQueryHandler(admin.handle_download_xlsx, pattern='^download_xlsx$'))
@@ -305,7 +335,9 @@ def setup_handlers(app):
         pattern="^back_to_edit_"
     ))
     
-    # Обработчики для навигации по пользователям
+    # Обработчики для навигации по пользователям и заявкам (карточка правится на месте)
+    app.add_handler(CallbackQueryHandler(admin.handle_user_page_callback, pattern=r'^admin_users_page_\d+$'))
+    app.add_handler(CallbackQueryHandler(admin.handle_application_page_callback, pattern=r'^admin_apps_page_\d+$'))
     app.add_handler(MessageHandler(filters.Regex("^⬅️$"), admin.handle_prev_user))
     app.add_handler(MessageHandler(filters.Regex("^➡️$"), admin.handle_next_user))
     app.add_handler(MessageHandler(filters.Regex("^🔙 Вернуться$"), admin.admin_panel))
@@ -424,9 +456,22 @@ async def main():
     
     loop = asyncio.get_running_loop()
     loop.set_exception_handler(_shutdown_exception_handler)
-    
-    # Создаем экземпляр приложения бота
-    app = Application.builder().token(token).build()
+
+    # Миграции схемы при старте (по умолчанию выключено — применяются через scripts/migrate.py)
+    if os.getenv('RUN_MIGRATIONS_ON_STARTUP', 'false').lower() in ('1', 'true', 'yes'):
+        applied = await asyncio.to_thread(run_migrations)
+        logger.info(f"Применено миграций: {len(applied)} {applied}")
+    
+    # Создаем экземпляр приложения бота: getUpdates и исходящие вызовы — в разных пулах соединений
+    request, get_updates_request = build_requests()
+    app = (
+        Application.builder()
+        .token(token)
+        .request(request)
+        .get_updates_request(get_updates_request)
+        .build()
+    )
+    app.bot_data['telegram_requests'] = {req.name: req for req in (request, get_updates_request)}
     
     # Настраиваем обработчики
     setup_handlers(app)
@@ -438,6 +483,18 @@ async def main():
     await app.initialize()
     await app.start()
     await app.updater.start_polling()
+
+    # Сброс кешей по NOTIFY из БД (правки в Studio, другие контейнеры бота)
+    for table in ("users", "user_settings"):
+        cache_events.subscribe(
+            table, lambda key: forget_user_profiles(app, int(key) if key is not None else None)
+        )
+    cache_listener = asyncio.create_task(cache_events.listen())
+
+    # Фоновые задачи: эксклюзивные выполняет одна реплика на слот (advisory lock)
+    scheduler = Scheduler(build_jobs(app) if os.getenv('SCHEDULER_ENABLED', 'true').lower() in ('1', 'true', 'yes') else [])
+    app.bot_data['scheduler'] = scheduler
+    scheduler_task = asyncio.create_task(scheduler.run())
     
     logger.info("Бот запущен. Нажмите Ctrl+C для остановки.")
     
@@ -447,10 +504,18 @@ async def main():
     except (KeyboardInterrupt, SystemExit):
         logger.info("Бот останавливается...")
     finally:
+        cache_listener.cancel()
+        scheduler_task.cancel()
+        # Дожидаемся уведомлений из очереди, пока бот ещё может отправлять
+        notifications = app.bot_data.get('notifications')
+        if notifications:
+            await notifications.close()
         await app.updater.stop()
         await asyncio.sleep(0.3)
         await app.stop()
         await app.shutdown()
+        exports.shutdown_executor()
+        db.close_pool()
         logger.info("Бот завершил работу")
 
 
@@ -3,6 +3,7 @@ import argparse
 import datetime as dt
 import json
 import os
+import time
 from pathlib import Path
 
 import psycopg
@@ -70,11 +71,132 @@ def load_json(path: Path, default):
     return json.loads(path.read_text(encoding="utf-8"))
 
 
+STREAM_CHUNK_SIZE = 1 << 16
+
+
+def iter_json_items(path: Path):
+    """Потоково разбирает JSON-файл верхнего уровня без загрузки его целиком.
+
+    Для массива возвращает элементы, для объекта — пары (ключ, значение).
+    """
+    if not path.exists():
+        return
+    decoder = json.JSONDecoder()
+    with path.open(encoding="utf-8-sig") as f:
+        buf = ""
+        pos = 0
+        eof = False
+
+        def fill() -> bool:
+            nonlocal buf, pos, eof
+            chunk = f.read(STREAM_CHUNK_SIZE)
+            buf = buf[pos:] + chunk
+            pos = 0
+            eof = not chunk
+            return bool(chunk)
+
+        def skip_ws() -> str:
+            nonlocal pos
+            while True:
+                while pos < len(buf) and buf[pos] in " \t\r\n":
+                    pos += 1
+                if pos < len(buf):
+                    return buf[pos]
+                if not fill():
+                    raise ValueError(f"{path}: unexpected end of file")
+
+        def decode():
+            nonlocal pos
+            while True:
+                try:
+                    value, end = decoder.raw_decode(buf, pos)
+                    # Число на границе чанка могло быть прочитано не полностью
+                    if end < len(buf) or eof:
+                        pos = end
+                        return value
+                except json.JSONDecodeError:
+                    if eof:
+                        raise
+                fill()
+
+        opener = skip_ws()
+        if opener not in "[{":
+            raise ValueError(f"{path}: expected a JSON array or object")
+        pos += 1
+        closer = "]" if opener == "[" else "}"
+        if skip_ws() == closer:
+            return
+        while True:
+            if opener == "{":
+                skip_ws()
+                key = decode()
+                if skip_ws() != ":":
+                    raise ValueError(f"{path}: expected ':' after key {key!r}")
+                pos += 1
+                skip_ws()
+                yield key, decode()
+            else:
+                skip_ws()
+                yield decode()
+            delimiter = skip_ws()
+            pos += 1
+            if delimiter == closer:
+                return
+            if delimiter != ",":
+                raise ValueError(f"{path}: unexpected {delimiter!r}")
+
+
 def apply_schema(cur: psycopg.Cursor, schema_file: Path) -> None:
     sql = schema_file.read_text(encoding="utf-8")
     cur.execute(sql)
 
 
+def user_record(item: dict):
+    return (
+        int(item["user_id"]),
+        item.get("username"),
+        item.get("fullname"),
+        item.get("phone"),
+        item.get("position"),
+        item.get("department"),
+        bool(item.get("approved", False)),
+        bool(item.get("admin", False)),
+        Jsonb(item),
+    )
+
+
+def form_record(application_type: str, item: dict):
+    if application_type == "checkin":
+        contract_number = item.get("num_contract")
+        form_text = None
+        checkin_date = item.get("date")
+        brig_name = item.get("name_brig")
+        brig_phone = item.get("phone_brig")
+        carring = item.get("carring")
+    else:
+        contract_number = item.get("contract_number")
+        form_text = item.get("form_text")
+        checkin_date = None
+        brig_name = None
+        brig_phone = None
+        carring = None
+
+    return (
+        application_type,
+        int(item.get("form_number")) if item.get("form_number") is not None else None,
+        int(item.get("user_id")) if item.get("user_id") is not None else None,
+        item.get("creator_fullname"),
+        contract_number,
+        form_text,
+        checkin_date,
+        brig_name,
+        brig_phone,
+        carring,
+        parse_dt(item.get("created_at")),
+        Jsonb(item),
+    )
+
+
 def import_users(cur: psycopg.Cursor, users: list[dict]) -> int:
     if not users:
         return 0
@@ -94,21 +216,7 @@ def import_users(cur: psycopg.Cursor, users: list[dict]) -> int:
           payload = excluded.payload,
           updated_at = now()
         """,
-        [
-            (
-                int(item["user_id"]),
-                item.get("username"),
-                item.get("fullname"),
-                item.get("phone"),
-                item.get("position"),
-                item.get("department"),
-                bool(item.get("approved", False)),
-                bool(item.get("admin", False)),
-                Jsonb(item),
-            )
-            for item in users
-            if item.get("user_id") is not None
-        ],
+        [user_record(item) for item in users if item.get("user_id") is not None],
     )
     return len(users)
 
@@ -133,64 +241,359 @@ def import_settings(cur: psycopg.Cursor, settings: dict) -> int:
     return len(settings)
 
 
-def import_forms(cur: psycopg.Cursor, application_type: str, forms: list[dict]) -> int:
+# bot.forms секционирована по месяцам (007), уникальность (тип, номер) — в bot.form_keys:
+# существующая заявка обновляется, новая вставляется
+FORM_UPSERT_SQL = """
+with key as (
+  select form_id, created_at
+  from bot.form_keys
+  where application_type = %(application_type)s and form_number = %(form_number)s
+), updated as (
+  update bot.forms f set
+    user_id = %(user_id)s,
+    creator_fullname = %(creator_fullname)s,
+    contract_number = %(contract_number)s,
+    form_text = %(form_text)s,
+    checkin_date = %(checkin_date)s,
+    brig_name = %(brig_name)s,
+    brig_phone = %(brig_phone)s,
+    carring = %(carring)s,
+    created_at = coalesce(%(created_at)s, f.created_at),
+    payload = %(payload)s
+  from key
+  where f.id = key.form_id and f.created_at = key.created_at
+  returning f.id
+), archived as (
+  -- Форма в перенесённом в архив месяце; дата не меняется, партиции архива закрыты
+  update bot_archive.forms f set
+    user_id = %(user_id)s,
+    creator_fullname = %(creator_fullname)s,
+    contract_number = %(contract_number)s,
+    form_text = %(form_text)s,
+    checkin_date = %(checkin_date)s,
+    brig_name = %(brig_name)s,
+    brig_phone = %(brig_phone)s,
+    carring = %(carring)s,
+    payload = %(payload)s
+  from key
+  where f.id = key.form_id and f.created_at = key.created_at
+  returning f.id
+)
+insert into bot.forms (
+  application_type, form_number, user_id, creator_fullname,
+  contract_number, form_text, checkin_date, brig_name, brig_phone, carring,
+  created_at, payload
+)
+select %(application_type)s::text, %(form_number)s::bigint, %(user_id)s::bigint, %(creator_fullname)s::text,
+       %(contract_number)s::text, %(form_text)s::text, %(checkin_date)s::text, %(brig_name)s::text,
+       %(brig_phone)s::text, %(carring)s::text, coalesce(%(created_at)s::timestamptz, now()), %(payload)s::jsonb
+where not exists (select 1 from key)
+"""
+
+
+def ensure_form_partitions(cur: psycopg.Cursor, dates) -> None:
+    """Создаёт месячные партиции bot.forms на диапазон дат импорта (и текущий месяц)."""
+    today = dt.datetime.now(dt.timezone.utc)
+    dates = [value for value in dates if value is not None] + [today]
+    cur.execute("select bot.ensure_forms_partitions(%s, %s)", (min(dates).date(), max(dates).date()))
+
+
+# Новая заявка, чей месяц уже перенесён в bot_archive: партиции в bot.forms для неё нет,
+# а ensure_forms_partitions архивный месяц не пересоздаёт
+ARCHIVED_MONTH_CONDITION = (
+    "to_regclass('bot_archive.forms_p' || to_char({created_at}, 'YYYY_MM')) is not null"
+)
+
+
+def find_archived_month_forms(cur: psycopg.Cursor, application_type: str, records: list[dict]) -> set[int]:
+    """Номера новых заявок, которые некуда вставить: их месяц в архиве."""
+    cur.execute(
+        f"""
+        select r.form_number
+        from unnest(%s::bigint[], %s::timestamptz[]) as r(form_number, created_at)
+        where {ARCHIVED_MONTH_CONDITION.format(created_at="r.created_at")}
+          and not exists (
+            select 1 from bot.form_keys k
+            where k.application_type = %s and k.form_number = r.form_number
+          )
+        """,
+        (
+            [record["form_number"] for record in records],
+            [record["created_at"] for record in records],
+            application_type,
+        ),
+    )
+    return {row[0] for row in cur.fetchall()}
+
+
+def import_forms(cur: psycopg.Cursor, application_type: str, forms: list[dict]) -> tuple[int, list[int]]:
+    """Возвращает число импортированных заявок и номера пропущенных (месяц в архиве)."""
     if not forms:
-        return 0
+        return 0, []
+
+    fields = [column.strip() for column in FORM_COLUMNS.split(",")]
+    records = [
+        dict(zip(fields, form_record(application_type, item)))
+        for item in forms
+        if item.get("form_number") is not None
+    ]
+    ensure_form_partitions(cur, (record["created_at"] for record in records))
+    skipped = find_archived_month_forms(cur, application_type, records)
+    cur.executemany(FORM_UPSERT_SQL, [record for record in records if record["form_number"] not in skipped])
+    return len(records) - len(skipped), sorted(skipped)
+
+
+FORM_FILES = {
+    "delivery": "delivery_forms.json",
+    "refund": "refund_forms.json",
+    "painting": "painting_forms.json",
+    "checkin": "checkin_forms.json",
+}
+
+USER_COLUMNS = "user_id, username, fullname, phone, position, department, approved, admin, payload"
+USER_TYPES = ["int8", "text", "text", "text", "text", "text", "bool", "bool", "jsonb"]
+
+FORM_COLUMNS = (
+    "application_type, form_number, user_id, creator_fullname, "
+    "contract_number, form_text, checkin_date, brig_name, brig_phone, carring, "
+    "created_at, payload"
+)
+FORM_TYPES = ["text", "int8", "int8", "text", "text", "text", "text", "text", "text", "text", "timestamptz", "jsonb"]
+
+
+def start_import_batch(cur: psycopg.Cursor, source: str, source_ref: str, meta: dict) -> int:
+    cur.execute(
+        "insert into bot.import_batches (source, source_ref, meta) values (%s, %s, %s) returning id",
+        (source, source_ref, Jsonb(meta)),
+    )
+    return int(cur.fetchone()[0])
 
-    def form_record(item: dict):
-        if application_type == "checkin":
-            contract_number = item.get("num_contract")
-            form_text = None
-            checkin_date = item.get("date")
-            brig_name = item.get("name_brig")
-            brig_phone = item.get("phone_brig")
-            carring = item.get("carring")
-        else:
-            contract_number = item.get("contract_number")
-            form_text = item.get("form_text")
-            checkin_date = None
-            brig_name = None
-            brig_phone = None
-            carring = None
-
-        return (
-            application_type,
-            int(item.get("form_number")) if item.get("form_number") is not None else None,
-            int(item.get("user_id")) if item.get("user_id") is not None else None,
-            item.get("creator_fullname"),
-            contract_number,
-            form_text,
-            checkin_date,
-            brig_name,
-            brig_phone,
-            carring,
-            parse_dt(item.get("created_at")),
-            Jsonb(item),
-        )
 
-    records = [form_record(item) for item in forms if item.get("form_number") is not None]
-    cur.executemany(
+def finish_import_batch(cur: psycopg.Cursor, batch_id: int, meta: dict) -> None:
+    cur.execute(
+        "update bot.import_batches set meta = meta || %s where id = %s",
+        (Jsonb(meta), batch_id),
+    )
+
+
+def copy_to_staging(cur: psycopg.Cursor, table: str, columns: str, types: list[str], records) -> int:
+    """Binary COPY записей во временную таблицу; ord сохраняет порядок строк во входном файле."""
+    count = 0
+    with cur.copy(f"copy {table} (ord, {columns}) from stdin (format binary)") as copy:
+        copy.set_types(["int8"] + types)
+        for record in records:
+            count += 1
+            copy.write_row((count, *record))
+    return count
+
+
+def bulk_import_users(cur: psycopg.Cursor, path: Path) -> tuple[int, int]:
+    cur.execute(
+        """
+        create temp table stage_users (
+          ord bigint, user_id bigint, username text, fullname text, phone text,
+          position text, department text, approved boolean, admin boolean, payload jsonb
+        ) on commit drop
+        """
+    )
+    staged = copy_to_staging(
+        cur,
+        "stage_users",
+        USER_COLUMNS,
+        USER_TYPES,
+        (user_record(item) for item in iter_json_items(path) if item.get("user_id") is not None),
+    )
+    # При повторе ключа во входных данных побеждает последняя запись, как при построчном upsert
+    cur.execute(
+        f"""
+        insert into bot.users ({USER_COLUMNS}, updated_at)
+        select distinct on (user_id) {USER_COLUMNS}, now()
+        from stage_users
+        order by user_id, ord desc
+        on conflict (user_id) do update set
+          username = excluded.username,
+          fullname = excluded.fullname,
+          phone = excluded.phone,
+          position = excluded.position,
+          department = excluded.department,
+          approved = excluded.approved,
+          admin = excluded.admin,
+          payload = excluded.payload,
+          updated_at = now()
         """
-        insert into bot.forms (
-          application_type, form_number, user_id, creator_fullname,
-          contract_number, form_text, checkin_date, brig_name, brig_phone, carring,
-          created_at, payload
-        ) values (%s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s, %s)
-        on conflict (application_type, form_number) do update set
-          user_id = excluded.user_id,
-          creator_fullname = excluded.creator_fullname,
-          contract_number = excluded.contract_number,
-          form_text = excluded.form_text,
-          checkin_date = excluded.checkin_date,
-          brig_name = excluded.brig_name,
-          brig_phone = excluded.brig_phone,
-          carring = excluded.carring,
-          created_at = excluded.created_at,
-          payload = excluded.payload
-        """,
-        records,
     )
-    return len(records)
+    return staged, cur.rowcount
+
+
+def bulk_import_settings(cur: psycopg.Cursor, path: Path) -> tuple[int, int]:
+    cur.execute(
+        """
+        create temp table stage_user_settings (
+          ord bigint, user_id bigint, auto_numbering boolean, payload jsonb
+        ) on commit drop
+        """
+    )
+    staged = copy_to_staging(
+        cur,
+        "stage_user_settings",
+        "user_id, auto_numbering, payload",
+        ["int8", "bool", "jsonb"],
+        (
+            (int(user_id), bool(payload.get("auto_numbering", False)), Jsonb(payload))
+            for user_id, payload in iter_json_items(path)
+        ),
+    )
+    cur.execute(
+        """
+        insert into bot.user_settings (user_id, auto_numbering, payload, updated_at)
+        select distinct on (user_id) user_id, auto_numbering, payload, now()
+        from stage_user_settings
+        order by user_id, ord desc
+        on conflict (user_id) do update set
+          auto_numbering = excluded.auto_numbering,
+          payload = excluded.payload,
+          updated_at = now()
+        """
+    )
+    return staged, cur.rowcount
+
+
+def bulk_import_forms(cur: psycopg.Cursor, paths: dict[str, Path]) -> tuple[dict, int, dict]:
+    cur.execute(
+        """
+        create temp table stage_forms (
+          ord bigint, application_type text, form_number bigint, user_id bigint,
+          creator_fullname text, contract_number text, form_text text, checkin_date text,
+          brig_name text, brig_phone text, carring text, created_at timestamptz, payload jsonb
+        ) on commit drop
+        """
+    )
+    staged = {}
+    for application_type, path in paths.items():
+        staged[application_type] = copy_to_staging(
+            cur,
+            "stage_forms",
+            FORM_COLUMNS,
+            FORM_TYPES,
+            (
+                form_record(application_type, item)
+                for item in iter_json_items(path)
+                if item.get("form_number") is not None
+            ),
+        )
+    cur.execute(
+        f"""
+        create temp table merge_forms on commit drop as
+        select distinct on (application_type, form_number) {FORM_COLUMNS}
+        from stage_forms
+        order by application_type, form_number, ord desc
+        """
+    )
+    cur.execute(
+        """
+        select bot.ensure_forms_partitions(
+          least(min(created_at), now())::date,
+          greatest(max(created_at), now())::date
+        )
+        from merge_forms
+        """
+    )
+    cur.execute(
+        f"""
+        delete from merge_forms s
+        where {ARCHIVED_MONTH_CONDITION.format(created_at="s.created_at")}
+          and not exists (
+            select 1 from bot.form_keys k
+            where k.application_type = s.application_type and k.form_number = s.form_number
+          )
+        returning application_type, form_number
+        """
+    )
+    skipped = {}
+    for application_type, form_number in cur.fetchall():
+        skipped.setdefault(application_type, []).append(form_number)
+    # Уникальность (тип, номер) хранится в bot.form_keys: сначала обновляем существующие, затем вставляем новые
+    cur.execute(
+        """
+        update bot.forms f set
+          user_id = s.user_id,
+          creator_fullname = s.creator_fullname,
+          contract_number = s.contract_number,
+          form_text = s.form_text,
+          checkin_date = s.checkin_date,
+          brig_name = s.brig_name,
+          brig_phone = s.brig_phone,
+          carring = s.carring,
+          created_at = coalesce(s.created_at, f.created_at),
+          payload = s.payload
+        from merge_forms s
+        join bot.form_keys k using (application_type, form_number)
+        where f.id = k.form_id and f.created_at = k.created_at
+        """
+    )
+    merged = cur.rowcount
+    # Заявки из архивных месяцев обновляются на месте, дата у них не меняется
+    cur.execute(
+        """
+        update bot_archive.forms f set
+          user_id = s.user_id,
+          creator_fullname = s.creator_fullname,
+          contract_number = s.contract_number,
+          form_text = s.form_text,
+          checkin_date = s.checkin_date,
+          brig_name = s.brig_name,
+          brig_phone = s.brig_phone,
+          carring = s.carring,
+          payload = s.payload
+        from merge_forms s
+        join bot.form_keys k using (application_type, form_number)
+        where f.id = k.form_id and f.created_at = k.created_at
+        """
+    )
+    merged += cur.rowcount
+    cur.execute(
+        f"""
+        insert into bot.forms ({FORM_COLUMNS})
+        select application_type, form_number, user_id, creator_fullname,
+               contract_number, form_text, checkin_date, brig_name, brig_phone, carring,
+               coalesce(created_at, now()), payload
+        from merge_forms s
+        where not exists (
+          select 1 from bot.form_keys k
+          where k.application_type = s.application_type and k.form_number = s.form_number
+        )
+        """
+    )
+    return staged, merged + cur.rowcount, {key: sorted(value) for key, value in skipped.items()}
+
+
+def run_bulk_import(cur: psycopg.Cursor, data_dir: Path) -> dict:
+    """Потоковый импорт через binary COPY во временные таблицы и один merge на таблицу."""
+    timings = {}
+
+    started = time.perf_counter()
+    users_staged, users_merged = bulk_import_users(cur, data_dir / "users.json")
+    timings["users"] = round((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    settings_staged, settings_merged = bulk_import_settings(cur, data_dir / "user_settings.json")
+    timings["settings"] = round((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    forms_staged, forms_merged, forms_skipped = bulk_import_forms(
+        cur, {application_type: data_dir / name for application_type, name in FORM_FILES.items()}
+    )
+    timings["forms"] = round((time.perf_counter() - started) * 1000)
+
+    return {
+        "counts": {
+            "users": {"staged": users_staged, "merged": users_merged},
+            "settings": {"staged": settings_staged, "merged": settings_merged},
+            "forms": {"staged": forms_staged, "merged": forms_merged},
+        },
+        "skipped_archived_forms": forms_skipped,
+        "timings_ms": timings,
+    }
 
 
 def main() -> int:
@@ -203,6 +606,11 @@ def main() -> int:
     parser.add_argument("--database-url", default=None)
     parser.add_argument("--schema-file", default="database/supabase/001_schema.sql")
     parser.add_argument("--skip-schema", action="store_true")
+    parser.add_argument(
+        "--bulk",
+        action="store_true",
+        help="Stream files and load them with binary COPY + one merge per table.",
+    )
     args = parser.parse_args()
 
     database_url = resolve_database_url(args.database_url)
@@ -210,33 +618,49 @@ def main() -> int:
         raise SystemExit("DATABASE_URL is not set and --database-url is missing.")
 
     data_dir = Path(args.data_dir)
-
-    users = load_json(data_dir / "users.json", [])
-    settings = load_json(data_dir / "user_settings.json", {})
-    delivery_forms = load_json(data_dir / "delivery_forms.json", [])
-    refund_forms = load_json(data_dir / "refund_forms.json", [])
-    painting_forms = load_json(data_dir / "painting_forms.json", [])
-    checkin_forms = load_json(data_dir / "checkin_forms.json", [])
+    run_started = time.perf_counter()
 
     with psycopg.connect(database_url, prepare_threshold=None) as conn:
         with conn.cursor() as cur:
             if not args.skip_schema:
                 apply_schema(cur, Path(args.schema_file))
 
-            users_count = import_users(cur, users)
-            settings_count = import_settings(cur, settings)
-            delivery_count = import_forms(cur, "delivery", delivery_forms)
-            refund_count = import_forms(cur, "refund", refund_forms)
-            painting_count = import_forms(cur, "painting", painting_forms)
-            checkin_count = import_forms(cur, "checkin", checkin_forms)
+            batch_id = start_import_batch(
+                cur,
+                "local_json",
+                str(data_dir.resolve()),
+                {"mode": "bulk" if args.bulk else "rows"},
+            )
+
+            if args.bulk:
+                result = run_bulk_import(cur, data_dir)
+            else:
+                users_count = import_users(cur, load_json(data_dir / "users.json", []))
+                settings_count = import_settings(cur, load_json(data_dir / "user_settings.json", {}))
+                forms_counts = {}
+                forms_skipped = {}
+                for application_type, name in FORM_FILES.items():
+                    count, skipped = import_forms(cur, application_type, load_json(data_dir / name, []))
+                    forms_counts[application_type] = count
+                    if skipped:
+                        forms_skipped[application_type] = skipped
+                result = {
+                    "counts": {
+                        "users": users_count,
+                        "settings": settings_count,
+                        "forms": forms_counts,
+                    },
+                    "skipped_archived_forms": forms_skipped,
+                }
+
+            result["duration_ms"] = round((time.perf_counter() - run_started) * 1000)
+            finish_import_batch(cur, batch_id, result)
 
         conn.commit()
 
-    print(
-        "Local JSON import complete. "
-        f"users={users_count} settings={settings_count} "
-        f"forms={{delivery:{delivery_count}, refund:{refund_count}, painting:{painting_count}, checkin:{checkin_count}}}"
-    )
+    print(f"Local JSON import complete (batch {batch_id}). {json.dumps(result, ensure_ascii=False)}")
+    for application_type, numbers in result["skipped_archived_forms"].items():
+        print(f"Skipped {len(numbers)} new {application_type} forms dated in archived months: {numbers}")
     return 0
 
 
@@ -0,0 +1,290 @@
+#!/usr/bin/env python3
+import argparse
+import datetime as dt
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+
+import psycopg
+from dotenv import load_dotenv
+from openpyxl import load_workbook
+from psycopg.types.json import Jsonb
+
+from import_local_json_to_supabase import (
+    finish_import_batch,
+    parse_dt,
+    resolve_database_url,
+    start_import_batch,
+)
+
+
+# Тип заявки определяется по названию листа
+SHEET_TYPE_KEYWORDS = (
+    ("delivery", ("достав", "delivery")),
+    ("refund", ("возврат", "refund")),
+    ("painting", ("покрас", "painting")),
+    ("checkin", ("заезд", "checkin")),
+)
+
+# Поля applications_sheet_legacy и ключевые слова в заголовках колонок.
+# Порядок важен: "Номер бригадира" — это brig_phone, "ФИО бригадира" — brig_name,
+# а не creator_fullname.
+HEADER_FIELD_KEYWORDS = (
+    ("brig_phone", ("номер бригадир", "телефон", "phone")),
+    ("brig_name", ("бригадир", "name_brig")),
+    ("checkin_date", ("дата заезда", "date_checkin")),
+    ("submitted_at", ("отметка времени", "дата заявки", "дата создания", "timestamp", "created_at")),
+    ("form_number", ("номер заявки", "№ заявки", "form_number")),
+    ("contract_number", ("договор", "contract")),
+    ("creator_fullname", ("фио", "автор", "creator")),
+    ("carring", ("грузоподъ", "carring", "carrying")),
+    ("form_text", ("текст", "заявка", "text")),
+)
+
+# Строки листа копируются один раз во временную таблицу (binary COPY),
+# затем раскладываются в sheet_rows_raw и applications_sheet_legacy
+STAGE_COLUMNS = (
+    "source_row_number, row_data, submitted_at, creator_fullname, form_number, "
+    "contract_number, form_text, checkin_date, brig_name, brig_phone, carring"
+)
+STAGE_TYPES = ["int4", "jsonb", "timestamptz", "text", "int8", "text", "text", "text", "text", "text", "text"]
+
+
+def sheet_application_type(sheet_name: str) -> str:
+    name = sheet_name.lower()
+    for application_type, keywords in SHEET_TYPE_KEYWORDS:
+        if any(keyword in name for keyword in keywords):
+            return application_type
+    return "unknown"
+
+
+def map_headers(headers: list[str]) -> dict[int, str]:
+    """Сопоставляет индексы колонок полям applications_sheet_legacy."""
+    mapping = {}
+    used = set()
+    for index, header in enumerate(headers):
+        title = header.lower()
+        for field, keywords in HEADER_FIELD_KEYWORDS:
+            if field not in used and any(keyword in title for keyword in keywords):
+                mapping[index] = field
+                used.add(field)
+                break
+    return mapping
+
+
+def cell_to_json(value):
+    if isinstance(value, (dt.datetime, dt.date, dt.time)):
+        return value.isoformat()
+    if isinstance(value, float) and value.is_integer():
+        return int(value)
+    return value
+
+
+def to_text(value) -> str | None:
+    if value is None:
+        return None
+    if isinstance(value, float) and value.is_integer():
+        value = int(value)
+    if isinstance(value, (dt.datetime, dt.date)):
+        return value.strftime("%d.%m.%Y")
+    text = str(value).strip()
+    return text or None
+
+
+def to_timestamp(value) -> dt.datetime | None:
+    if isinstance(value, dt.datetime):
+        return value if value.tzinfo else value.replace(tzinfo=dt.timezone.utc)
+    if isinstance(value, dt.date):
+        return dt.datetime(value.year, value.month, value.day, tzinfo=dt.timezone.utc)
+    if isinstance(value, str):
+        parsed = parse_dt(value.strip())
+        if parsed:
+            return parsed
+        try:
+            return dt.datetime.strptime(value.strip(), "%d.%m.%Y %H:%M:%S").replace(tzinfo=dt.timezone.utc)
+        except ValueError:
+            return None
+    return None
+
+
+def to_bigint(value) -> int | None:
+    try:
+        return int(str(value).strip().lstrip("#")) if value is not None else None
+    except ValueError:
+        return None
+
+
+def iter_sheet_rows(path: Path, sheet_name: str):
+    """Потоково возвращает (номер строки, заголовки, значения) без загрузки листа в память."""
+    workbook = load_workbook(path, read_only=True, data_only=True)
+    try:
+        headers = None
+        for row_number, values in enumerate(workbook[sheet_name].iter_rows(values_only=True), start=1):
+            if all(value is None or str(value).strip() == "" for value in values):
+                continue
+            if headers is None:
+                headers = [
+                    str(value).strip() if value is not None else f"column_{index + 1}"
+                    for index, value in enumerate(values)
+                ]
+                continue
+            yield row_number, headers, values
+    finally:
+        workbook.close()
+
+
+def import_sheet(database_url: str, path: str, sheet_name: str, batch_id: int) -> dict:
+    """Импорт одного листа; выполняется в отдельном процессе со своим соединением."""
+    started = time.perf_counter()
+    application_type = sheet_application_type(sheet_name)
+    rows = 0
+    mapping = None
+
+    with psycopg.connect(database_url, prepare_threshold=None) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                """
+                create temp table stage_sheet_rows (
+                  source_row_number integer, row_data jsonb, submitted_at timestamptz,
+                  creator_fullname text, form_number bigint, contract_number text, form_text text,
+                  checkin_date text, brig_name text, brig_phone text, carring text
+                ) on commit drop
+                """
+            )
+            with cur.copy(f"copy stage_sheet_rows ({STAGE_COLUMNS}) from stdin (format binary)") as copy:
+                copy.set_types(STAGE_TYPES)
+                for row_number, headers, values in iter_sheet_rows(Path(path), sheet_name):
+                    if mapping is None:
+                        mapping = map_headers(headers)
+                    row_data = {
+                        headers[index] if index < len(headers) else f"column_{index + 1}": cell_to_json(value)
+                        for index, value in enumerate(values)
+                        if value is not None
+                    }
+                    fields = {field: values[index] for index, field in mapping.items() if index < len(values)}
+                    copy.write_row(
+                        (
+                            row_number,
+                            Jsonb(row_data),
+                            to_timestamp(fields.get("submitted_at")),
+                            to_text(fields.get("creator_fullname")),
+                            to_bigint(fields.get("form_number")),
+                            to_text(fields.get("contract_number")),
+                            to_text(fields.get("form_text")),
+                            to_text(fields.get("checkin_date")),
+                            to_text(fields.get("brig_name")),
+                            to_text(fields.get("brig_phone")),
+                            to_text(fields.get("carring")),
+                        )
+                    )
+                    rows += 1
+
+            cur.execute(
+                """
+                insert into bot.sheet_rows_raw (batch_id, sheet_name, source_row_number, row_data)
+                select %s, %s, source_row_number, row_data from stage_sheet_rows
+                """,
+                (batch_id, sheet_name),
+            )
+            cur.execute(
+                """
+                insert into bot.applications_sheet_legacy (
+                  batch_id, sheet_name, application_type, source_row_number, submitted_at,
+                  creator_fullname, form_number, contract_number, form_text, checkin_date,
+                  brig_name, brig_phone, carring, payload
+                )
+                select %s, %s, %s, source_row_number, submitted_at,
+                       creator_fullname, form_number, contract_number, form_text, checkin_date,
+                       brig_name, brig_phone, carring, row_data
+                from stage_sheet_rows
+                """,
+                (batch_id, sheet_name, application_type),
+            )
+        conn.commit()
+
+    return {
+        "sheet": sheet_name,
+        "application_type": application_type,
+        "rows": rows,
+        "mapped_fields": sorted(set((mapping or {}).values())),
+        "duration_ms": round((time.perf_counter() - started) * 1000),
+    }
+
+
+def main() -> int:
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description="Import legacy XLSX sheets into bot.sheet_rows_raw / bot.applications_sheet_legacy."
+    )
+    parser.add_argument("workbook", help="Path to the .xlsx file")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--sheet", action="append", dest="sheets", help="Import only this sheet (repeatable)")
+    parser.add_argument("--workers", type=int, default=None, help="Parallel sheet workers (default: CPU count)")
+    args = parser.parse_args()
+
+    database_url = resolve_database_url(args.database_url)
+    if not database_url:
+        raise SystemExit("DATABASE_URL is not set and --database-url is missing.")
+
+    path = Path(args.workbook)
+    if not path.exists():
+        raise SystemExit(f"Workbook not found: {path}")
+
+    workbook = load_workbook(path, read_only=True)
+    sheet_names = workbook.sheetnames
+    workbook.close()
+    if args.sheets:
+        missing = set(args.sheets) - set(sheet_names)
+        if missing:
+            raise SystemExit(f"Sheets not found: {', '.join(sorted(missing))}")
+        sheet_names = [name for name in sheet_names if name in args.sheets]
+
+    run_started = time.perf_counter()
+    exported_at = dt.datetime.fromtimestamp(path.stat().st_mtime, tz=dt.timezone.utc)
+
+    # Запись о пакете фиксируется до запуска воркеров: их строки ссылаются на неё по FK
+    with psycopg.connect(database_url, prepare_threshold=None) as conn:
+        with conn.cursor() as cur:
+            batch_id = start_import_batch(cur, "xlsx", str(path.resolve()), {"sheets": sheet_names})
+            cur.execute("update bot.import_batches set exported_at = %s where id = %s", (exported_at, batch_id))
+        conn.commit()
+
+    results = []
+    errors = {}
+    workers = max(1, min(args.workers or os.cpu_count() or 1, len(sheet_names) or 1))
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {
+            pool.submit(import_sheet, database_url, str(path), sheet_name, batch_id): sheet_name
+            for sheet_name in sheet_names
+        }
+        for future in as_completed(futures):
+            sheet_name = futures[future]
+            try:
+                result = future.result()
+                results.append(result)
+                print(f"  {sheet_name}: {result['rows']} rows ({result['application_type']}) in {result['duration_ms']} ms")
+            except Exception as e:
+                errors[sheet_name] = str(e)
+                print(f"  {sheet_name}: FAILED: {e}")
+
+    summary = {
+        "sheets_imported": sorted(results, key=lambda item: sheet_names.index(item["sheet"])),
+        "errors": errors,
+        "rows": sum(item["rows"] for item in results),
+        "workers": workers,
+        "duration_ms": round((time.perf_counter() - run_started) * 1000),
+    }
+    with psycopg.connect(database_url, prepare_threshold=None) as conn:
+        with conn.cursor() as cur:
+            finish_import_batch(cur, batch_id, summary)
+        conn.commit()
+
+    print(f"XLSX import complete (batch {batch_id}). {json.dumps(summary, ensure_ascii=False)}")
+    return 1 if errors else 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+import argparse
+import os
+
+import psycopg
+from dotenv import load_dotenv
+
+from import_local_json_to_supabase import resolve_database_url
+
+
+def main() -> int:
+    load_dotenv()
+
+    parser = argparse.ArgumentParser(
+        description="Create upcoming monthly partitions of bot.forms and move old ones to bot_archive."
+    )
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument(
+        "--ahead-months",
+        type=int,
+        default=int(os.getenv("FORMS_PARTITIONS_AHEAD_MONTHS", "3")),
+        help="Create partitions up to this many months ahead",
+    )
+    parser.add_argument(
+        "--keep-months",
+        type=int,
+        default=int(os.getenv("FORMS_ARCHIVE_AFTER_MONTHS", "24")),
+        help="Archive partitions older than this many months (0 disables archiving)",
+    )
+    args = parser.parse_args()
+
+    database_url = resolve_database_url(args.database_url)
+    if not database_url:
+        raise SystemExit("DATABASE_URL is not set and --database-url is missing.")
+
+    with psycopg.connect(database_url, prepare_threshold=None) as conn:
+        with conn.cursor() as cur:
+            cur.execute(
+                "select bot.ensure_forms_partitions(current_date, (current_date + make_interval(months => %s))::date)",
+                (args.ahead_months,),
+            )
+            created = cur.fetchone()[0]
+            archived = []
+            if args.keep_months > 0:
+                cur.execute("select bot.archive_forms_partitions(%s)", (args.keep_months,))
+                archived = [row[0] for row in cur.fetchall()]
+        conn.commit()
+
+    print(f"Partitions created: {created}. Archived: {', '.join(archived) or 'none'}.")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())
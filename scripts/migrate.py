@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+import argparse
+import logging
+import sys
+from pathlib import Path
+
+import psycopg
+from dotenv import load_dotenv
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from bot.services.migrations import (  # noqa: E402
+    discover_migrations,
+    migrations_database_url,
+    pending_migrations,
+    run_migrations,
+)
+
+
+def main() -> int:
+    load_dotenv()
+    logging.basicConfig(level=logging.INFO, format="%(levelname)s %(message)s")
+
+    parser = argparse.ArgumentParser(description="Apply versioned migrations from database/supabase.")
+    parser.add_argument("--database-url", default=None, help="Session/direct connection (default: MIGRATIONS_DATABASE_URL or DATABASE_URL)")
+    parser.add_argument("--target", type=int, default=None, help="Apply migrations up to this version")
+    parser.add_argument(
+        "--baseline",
+        type=int,
+        default=None,
+        help="Mark migrations up to this version as applied without running them (schema applied by hand)",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Only print what would be applied")
+    parser.add_argument("--status", action="store_true", help="Print applied/pending migrations and exit")
+    args = parser.parse_args()
+
+    database_url = args.database_url or migrations_database_url()
+    if not database_url:
+        raise SystemExit("MIGRATIONS_DATABASE_URL / DATABASE_URL is not set and --database-url is missing.")
+
+    if args.status:
+        with psycopg.connect(database_url, autocommit=True, prepare_threshold=None) as conn:
+            pending = {migration.version for migration in pending_migrations(conn)}
+        for migration in discover_migrations():
+            state = "pending" if migration.version in pending else "applied"
+            mode = "" if migration.transactional else " (no transaction)"
+            print(f"{migration.version:03d} {migration.name:32} {state}{mode}")
+        return 0
+
+    applied = run_migrations(database_url, target=args.target, baseline=args.baseline, dry_run=args.dry_run)
+    verb = "Would apply" if args.dry_run else "Applied"
+    print(f"{verb} {len(applied)} migration(s): {', '.join(applied) or 'none'}")
+    return 0
+
+
+if __name__ == "__main__":
+    raise SystemExit(main())